@@ -0,0 +1,121 @@
+import json
+from itertools import count
+from typing import Any, Dict, List, Tuple, Union
+
+import aiohttp
+from aiohttp import web
+from loguru import logger
+
+FAKE_BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'wb_scrapper_bot', 'username': 'wb_scrapper_bot'}
+FAKE_CHAT_ID = 100
+
+
+class FakeTelegramServer:
+    """
+    Локальная замена Bot API Telegram для тестов бота в режиме webhook.
+    Бот работает с ней без изменений, достаточно указать адрес сервера в TELEGRAM_API_URL.
+
+    * Запоминает все вызовы методов бота в calls
+    * Запоминает адрес и секрет из setWebhook и доставляет на него обновления через send_update,
+      в том числе повторно, как Telegram при неудачной доставке
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self._host = host
+        self._port = port
+        self._runner: Union[web.AppRunner, None] = None
+        self._update_ids = count(1)
+        self._message_ids = count(1)
+
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.webhook_url = ''
+        self.webhook_secret = ''
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self._host}:{self._port}'
+
+    async def start(self) -> str:
+        """ Запускает сервер и возвращает его адрес """
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.__handle_method)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=self._host, port=self._port)
+        await site.start()
+
+        # При port=0 порт выбирается системой
+        self._port = self._runner.addresses[0][1]
+        logger.info(f'Замена Telegram запущена на {self.base_url}')
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def method_calls(self, method: str) -> List[Dict[str, Any]]:
+        """ Параметры всех вызовов метода Bot API """
+        return [params for called_method, params in self.calls if called_method == method]
+
+    def message_update(self, text: str, chat_id: int = FAKE_CHAT_ID, update_id: int = None) -> Dict[str, Any]:
+        """ Обновление с новым сообщением пользователя """
+        return {
+            'update_id': update_id or next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': 0,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user'},
+                'text': text,
+            },
+        }
+
+    async def send_update(self, update: Dict[str, Any], url: str = None) -> int:
+        """
+        Доставляет обновление на webhook бота
+
+        :param url: Адрес доставки, по умолчанию зарегистрированный через setWebhook
+        :return: HTTP статус ответа бота
+        """
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret} if self.webhook_secret else {}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url or self.webhook_url, json=update, headers=headers) as response:
+                return response.status
+
+    async def __handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = {name: self.__decode(value) for name, value in (await request.post()).items()}
+        self.calls.append((method, params))
+
+        if method == 'setWebhook':
+            self.webhook_url = params['url']
+            self.webhook_secret = params.get('secret_token', '')
+        elif method == 'deleteWebhook':
+            self.webhook_url = ''
+
+        return web.json_response({'ok': True, 'result': self.__result(method, params)})
+
+    def __result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == 'getMe':
+            return FAKE_BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            return {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': 0,
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'from': FAKE_BOT_USER,
+                'text': params.get('text', ''),
+            }
+        return True
+
+    @staticmethod
+    def __decode(value: Any) -> Any:
+        """ Bot API получает сложные параметры в JSON, простые - строками """
+        if not isinstance(value, str):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
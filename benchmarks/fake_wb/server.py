@@ -0,0 +1,197 @@
+import asyncio
+import json
+import random
+import zlib
+from html import escape
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Union
+
+from aiohttp import web
+from loguru import logger
+from pydantic import BaseModel
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+SEARCH_API_PATH = '/exactmatch/ru/common/v5/search'
+
+DEFAULT_DESCRIPTION = (
+    'Зонт мужской автомат с усиленным каркасом из фибергласа. Купол из плотного полиэстера '
+    'с водоотталкивающей пропиткой, удобная прорезиненная ручка, чехол в комплекте.'
+)
+
+
+class FakeCatalogConfig(BaseModel):
+    """
+    Содержимое и поведение замены сайта
+
+    * pages_per_query - сколько страниц выдачи есть у каждого запроса, дальше страница "ничего не найдено"
+    * page_size - карточек на полной странице
+    * initial_cards - сколько карточек отдается сразу, остальные подгружаются при прокрутке
+    * lazy_batch_size, lazy_delay_ms - порция и задержка подгрузки карточек при прокрутке
+    * render_delay_ms - через сколько после загрузки документа показывается каталог и кнопка описания
+    * details_delay_ms - задержка появления описания после нажатия на кнопку
+    * latency_ms, latency_jitter_ms - задержка ответа сервера на документ
+    * placements - где стоят искомые товары: запрос -> артикул -> (страница, позиция)
+    * missing_products - артикулы, для которых отдается страница 404
+    * search_api_blocked - API поиска отвечает 403, как при блокировке
+    """
+
+    pages_per_query: int = 10
+    page_size: int = 100
+    initial_cards: int = 20
+    lazy_batch_size: int = 20
+    lazy_delay_ms: int = 100
+    render_delay_ms: int = 50
+    details_delay_ms: int = 50
+    latency_ms: int = 100
+    latency_jitter_ms: int = 50
+    placements: Dict[str, Dict[int, Tuple[int, int]]] = {}
+    missing_products: Set[int] = set()
+    search_api_blocked: bool = False
+    description: str = DEFAULT_DESCRIPTION
+
+
+class FakeWildberriesServer:
+    """
+    Локальная замена Wildberries для бенчмарков. Отдает страницы выдачи и товаров
+    с теми же селекторами, что и сайт, поэтому скрапперы работают с ней без изменений,
+    достаточно указать адрес сервера в WILDBERRIES_BASE_URL.
+
+    Выдача детерминирована: артикулы страницы зависят только от запроса и номера страницы.
+    """
+
+    def __init__(self, config: FakeCatalogConfig = None, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.config = config or FakeCatalogConfig()
+
+        self._host = host
+        self._port = port
+        self._runner: Union[web.AppRunner, None] = None
+        self._templates = {path.stem: path.read_text(encoding='utf-8') for path in FIXTURES_DIR.glob('*.html')}
+
+        self.requests_served = 0
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self._host}:{self._port}'
+
+    @property
+    def search_api_url(self) -> str:
+        return self.base_url + SEARCH_API_PATH
+
+    async def start(self) -> str:
+        """ Запускает сервер и возвращает его адрес """
+        app = web.Application()
+        app.router.add_get('/catalog/0/search.aspx', self.__handle_search)
+        app.router.add_get(SEARCH_API_PATH, self.__handle_search_api)
+        app.router.add_get('/catalog/{nm_id:\\d+}/detail.aspx', self.__handle_product)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=self._host, port=self._port)
+        await site.start()
+
+        # При port=0 порт выбирается системой
+        self._port = self._runner.addresses[0][1]
+        logger.info(f'Замена Wildberries запущена на {self.base_url}')
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def product_url(self, nm_id: int) -> str:
+        return f'{self.base_url}/catalog/{nm_id}/detail.aspx'
+
+    def page_nm_ids(self, query: str, page_number: int) -> List[int]:
+        """ Артикулы карточек страницы выдачи с учетом расставленных искомых товаров """
+        normalized_query = self.__normalize_query(query)
+        seed = zlib.crc32(normalized_query.encode())
+        base = 10_000_000 + seed % 10_000 * 100_000 + page_number * self.config.page_size
+        nm_ids = list(range(base, base + self.config.page_size))
+
+        placements = {
+            self.__normalize_query(placed_query): products
+            for placed_query, products in self.config.placements.items()
+        }
+        for nm_id, (placed_page, position) in placements.get(normalized_query, {}).items():
+            if placed_page == page_number and 1 <= position <= len(nm_ids):
+                nm_ids[position - 1] = nm_id
+        return nm_ids
+
+    async def __handle_search(self, request: web.Request) -> web.Response:
+        await self.__simulate_latency()
+
+        query = request.query.get('search', '')
+        page_number = int(request.query.get('page', 1))
+
+        if not query or page_number > self.config.pages_per_query:
+            return self.__render('serp_not_found', query=escape(query), render_delay_ms=self.config.render_delay_ms)
+
+        hrefs = [self.product_url(nm_id) for nm_id in self.page_nm_ids(query=query, page_number=page_number)]
+        initial, lazy = hrefs[:self.config.initial_cards], hrefs[self.config.initial_cards:]
+        cards = ''.join(
+            f'<article class="product-card"><div class="product-card-overflow">'
+            f'<a class="product-card__link" href="{href}"></a></div></article>'
+            for href in initial
+        )
+        total = self.config.pages_per_query * self.config.page_size
+        return self.__render(
+            'serp',
+            query=escape(query),
+            total=total,
+            # Как на сайте: разряды числа товаров разделены неразрывным пробелом
+            total_formatted=f'{total:,}'.replace(',', '\u00a0'),
+            cards=cards,
+            lazy_cards=json.dumps(lazy),
+            batch_size=self.config.lazy_batch_size,
+            lazy_delay_ms=self.config.lazy_delay_ms,
+            render_delay_ms=self.config.render_delay_ms,
+        )
+
+    async def __handle_search_api(self, request: web.Request) -> web.Response:
+        """ JSON API поиска: та же выдача, что и на страницах, но целиком и без отрисовки """
+        await self.__simulate_latency()
+
+        if self.config.search_api_blocked:
+            return web.Response(text='<html>Доступ ограничен</html>', status=403, content_type='text/html')
+
+        query = request.query.get('query', '')
+        page_number = int(request.query.get('page', 1))
+
+        products = []
+        if query and page_number <= self.config.pages_per_query:
+            products = [{'id': nm_id} for nm_id in self.page_nm_ids(query=query, page_number=page_number)]
+        return web.json_response({
+            'data': {'products': products, 'total': self.config.pages_per_query * self.config.page_size},
+        })
+
+    async def __handle_product(self, request: web.Request) -> web.Response:
+        await self.__simulate_latency()
+
+        nm_id = int(request.match_info['nm_id'])
+        if nm_id in self.config.missing_products:
+            return self.__render('product_not_found', status=404)
+
+        return self.__render(
+            'product',
+            nm_id=nm_id,
+            description=json.dumps(self.config.description, ensure_ascii=False),
+            render_delay_ms=self.config.render_delay_ms,
+            details_delay_ms=self.config.details_delay_ms,
+        )
+
+    async def __simulate_latency(self) -> None:
+        self.requests_served += 1
+        latency = self.config.latency_ms + random.uniform(-1, 1) * self.config.latency_jitter_ms
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    @staticmethod
+    def __normalize_query(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def __render(self, template: str, status: int = 200, **context) -> web.Response:
+        html = self._templates[template]
+        for name, value in context.items():
+            html = html.replace('{{ ' + name + ' }}', str(value))
+        return web.Response(text=html, status=status, content_type='text/html')
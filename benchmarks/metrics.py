@@ -0,0 +1,91 @@
+import asyncio
+import os
+from typing import Dict, List, Union
+
+from pydantic import BaseModel
+
+from src.monitoring.process_memory import descendant_pids, proc_available, total_rss_bytes
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """ Перцентиль с линейной интерполяцией, 0 для пустого списка """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class LatencySummary(BaseModel):
+    """ Распределение времени в секундах """
+
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @classmethod
+    def from_values(cls, values: List[float]) -> 'LatencySummary':
+        return cls(
+            count=len(values),
+            p50=percentile(values, 50),
+            p95=percentile(values, 95),
+            p99=percentile(values, 99),
+            max=max(values, default=0.0),
+        )
+
+
+class ScenarioResult(BaseModel):
+    """ Итог одного сценария """
+
+    scenario: str
+    duration: float
+    pages_scanned: int
+    pages_per_sec: float
+    latency: LatencySummary
+    latency_by_query: Dict[str, LatencySummary] = {}
+    # Результаты, не совпавшие с расстановкой товаров на замене сайта
+    errors: int = 0
+    max_browser_rss_mb: Union[float, None] = None
+
+
+def browser_rss_bytes() -> Union[int, None]:
+    """ Суммарный RSS процессов браузера и драйвера playwright. None, если /proc недоступен """
+    if not proc_available():
+        return None
+    return total_rss_bytes(descendant_pids(os.getpid()))
+
+
+class RssSampler:
+    """ Периодически замеряет RSS браузера и запоминает максимум """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        self._interval = interval
+        self._task: Union[asyncio.Task, None] = None
+        self.max_rss: Union[int, None] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.__sample())
+
+    async def stop(self) -> Union[float, None]:
+        """ Останавливает замеры и возвращает максимум в мегабайтах """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.__take_sample()
+        return round(self.max_rss / 2 ** 20, 1) if self.max_rss is not None else None
+
+    async def __sample(self) -> None:
+        while True:
+            # Обход /proc синхронный, выносим его из event loop
+            await asyncio.to_thread(self.__take_sample)
+            await asyncio.sleep(self._interval)
+
+    def __take_sample(self) -> None:
+        rss = browser_rss_bytes()
+        if rss is not None:
+            self.max_rss = max(self.max_rss or 0, rss)
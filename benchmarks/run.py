@@ -0,0 +1,213 @@
+"""
+Бенчмарк скрапперов на локальной замене Wildberries.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario catalog_sweep --repeat 5 --latency-ms 300
+
+Результаты дописываются в benchmarks/results.jsonl и сравниваются с прошлым запуском
+того же сценария с теми же настройками.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Union
+
+from loguru import logger
+
+from benchmarks.fake_wb.server import FakeCatalogConfig, FakeWildberriesServer
+from benchmarks.metrics import RssSampler, ScenarioResult
+from benchmarks.scenarios import SCENARIOS
+from settings.config import settings, BASE_DIR
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+
+DEFAULT_RESULTS_PATH = Path(BASE_DIR, 'benchmarks', 'results.jsonl')
+
+# Настройки, от которых зависит производительность. Сравниваются только запуски с одинаковыми значениями
+TUNED_SETTINGS = (
+    'PAGE_SCROLLING_SPEED',
+    'PAGE_SCROLL_TIMEOUT',
+    'CATALOG_PAGES_WINDOW_SIZE',
+    'MAX_OPEN_PAGES',
+    'BROWSER_WORKERS',
+    'BLOCK_HEAVY_RESOURCES',
+    'PAGE_LOAD_RETRIES',
+    'PAGE_HEDGE_PERCENTILE',
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Бенчмарк скрапперов на локальной замене Wildberries')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Сценарий, можно указать несколько раз. По умолчанию все')
+    parser.add_argument('--repeat', type=int, default=3, help='Сколько раз прогнать каждый сценарий')
+    parser.add_argument('--latency-ms', type=int, default=100, help='Задержка ответа сервера')
+    parser.add_argument('--jitter-ms', type=int, default=50, help='Разброс задержки ответа сервера')
+    parser.add_argument('--lazy-delay-ms', type=int, default=100, help='Задержка подгрузки карточек при прокрутке')
+    parser.add_argument('--initial-cards', type=int, default=20, help='Сколько карточек отдается без прокрутки')
+    parser.add_argument('--pages-per-query', type=int, default=10, help='Сколько страниц выдачи у запроса')
+    parser.add_argument('--label', default='', help='Пометка запуска, например название ветки')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS_PATH, help='Файл истории результатов')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Относительное ухудшение, после которого метрика считается регрессией')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Код выхода 1 при регрессии')
+    return parser.parse_args()
+
+
+async def run_benchmarks(args: argparse.Namespace) -> List[ScenarioResult]:
+    config = FakeCatalogConfig(
+        pages_per_query=args.pages_per_query,
+        initial_cards=args.initial_cards,
+        page_size=settings.CATALOG_PAGE_SIZE,
+        lazy_delay_ms=args.lazy_delay_ms,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+    )
+    server = FakeWildberriesServer(config=config)
+    await server.start()
+
+    # Скрапперы и блокировка запросов берут адрес сайта из настроек, кеши мешали бы замерам
+    settings.WILDBERRIES_BASE_URL = server.base_url
+    settings.WILDBERRIES_SEARCH_API_URL = server.search_api_url
+    settings.SERP_CACHE_TTL = 0
+    settings.DESCRIPTION_CACHE_TTL = 0
+
+    backend = BrowserBackend()
+    results = []
+    try:
+        await backend.start()
+        for name in args.scenario or SCENARIOS:
+            scenario = SCENARIOS[name]
+            server.config = scenario.configure(config)
+            logger.info(f'Сценарий {name}: {scenario.description}')
+
+            sampler = RssSampler()
+            sampler.start()
+            try:
+                result = await scenario.run(server=server, backend=backend, repeat=args.repeat)
+            finally:
+                max_rss = await sampler.stop()
+            result.max_browser_rss_mb = max_rss
+            results.append(result)
+    finally:
+        await backend.close()
+        await server.stop()
+
+    return results
+
+
+def build_record(result: ScenarioResult, args: argparse.Namespace) -> Dict:
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': current_commit(),
+        'label': args.label,
+        'environment': {
+            'settings': {name: getattr(settings, name) for name in TUNED_SETTINGS},
+            'fake_site': {
+                'repeat': args.repeat,
+                'latency_ms': args.latency_ms,
+                'jitter_ms': args.jitter_ms,
+                'lazy_delay_ms': args.lazy_delay_ms,
+                'initial_cards': args.initial_cards,
+                'pages_per_query': args.pages_per_query,
+            },
+        },
+        'result': result.model_dump(),
+    }
+
+
+def current_commit() -> Union[str, None]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: Path) -> List[Dict]:
+    if not path.exists():
+        return []
+    with path.open(encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def find_baseline(history: List[Dict], record: Dict) -> Union[Dict, None]:
+    """ Последний запуск того же сценария в том же окружении """
+    for previous in reversed(history):
+        if (
+                previous['result']['scenario'] == record['result']['scenario']
+                and previous['environment'] == record['environment']
+        ):
+            return previous
+    return None
+
+
+def compare(record: Dict, baseline: Union[Dict, None], threshold: float) -> List[str]:
+    """ Печатает метрики запуска и изменения относительно прошлого, возвращает найденные регрессии """
+    result = ScenarioResult.model_validate(record['result'])
+    previous = ScenarioResult.model_validate(baseline['result']) if baseline else None
+
+    # Метрика -> (значение, прошлое значение, больше - лучше)
+    metrics = {
+        'pages/sec': (result.pages_per_sec, previous and previous.pages_per_sec, True),
+        'p50, с': (result.latency.p50, previous and previous.latency.p50, False),
+        'p95, с': (result.latency.p95, previous and previous.latency.p95, False),
+        'p99, с': (result.latency.p99, previous and previous.latency.p99, False),
+        'browser RSS, МБ': (result.max_browser_rss_mb, previous and previous.max_browser_rss_mb, False),
+    }
+
+    print(f'\n{result.scenario}: {result.pages_scanned} страниц за {result.duration:.1f} с, ошибок {result.errors}')
+    if baseline:
+        print(f'  сравнение с {baseline["commit"] or "?"} от {baseline["timestamp"]}')
+
+    regressions = []
+    for name, (value, previous_value, higher_is_better) in metrics.items():
+        if value is None:
+            continue
+        line = f'  {name:<16} {value:10.3f}'
+        if previous_value:
+            change = (value - previous_value) / previous_value
+            worse = -change if higher_is_better else change
+            line += f'  {change:+.1%}'
+            if worse > threshold:
+                line += '  РЕГРЕССИЯ'
+                regressions.append(f'{result.scenario}: {name} {previous_value:.3f} -> {value:.3f}')
+        print(line)
+
+    for query, summary in result.latency_by_query.items():
+        print(f'  {query:<24} p50 {summary.p50:.2f} p95 {summary.p95:.2f} p99 {summary.p99:.2f}')
+
+    if result.errors:
+        regressions.append(f'{result.scenario}: {result.errors} результатов не совпали с ожидаемыми')
+    return regressions
+
+
+def main() -> int:
+    args = parse_args()
+    if args.repeat < 1:
+        raise SystemExit('--repeat должен быть больше 0')
+
+    results = asyncio.run(run_benchmarks(args))
+
+    history = load_history(args.results)
+    regressions = []
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with args.results.open('a', encoding='utf-8') as file:
+        for result in results:
+            record = build_record(result=result, args=args)
+            regressions += compare(record=record, baseline=find_baseline(history, record), threshold=args.threshold)
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    if regressions:
+        print('\nРегрессии:\n' + '\n'.join(f'  {regression}' for regression in regressions))
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
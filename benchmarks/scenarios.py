@@ -0,0 +1,239 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple, Union
+
+from loguru import logger
+
+from benchmarks.fake_wb.server import FakeCatalogConfig, FakeWildberriesServer
+from benchmarks.metrics import LatencySummary, ScenarioResult
+from src.scrappers.exceptions import ProductNotFound
+from src.scrappers.models import QuerySearchResult
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+from src.scrappers.wildberries.wildberries_catalog_http import WildberriesHttpCatalogScrapper
+from src.scrappers.wildberries.wildberries_product import WildberriesProductScrapper
+
+TARGET_NM_ID = 900_000_001
+
+# Запрос -> (страница, позиция) искомого товара, None - товара в выдаче нет.
+# Разброс страниц покрывает ранний выход, середину окна и полный проход до конца выдачи
+CATALOG_QUERIES: Dict[str, Union[Tuple[int, int], None]] = {
+    'зонт мужской автомат': (1, 7),
+    'зонт мужской': (2, 45),
+    'зонт складной': (4, 90),
+    'зонт трость': (7, 12),
+    'зонт черный': None,
+}
+
+
+class Scenario:
+    """ Сценарий нагрузки. Перед запуском настраивает выдачу замены сайта под себя """
+
+    name: str = ''
+    description: str = ''
+
+    def configure(self, config: FakeCatalogConfig) -> FakeCatalogConfig:
+        return config
+
+    async def run(self, server: FakeWildberriesServer, backend: BrowserBackend, repeat: int) -> ScenarioResult:
+        raise NotImplementedError
+
+
+class CatalogSweepScenario(Scenario):
+    """ Поиск одного товара по нескольким запросам, как при обработке сообщения ботом """
+
+    name = 'catalog_sweep'
+    description = 'Один товар, запросы с находками на разных страницах и один без находки'
+
+    scrapper_class = WildberriesCatalogScrapper
+
+    def configure(self, config: FakeCatalogConfig) -> FakeCatalogConfig:
+        placements = {
+            query: {TARGET_NM_ID: placement}
+            for query, placement in CATALOG_QUERIES.items() if placement is not None
+        }
+        return config.model_copy(update={'placements': placements})
+
+    async def run(self, server: FakeWildberriesServer, backend: BrowserBackend, repeat: int) -> ScenarioResult:
+        latencies: Dict[str, List[float]] = {query: [] for query in CATALOG_QUERIES}
+        errors = 0
+        requests_before = server.requests_served
+        started_at = time.monotonic()
+
+        for iteration in range(repeat):
+            # Новый скраппер на каждый проход, что бы страницы не брались из кеша прошлого прохода
+            scrapper = self.scrapper_class(backend=backend)
+            iteration_started_at = time.monotonic()
+            try:
+                async for query, search_result in scrapper.iter_product_positions(
+                        product_url=server.product_url(TARGET_NM_ID),
+                        queries=list(CATALOG_QUERIES),
+                        owner=iteration,
+                ):
+                    latencies[query].append(time.monotonic() - iteration_started_at)
+                    if not self.__is_expected(query=query, search_result=search_result):
+                        errors += 1
+            finally:
+                await scrapper.close()
+
+        duration = time.monotonic() - started_at
+        pages_scanned = server.requests_served - requests_before
+        return ScenarioResult(
+            scenario=self.name,
+            duration=duration,
+            pages_scanned=pages_scanned,
+            pages_per_sec=pages_scanned / duration if duration else 0.0,
+            latency=LatencySummary.from_values([value for values in latencies.values() for value in values]),
+            latency_by_query={query: LatencySummary.from_values(values) for query, values in latencies.items()},
+            errors=errors,
+        )
+
+    @staticmethod
+    def __is_expected(query: str, search_result: QuerySearchResult) -> bool:
+        expected = CATALOG_QUERIES[query]
+        position = search_result.position
+        actual = (position.page_number, position.position_on_page) if position else None
+        if actual != expected or search_result.status == 'failed':
+            logger.warning(
+                f'Запрос "{query}": ожидалась позиция {expected}, получена {actual} ({search_result.status})'
+            )
+            return False
+        return True
+
+
+class HttpCatalogSweepScenario(CatalogSweepScenario):
+    """ Тот же поиск, но выдача запрашивается у JSON API поиска без браузера """
+
+    name = 'catalog_sweep_http'
+    description = 'Как catalog_sweep, но через API поиска'
+
+    scrapper_class = WildberriesHttpCatalogScrapper
+
+
+class HttpBlockedCatalogSweepScenario(HttpCatalogSweepScenario):
+    """ API поиска отвечает блокировкой, скраппер переходит на загрузку страниц в браузере """
+
+    name = 'catalog_sweep_http_blocked'
+    description = 'Как catalog_sweep_http, но API отвечает 403 и страницы загружаются в браузере'
+
+    def configure(self, config: FakeCatalogConfig) -> FakeCatalogConfig:
+        return super().configure(config).model_copy(update={'search_api_blocked': True})
+
+
+class CatalogBatchScenario(Scenario):
+    """ Пакетный поиск нескольких товаров с общими запросами, каждая выдача просматривается один раз """
+
+    name = 'catalog_batch'
+    description = 'Пять товаров по одним и тем же запросам'
+
+    products_count = 5
+
+    def configure(self, config: FakeCatalogConfig) -> FakeCatalogConfig:
+        placements = {}
+        for query, placement in CATALOG_QUERIES.items():
+            if placement is None:
+                continue
+            page_number, position = placement
+            placements[query] = {
+                TARGET_NM_ID + index: (page_number, position + index) for index in range(self.products_count)
+            }
+        return config.model_copy(update={'placements': placements})
+
+    async def run(self, server: FakeWildberriesServer, backend: BrowserBackend, repeat: int) -> ScenarioResult:
+        products = {
+            server.product_url(TARGET_NM_ID + index): list(CATALOG_QUERIES) for index in range(self.products_count)
+        }
+        latencies = []
+        errors = 0
+        requests_before = server.requests_served
+        started_at = time.monotonic()
+
+        for iteration in range(repeat):
+            scrapper = WildberriesCatalogScrapper(backend=backend)
+            iteration_started_at = time.monotonic()
+            try:
+                positions = await scrapper.find_products_positions(products=products, owner=iteration)
+            finally:
+                await scrapper.close()
+            latencies.append(time.monotonic() - iteration_started_at)
+
+            for product_positions in positions.values():
+                errors += sum(
+                    search_result.status != ('not_found' if CATALOG_QUERIES[query] is None else 'found')
+                    for query, search_result in product_positions.items()
+                )
+
+        duration = time.monotonic() - started_at
+        pages_scanned = server.requests_served - requests_before
+        return ScenarioResult(
+            scenario=self.name,
+            duration=duration,
+            pages_scanned=pages_scanned,
+            pages_per_sec=pages_scanned / duration if duration else 0.0,
+            latency=LatencySummary.from_values(latencies),
+            errors=errors,
+        )
+
+
+class ProductDescriptionScenario(Scenario):
+    """ Одновременная загрузка описаний товаров, часть ссылок ведет на страницу 404 """
+
+    name = 'product_descriptions'
+    description = 'Десять описаний параллельно, два товара не существуют'
+
+    products_count = 10
+    missing_count = 2
+
+    def configure(self, config: FakeCatalogConfig) -> FakeCatalogConfig:
+        missing = {TARGET_NM_ID + index for index in range(self.missing_count)}
+        return config.model_copy(update={'missing_products': missing})
+
+    async def run(self, server: FakeWildberriesServer, backend: BrowserBackend, repeat: int) -> ScenarioResult:
+        latencies = []
+        errors = 0
+        requests_before = server.requests_served
+        started_at = time.monotonic()
+
+        async def load(scrapper: WildberriesProductScrapper, nm_id: int) -> bool:
+            """ Загружает описание и возвращает, совпал ли результат с ожидаемым """
+            load_started_at = time.monotonic()
+            try:
+                description = await scrapper.get_product_description(url=server.product_url(nm_id), owner=nm_id)
+                ok = description == server.config.description
+            except ProductNotFound:
+                ok = nm_id in server.config.missing_products
+            latencies.append(time.monotonic() - load_started_at)
+            return ok
+
+        for _ in range(repeat):
+            scrapper = WildberriesProductScrapper(backend=backend)
+            try:
+                results = await asyncio.gather(
+                    *(load(scrapper=scrapper, nm_id=TARGET_NM_ID + index) for index in range(self.products_count))
+                )
+            finally:
+                await scrapper.close()
+            errors += results.count(False)
+
+        duration = time.monotonic() - started_at
+        pages_scanned = server.requests_served - requests_before
+        return ScenarioResult(
+            scenario=self.name,
+            duration=duration,
+            pages_scanned=pages_scanned,
+            pages_per_sec=pages_scanned / duration if duration else 0.0,
+            latency=LatencySummary.from_values(latencies),
+            errors=errors,
+        )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario
+    for scenario in (
+        CatalogSweepScenario(),
+        HttpCatalogSweepScenario(),
+        HttpBlockedCatalogSweepScenario(),
+        CatalogBatchScenario(),
+        ProductDescriptionScenario(),
+    )
+}
@@ -0,0 +1,14 @@
+import sys
+
+from loguru import logger
+
+from src.bulk.runner import main
+from src.queries_extraction.nltk_data import ensure_nltk_data
+
+logger.remove()
+logger.add(sys.stderr, level="INFO")
+
+
+if __name__ == '__main__':
+    ensure_nltk_data()
+    main()
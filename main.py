@@ -1,11 +1,32 @@
-import asyncio
+import time
+
+STARTED_AT = time.perf_counter()
 
-from src.bots.tg_bot import TelegramBot
-import nltk
+import asyncio
 
-nltk.download('stopwords')
-nltk.download('punkt_tab')
+from src.startup import StartupReport
+from src.queries_extraction.nltk_data import ensure_nltk_data
 
 
 if __name__ == '__main__':
-    asyncio.run(TelegramBot().start_bot())
+    startup_report = StartupReport(started_at=STARTED_AT)
+
+    from settings.config import settings
+    if not settings.JOB_QUEUE_ENABLED:
+        # С очередью запросы из описаний выделяют воркеры, корпуса нужны только им
+        ensure_nltk_data()
+        startup_report.mark('Проверка корпусов nltk')
+
+    if settings.BOT_MODE == 'webhook' and settings.WEBHOOK_WORKERS > 1:
+        # Каждый воркер - отдельный процесс бота, метрики и отчет о запуске у них свои
+        from src.bots.webhook_workers import run_webhook_workers
+        run_webhook_workers()
+    else:
+        from src.bots.tg_bot import TelegramBot
+        startup_report.mark('Импорт модулей бота')
+
+        from src.monitoring.metrics import start_metrics_server
+        start_metrics_server()
+        startup_report.mark('Запуск метрик')
+
+        asyncio.run(TelegramBot(startup_report=startup_report).start_bot())
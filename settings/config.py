@@ -10,9 +10,82 @@ class Settings(BaseSettings):
     DEV: bool = False
 
     BOT_TOKEN: SecretStr = ''
+    TELEGRAM_EDIT_INTERVAL: float = 1.5
+    TELEGRAM_API_URL: str = ''
+    BOT_MODE: str = 'polling'
+    WEBHOOK_URL: str = ''
+    WEBHOOK_PATH: str = '/telegram/webhook'
+    WEBHOOK_SECRET: SecretStr = ''
+    WEBHOOK_HOST: str = '0.0.0.0'
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 1
+    UPDATE_DEDUP_TTL: float = 3600
+    BOT_SHUTDOWN_TIMEOUT: float = 60
+
+    WILDBERRIES_BASE_URL: str = 'https://www.wildberries.ru'
+    WILDBERRIES_SEARCH_API_URL: str = 'https://search.wb.ru/exactmatch/ru/common/v5/search'
+    WILDBERRIES_DEST: int = -1257786
+    CATALOG_ENGINE: str = 'browser'
+    CATALOG_HTTP_MAX_CONNECTIONS: int = 20
+    CATALOG_HTTP_TIMEOUT: float = 10
+    CATALOG_HTTP_BLOCK_COOLDOWN: float = 300
 
     PAGE_SCROLLING_SPEED: float = 0.3
+    PAGE_SCROLL_TIMEOUT: float = 15
+    CATALOG_PAGE_SIZE: int = 100
     MAX_N_PAGES_TO_SEARCH_IN_CATALOG: int = 30
+    CATALOG_PAGES_WINDOW_SIZE: int = 5
+    MAX_OPEN_PAGES: int = 8
+    BROWSER_WORKERS: int = 1
+    BLOCK_HEAVY_RESOURCES: bool = True
+    CONTEXT_MAX_PAGES: int = 500
+    BROWSER_MAX_RSS_MB: int = 1500
+    BROWSER_MEMORY_CHECK_INTERVAL: float = 15
+    BROWSER_CRASH_RETRIES: int = 1
+    PAGE_GOTO_TIMEOUT: float = 15
+    PAGE_SELECTOR_TIMEOUT: float = 10
+    PAGE_LOAD_RETRIES: int = 2
+    PAGE_RETRY_BACKOFF: float = 0.5
+    PAGE_HEDGE_PERCENTILE: float = 0
+    PAGE_HEDGE_MIN_SAMPLES: int = 20
+
+    SERP_CACHE_TTL: float = 600
+    SERP_CACHE_MAX_ENTRIES: int = 5000
+    SERP_CACHE_SQLITE_PATH: str = ''
+
+    DESCRIPTION_CACHE_TTL: float = 3600
+    DESCRIPTION_CACHE_MAX_ENTRIES: int = 1000
+
+    QUERY_EXTRACTOR: str = 'rake'
+    QUERY_EXTRACTION_IDF_PATH: str = ''
+    QUERY_EXTRACTION_EXECUTOR: str = 'process'
+    QUERY_EXTRACTION_WORKERS: int = 2
+    QUERY_EXTRACTION_CACHE_SIZE: int = 1024
+    QUERY_SCREENING_TOP_K: int = 3
+    PRODUCT_PAGES_BUDGET: int = 60
+
+    NLTK_DATA_DIR: str = ''
+    NLTK_DOWNLOAD_MISSING: bool = False
+
+    JOB_QUEUE_ENABLED: bool = False
+    REDIS_URL: str = 'redis://localhost:6379/0'
+    JOB_QUEUE_NAME: str = 'wb:lookups'
+    JOB_VISIBILITY_TIMEOUT: float = 300
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 5
+    JOB_DEAD_MAX_JOBS: int = 1000
+    WORKER_CONCURRENCY: int = 2
+
+    BULK_CONCURRENCY: int = 4
+
+    POSITION_HISTORY_PATH: str = ''
+    WARM_START_RADIUS: int = 2
+    TRACKING_INTERVAL: float = 86400
+    TRACKING_PAGES_BUDGET: int = 1000
+    TRACKING_CONCURRENCY: int = 4
+
+    METRICS_PORT: int = 9100
+    OTEL_ENABLED: bool = False
 
     class Config:
         env_file = Path(BASE_DIR, 'settings', 'env')
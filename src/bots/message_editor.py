@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Tuple, Union
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from loguru import logger
+
+from settings.config import settings
+
+# Редактирует сообщение-ответ пользователю: (текст, parse_mode)
+MessageEditor = Callable[[str, Union[str, None]], Awaitable[None]]
+
+
+class ThrottledMessageEditor:
+    """
+    Редактирует сообщение не чаще раза в TELEGRAM_EDIT_INTERVAL секунд.
+    Промежуточные версии текста, пришедшие за интервал, схлопываются в последнюю.
+    При ответе Telegram `retry after` ждет указанное время и повторяет редактирование.
+    """
+
+    def __init__(self, edit_message: MessageEditor, interval: float = None) -> None:
+        self._edit_message = edit_message
+        self._interval = interval if interval is not None else settings.TELEGRAM_EDIT_INTERVAL
+
+        self._pending: Union[Tuple[str, Union[str, None]], None] = None
+        self._last_sent: Union[Tuple[str, Union[str, None]], None] = None
+        self._last_sent_at = 0.0
+        self._sender: Union[asyncio.Task, None] = None
+
+    def update(self, text: str, parse_mode: Union[str, None] = None) -> None:
+        """ Запоминает новую версию текста, она будет отправлена при ближайшей возможности """
+        self._pending = (text, parse_mode)
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self.__send_pending())
+
+    async def flush(self, text: str, parse_mode: Union[str, None] = None) -> None:
+        """
+        Отправляет итоговую версию текста, дождавшись интервала после предыдущего редактирования.
+        Ошибки итогового редактирования пробрасываются.
+        """
+        self._pending = None
+        if self._sender is not None:
+            await asyncio.gather(self._sender, return_exceptions=True)
+
+        await self.__wait_for_interval()
+        await self.__send(text=text, parse_mode=parse_mode)
+
+    async def close(self) -> None:
+        """ Отменяет неотправленные промежуточные версии """
+        self._pending = None
+        if self._sender is not None:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+
+    async def __send_pending(self) -> None:
+        while self._pending is not None:
+            await self.__wait_for_interval()
+            if self._pending is None:
+                return
+
+            text, parse_mode = self._pending
+            self._pending = None
+            try:
+                await self.__send(text=text, parse_mode=parse_mode)
+            except Exception as e:
+                # Промежуточные версии не критичны, итоговую отправит flush
+                logger.warning(f'Не удалось обновить сообщение: {e}')
+
+    async def __wait_for_interval(self) -> None:
+        wait_time = self._last_sent_at + self._interval - time.monotonic()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+    async def __send(self, text: str, parse_mode: Union[str, None]) -> None:
+        if self._last_sent == (text, parse_mode):
+            return
+
+        try:
+            await self._edit_message(text, parse_mode)
+        except TelegramRetryAfter as e:
+            logger.info(f'Telegram ограничил частоту редактирования, жду {e.retry_after} с')
+            await asyncio.sleep(e.retry_after)
+            await self._edit_message(text, parse_mode)
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                raise
+
+        self._last_sent = (text, parse_mode)
+        self._last_sent_at = time.monotonic()
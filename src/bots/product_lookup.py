@@ -0,0 +1,193 @@
+from typing import Dict, Hashable, List
+
+from loguru import logger
+
+from settings.config import settings
+from src.bots.message_editor import MessageEditor, ThrottledMessageEditor
+from src.monitoring.metrics import LOOKUPS, LOOKUPS_IN_PROGRESS, span
+from src.queries_extraction.executor import AsyncQueryExtractor
+from src.scrappers.exceptions import ProductNotFound
+from src.scrappers.models import CatalogPage, QuerySearchResult
+from src.scrappers.wildberries.query_screening import QueryScreener
+from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+from src.scrappers.wildberries.wildberries_product import WildberriesProductScrapper
+
+# Причина пропуска запроса при отборе -> текст в ответе
+SKIPPED_QUERY_TEXTS = {
+    'no_results': 'пропущен, по запросу ничего не нашлось',
+    'low_rank': 'пропущен, есть более подходящие запросы',
+    'budget': 'пропущен, исчерпан лимит страниц на товар',
+}
+
+
+class ProductLookup:
+    """
+    Полный цикл поиска позиций товара: описание -> запросы -> позиции.
+    Используется и ботом при обработке сообщения, и воркерами очереди задач.
+    """
+
+    def __init__(
+            self,
+            product_scrapper: WildberriesProductScrapper,
+            catalog_scrapper: WildberriesCatalogScrapper,
+            queries_extractor: AsyncQueryExtractor,
+    ) -> None:
+        self._product_scrapper = product_scrapper
+        self._catalog_scrapper = catalog_scrapper
+        self._queries_extractor = queries_extractor
+        self._query_screener = QueryScreener(catalog_scrapper=catalog_scrapper)
+
+    async def run(self, product_url: str, owner: Hashable, edit_message: MessageEditor) -> None:
+        """
+        * Пытается получить описание товара
+        * Выделяет потенциальные запросы
+        * Отбирает запросы по первой странице выдачи
+        * Запускает поиск позиций товара на сайте
+
+        Прогресс и итог пишутся в сообщение-ответ через edit_message.
+
+        :param product_url: Ссылка на товар
+        :param owner: Владелец запроса (id чата) для честного распределения вкладок
+        :param edit_message: Функция редактирования сообщения-ответа
+        """
+        with LOOKUPS_IN_PROGRESS.track_inprogress(), span('lookup', 'total'):
+            try:
+                result = await self.__run(product_url=product_url, owner=owner, edit_message=edit_message)
+            except Exception:
+                LOOKUPS.labels('error').inc()
+                raise
+        LOOKUPS.labels(result).inc()
+
+    async def __run(self, product_url: str, owner: Hashable, edit_message: MessageEditor) -> str:
+        """ Выполняет поиск и возвращает его результат для метрик: found, not_found, failed, product_not_found """
+
+        # product description block
+        try:
+            with span('lookup', 'description', expected=(ProductNotFound,)):
+                product_description = await self._product_scrapper.get_product_description(
+                    url=product_url,
+                    owner=owner,
+                )
+            logger.debug(f'Описание товара: {product_description}\n Если оно верное, то первый бастион взят!!!')
+        except ProductNotFound:
+            await edit_message('Не удалось найти товар, проверьте актуальность ссылки', None)
+            return 'product_not_found'
+
+        # query extracting block
+        with span('lookup', 'queries'):
+            queries = await self._queries_extractor.extract_queries(product_description)
+        logger.debug(f'Возможные запросы товара: {queries}')
+
+        queries_msg = "\n".join(queries)
+        new_message = f'Найдены возможные запросы:\n{queries_msg}'
+        logger.debug(f'Обновляю отправленное сообщение. Новое сообщение:\n{new_message}')
+        await edit_message(new_message, None)
+
+        # search positions block
+
+        # # Тк не успел прикрутить нормальную ML модель и найти бесплатную API LLM для выделения запросов
+        # # для теста парсинга лучше прописать поисковые запросы в этом списке
+
+        # queries = [
+        #     'зонт мужской автомат',
+        #     'зонт мужской',
+        # ]
+
+        # query screening block
+        page_budgets = None
+        skipped: Dict[str, str] = {}
+        first_pages: List[CatalogPage] = []
+        if settings.QUERY_SCREENING_TOP_K > 0:
+            with span('lookup', 'screening'):
+                screened = await self._query_screener.screen(product_url=product_url, queries=queries, owner=owner)
+            page_budgets = {
+                screened_query.query: screened_query.page_budget for screened_query in screened
+                if screened_query.page_budget
+            }
+            skipped = {
+                screened_query.query: screened_query.skip_reason for screened_query in screened
+                if not screened_query.page_budget
+            }
+            first_pages = [
+                screened_query.first_page for screened_query in screened
+                if screened_query.page_budget and screened_query.first_page is not None
+            ]
+
+        positions: Dict[str, QuerySearchResult] = {}
+        pages_scanned: Dict[str, int] = {}
+        editor = ThrottledMessageEditor(edit_message=edit_message)
+
+        def on_progress(query: str, page_number: int) -> None:
+            pages_scanned[query] = max(pages_scanned.get(query, 0), page_number)
+            editor.update(self.format_response_message(queries, positions, pages_scanned, skipped), 'HTML')
+
+        try:
+            with span('lookup', 'positions'):
+                # Результат каждого запроса показываем сразу, не дожидаясь остальных
+                async for query, search_result in self._catalog_scrapper.iter_product_positions(
+                        product_url=product_url,
+                        queries=[query for query in queries if query not in skipped],
+                        owner=owner,
+                        on_progress=on_progress,
+                        page_budgets=page_budgets,
+                        known_pages=first_pages,
+                ):
+                    positions[query] = search_result
+                    editor.update(self.format_response_message(queries, positions, pages_scanned, skipped), 'HTML')
+        finally:
+            await editor.close()
+        logger.info(f'По выделенным запросам товар находится на: {positions}')
+
+        # forming answer
+
+        reply = self.format_response_message(queries, positions, skipped=skipped)
+
+        logger.debug(f'Попытка отправить сообщение:\n {reply}')
+        await editor.flush(reply, 'HTML')
+
+        if any(search_result.found for search_result in positions.values()):
+            return 'found'
+        if any(search_result.status == 'failed' for search_result in positions.values()):
+            return 'failed'
+        return 'not_found'
+
+    @staticmethod
+    def format_response_message(
+            queries: List[str],
+            queries_positions: Dict[str, QuerySearchResult],
+            pages_scanned: Dict[str, int] = None,
+            skipped: Dict[str, str] = None,
+    ) -> str:
+        """
+        Формируем ответ содержащий позиции товаров в зависимости от запросов.
+        Для еще не завершенных запросов выводится, до какой страницы дошел поиск,
+        для отброшенных при отборе (skipped: запрос -> причина) - почему поиск по ним не шел.
+        """
+        pages_scanned = pages_scanned or {}
+        skipped = skipped or {}
+        message_lines = ["Товар по запросам:\n"]
+
+        for query in queries:
+            if query in skipped:
+                position_text = SKIPPED_QUERY_TEXTS.get(skipped[query], 'пропущен')
+            elif query not in queries_positions:
+                page_number = pages_scanned.get(query)
+                position_text = f'ищу, страница {page_number}' if page_number else 'ищу...'
+            elif (search_result := queries_positions[query]).found:
+                position = search_result.position
+                position_text = (
+                    f'найден на {position.page_number} странице {position.position_on_page} позиции\n'
+                    f'<a href="{position.page_url}">ссылка на страницу</a>'
+                )
+            elif search_result.status == 'not_found' and search_result.total_pages == search_result.pages_checked:
+                position_text = f'не найден, проверена вся выдача ({search_result.total_results} товаров)'
+            elif search_result.status == 'not_found':
+                position_text = f'не найден, проверено страниц: {search_result.pages_checked}'
+            elif search_result.failed_pages:
+                pages = ', '.join(map(str, search_result.failed_pages))
+                position_text = f'не найден, но не загрузились страницы: {pages}. Попробуйте позже'
+            else:
+                position_text = 'ошибка поиска, попробуйте позже'
+            message_lines.append(f'<b>{query}</b>: {position_text}')
+
+        return '\n'.join(message_lines)
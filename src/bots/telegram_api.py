@@ -0,0 +1,16 @@
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from settings.config import settings
+
+
+def create_bot() -> Bot:
+    """
+    Клиент Bot API с токеном BOT_TOKEN.
+    TELEGRAM_API_URL - адрес другого сервера Bot API: собственного или локальной замены Telegram в тестах
+    """
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.BOT_TOKEN.get_secret_value(), session=session)
@@ -1,18 +1,29 @@
+import asyncio
 import re
+import signal
 import sys
-from typing import Dict
+from typing import Set, Union
 
-from aiogram import Dispatcher, Bot, Router, F
+from aiogram import Dispatcher, Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
 from loguru import logger
 
 from settings.config import settings
-from src.queries_extraction.rake import RAKEQueryExtractor
-from src.scrappers.exceptions import ProductNotFound
-from src.scrappers.models import ProductPosition
+from src.bots.product_lookup import ProductLookup
+from src.bots.telegram_api import create_bot
+from src.bots.update_dedup import UpdateDeduplicationMiddleware
+from src.jobs.models import ProductLookupJob
+from src.jobs.queue import JobQueue, create_redis, is_in_process_redis
+from src.monitoring.metrics import register_browser_backend, span
+from src.queries_extraction.executor import AsyncQueryExtractor
+from src.scrappers.wildberries.browser_backend import BrowserBackend
 from src.scrappers.wildberries.wildberries_product import WildberriesProductScrapper
 from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+from src.scrappers.wildberries.wildberries_catalog_http import create_catalog_scrapper
+from src.startup import StartupReport
 
 logger.remove()
 logger.add(sys.stderr, level="INFO")
@@ -27,35 +38,191 @@ class TelegramBot:
     Требует для работы определения переменой BOT_TOKEN в переменных окружения settings.env
     """
 
-    def __init__(self) -> None:
-        self._bot = Bot(token=settings.BOT_TOKEN.get_secret_value())
+    def __init__(self, startup_report: StartupReport = None, worker_index: int = 0) -> None:
+        """
+        :param startup_report: Отчет о времени запуска, в который бот допишет свои этапы
+        :param worker_index: Номер процесса бота при WEBHOOK_WORKERS > 1. Webhook регистрирует только нулевой
+        """
+        if settings.JOB_QUEUE_ENABLED and is_in_process_redis():
+            raise ValueError(
+                f'REDIS_URL={settings.REDIS_URL} доступен только внутри процесса бота, воркеры не увидят '
+                f'его задачи. Для JOB_QUEUE_ENABLED укажите общий Redis'
+            )
+        self._startup_report = startup_report or StartupReport()
+        self._worker_index = worker_index
+
+        self._bot = create_bot()
         self._router = Router()
 
         self._dp = Dispatcher()
         self._dp.include_router(self._router)
 
-        self._wb_product_scrapper = WildberriesProductScrapper()
-        self._wb_catalog_scrapper = WildberriesCatalogScrapper()
+        # При включенной очереди поиск выполняют воркеры, браузеры и пул извлечения запросов боту не нужны
+        self._browser_backend: Union[BrowserBackend, None] = None
+        self._wb_product_scrapper: Union[WildberriesProductScrapper, None] = None
+        self._wb_catalog_scrapper: Union[WildberriesCatalogScrapper, None] = None
+        self._queries_extractor: Union[AsyncQueryExtractor, None] = None
+        self._product_lookup: Union[ProductLookup, None] = None
+        if not settings.JOB_QUEUE_ENABLED:
+            # Оба скраппера работают на общем наборе браузеров
+            self._browser_backend = BrowserBackend()
+            register_browser_backend(self._browser_backend)
+            self._wb_product_scrapper = WildberriesProductScrapper(backend=self._browser_backend)
+            self._wb_catalog_scrapper = create_catalog_scrapper(backend=self._browser_backend)
+
+            self._queries_extractor = AsyncQueryExtractor()
+            self._product_lookup = ProductLookup(
+                product_scrapper=self._wb_product_scrapper,
+                catalog_scrapper=self._wb_catalog_scrapper,
+                queries_extractor=self._queries_extractor,
+            )
+        self._warm_up_task: asyncio.Task = None
+        # Обработчики сообщений со ссылками, которые нужно доработать перед остановкой
+        self._lookups: Set[asyncio.Task] = set()
+
+        # Повторы обновлений отсекаются только в режиме webhook: их может принять любой из воркеров
+        deduplicate_updates = settings.BOT_MODE == 'webhook' and settings.UPDATE_DEDUP_TTL > 0
+        self._redis = create_redis() if settings.JOB_QUEUE_ENABLED or deduplicate_updates else None
+        if deduplicate_updates:
+            self._dp.update.outer_middleware(UpdateDeduplicationMiddleware(redis=self._redis))
 
-        self._queries_extractor = RAKEQueryExtractor()
+        # При включенной очереди бот только ставит задачи, поиск выполняют отдельные воркеры
+        self._job_queue = JobQueue(redis=self._redis) if settings.JOB_QUEUE_ENABLED else None
 
     async def start_bot(self) -> None:
-        logger.info('Запуск ТГ бота')
+        """
+        Запуск бота в режиме BOT_MODE: polling или webhook. Прием обновлений начинается сразу,
+        а браузеры и пул извлечения запросов прогреваются в фоне.
+        Пришедшие до конца прогрева сообщения дождутся запуска браузеров внутри скрапперов.
+
+        По SIGINT/SIGTERM бот перестает принимать обновления, дожидается начатых поисков
+        не дольше BOT_SHUTDOWN_TIMEOUT и закрывает скрапперы.
+        """
+        if settings.BOT_MODE not in ('polling', 'webhook'):
+            raise ValueError(f'Неизвестный BOT_MODE={settings.BOT_MODE}, доступны: polling, webhook')
+        logger.info(f'Запуск ТГ бота в режиме {settings.BOT_MODE}')
 
-        await self._wb_product_scrapper.init()
-        await self._wb_catalog_scrapper.init()
+        if self._job_queue is None:
+            self._warm_up_task = asyncio.create_task(self.__warm_up())
 
         self.__register_routs()
-        await self._dp.start_polling(self._bot)
+        try:
+            if settings.BOT_MODE == 'webhook':
+                await self.__run_webhook()
+            else:
+                # Оставшийся от режима webhook адрес не дает получать обновления через polling
+                await self._bot.delete_webhook()
+                self._startup_report.mark('Запуск polling')
+                # Сессию бота закрывает stop_bot: через нее дорабатывающие поиски редактируют ответы
+                await self._dp.start_polling(self._bot, close_bot_session=False)
+        finally:
+            await self.stop_bot()
 
     async def stop_bot(self) -> None:
         logger.info('Остановка ТГ бота')
 
-        await self._wb_product_scrapper.close()
+        if self._warm_up_task and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+
+        await self.__drain_lookups()
+
+        if self._product_lookup is not None:
+            await self._wb_product_scrapper.close()
+            await self._wb_catalog_scrapper.close()
+            await self._browser_backend.close()
+            self._queries_extractor.close()
+        if self._redis is not None:
+            await self._redis.aclose()
         await self._bot.session.close()
 
         logger.info('Бот завершен успешно')
 
+    async def __run_webhook(self) -> None:
+        """
+        Прием обновлений на WEBHOOK_HOST:WEBHOOK_PORT до сигнала остановки. Telegram получает ответ сразу,
+        обновление обрабатывается в фоне. При WEBHOOK_WORKERS > 1 порт одновременно слушают все процессы бота
+        """
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self._dp,
+            bot=self._bot,
+            secret_token=settings.WEBHOOK_SECRET.get_secret_value() or None,
+        ).register(app, path=settings.WEBHOOK_PATH)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(
+            runner,
+            host=settings.WEBHOOK_HOST,
+            port=settings.WEBHOOK_PORT,
+            reuse_port=settings.WEBHOOK_WORKERS > 1 or None,
+        )
+        await site.start()
+        logger.info(f'Webhook принимает обновления на {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}'
+                    f'{settings.WEBHOOK_PATH}')
+        self._startup_report.mark('Запуск webhook')
+
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        try:
+            if self._worker_index == 0:
+                await self.__set_webhook()
+            await stopping.wait()
+        finally:
+            # Непринятые обновления Telegram доставит другим воркерам или повторит после перезапуска
+            await site.stop()
+            await self.__drain_lookups()
+            await runner.cleanup()
+
+    async def __set_webhook(self) -> None:
+        """ Регистрирует адрес webhook в Telegram. Без WEBHOOK_URL адрес должен быть зарегистрирован заранее """
+        if not settings.WEBHOOK_URL:
+            logger.warning('WEBHOOK_URL не задан, бот ожидает, что webhook уже зарегистрирован в Telegram')
+            return
+
+        url = settings.WEBHOOK_URL.rstrip('/') + settings.WEBHOOK_PATH
+        await self._bot.set_webhook(
+            url=url,
+            secret_token=settings.WEBHOOK_SECRET.get_secret_value() or None,
+            allowed_updates=self._dp.resolve_used_update_types(),
+        )
+        logger.info(f'Webhook зарегистрирован: {url}')
+
+    async def __drain_lookups(self) -> None:
+        """ Дожидается начатых поисков, не уложившиеся в BOT_SHUTDOWN_TIMEOUT отменяются """
+        if not self._lookups:
+            return
+
+        logger.info(f'Дожидаюсь начатых поисков: {len(self._lookups)}')
+        _, pending = await asyncio.wait(set(self._lookups), timeout=settings.BOT_SHUTDOWN_TIMEOUT)
+        if pending:
+            logger.warning(f'Поиски не завершились за {settings.BOT_SHUTDOWN_TIMEOUT} с и будут отменены: '
+                           f'{len(pending)}')
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def __warm_up(self) -> None:
+        """ Фоновый прогрев тяжелых подсистем, ошибки не мешают работе бота """
+
+        async def warm_up_browsers() -> None:
+            await self._browser_backend.start()
+            self._startup_report.mark('Браузеры запущены')
+
+        async def warm_up_queries_extractor() -> None:
+            await self._queries_extractor.warm_up()
+            self._startup_report.mark('Пул извлечения запросов запущен')
+
+        results = await asyncio.gather(warm_up_browsers(), warm_up_queries_extractor(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f'Не удалось прогреть подсистему бота, она будет запущена при первом запросе: {result}')
+
+        self._startup_report.log()
+
     def __register_routs(self) -> None:
         @self._router.message(Command('help'))
         async def start(message: Message):
@@ -81,6 +248,8 @@ class TelegramBot:
 
             * Отвечает на сообщение списком из: `Запрос`, `№ страницы`, `№ позиции на`, `Ссылка на страницу`
             """
+            lookup_task = asyncio.current_task()
+            self._lookups.add(lookup_task)
 
             try:
                 # preparing link
@@ -89,62 +258,37 @@ class TelegramBot:
                 ).group()
                 logger.debug(f'Выделен адрес на <a href="{cropped_url}">товар</a>', parse_mode="HTML")
 
-                replied_message = await message.reply(f'Начинаю поиск потенциальных запросов для товара: {cropped_url}')
-
-                # product description block
-                try:
-                    product_description = await self._wb_product_scrapper.get_product_description(url=cropped_url)
-                    logger.debug(f'Описание товара: {product_description}\n Если оно верное, то первый бастион взят!!!')
-                except ProductNotFound:
-                    await replied_message.edit_text(f'Не удалось найти товар, проверьте актуальность ссылки')
+                with span('bot', 'reply'):
+                    replied_message = await message.reply(
+                        f'Начинаю поиск потенциальных запросов для товара: {cropped_url}'
+                    )
+
+                if self._job_queue is not None:
+                    # Поиск выполнят воркеры, они сами отредактируют ответ по (chat_id, message_id)
+                    lookup_job = ProductLookupJob(
+                        chat_id=message.chat.id,
+                        user_message_id=message.message_id,
+                        reply_message_id=replied_message.message_id,
+                        product_url=cropped_url,
+                    )
+                    with span('bot', 'enqueue'):
+                        await self._job_queue.enqueue(
+                            payload=lookup_job.model_dump(),
+                            job_id=f'{lookup_job.chat_id}:{lookup_job.reply_message_id}',
+                        )
                     return
 
-                # query extracting block
-                queries = self._queries_extractor.extract_query_from_description(product_description)
-                logger.debug(f'Возможные запросы товара: {queries}')
-
-                queries_msg = "\n".join(queries)
-                new_message = f'Найдены возможные запросы:\n{queries_msg}'
-                logger.debug(f'Обновляю отправленное сообщение. Новое сообщение:\n{new_message}')
-                await replied_message.edit_text(new_message)
-
-                # search positions block
+                async def edit_message(text: str, parse_mode: Union[str, None]) -> None:
+                    await replied_message.edit_text(text, parse_mode=parse_mode)
 
-                # # Тк не успел прикрутить нормальную ML модель и найти бесплатную API LLM для выделения запросов
-                # # для теста парсинга лучше прописать поисковые запросы в этом списке
-
-                # queries = [
-                #     'зонт мужской автомат',
-                #     'зонт мужской',
-                # ]
-
-                positions = await self._wb_catalog_scrapper.find_product_positions(product_url=cropped_url, queries=queries)
-                logger.info(f'По выделенным запросам товар находится на: {positions}')
-
-                # forming answer
-
-                reply = self.__format_response_message(queries_positions=positions)
-
-                logger.debug(f'Попытка отправить сообщение:\n {reply}')
-                await replied_message.edit_text(reply, parse_mode="HTML")
+                await self._product_lookup.run(
+                    product_url=cropped_url,
+                    owner=message.chat.id,
+                    edit_message=edit_message,
+                )
 
             except Exception as e:
                 await message.reply(f'При запросе произошла ошибка:\n{e}')
                 raise e
-
-    @staticmethod
-    def __format_response_message(queries_positions: Dict[str, ProductPosition]) -> str:
-        """ Формируем ответ содержащий позиции товаров в зависимости от запросов """
-        message_lines = ["Товар по запросам:\n"]
-
-        for query, position in queries_positions.items():
-            position_text = (
-                f'найден на {position.page_number} странице {position.position_on_page} позиции\n'
-                f'<a href="{position.page_url}">ссылка на страницу</a>'
-                if position else 'не найден'
-            )
-            message_lines.append(f'<b>{query}</b>: {position_text}')
-
-        return '\n'.join(message_lines)
-
-
+            finally:
+                self._lookups.discard(lookup_task)
@@ -0,0 +1,50 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.metrics import DUPLICATE_UPDATES
+
+UPDATE_KEY_PREFIX = 'wb:updates'
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """
+    Пропускает обновления Telegram, которые уже были приняты.
+
+    Telegram повторяет доставку обновления на webhook, если не дождался ответа, и повтор может попасть
+    в другой воркер или другую реплику бота. Отметки о принятых обновлениях хранятся в Redis,
+    поэтому обновление обрабатывается один раз, какой бы процесс его ни принял.
+    """
+
+    def __init__(self, redis: Any, ttl: float = None) -> None:
+        """
+        :param redis: Асинхронный клиент Redis, общий для всех воркеров
+        :param ttl: Сколько секунд помнить принятое обновление, по умолчанию UPDATE_DEDUP_TTL
+        """
+        self._redis = redis
+        self._ttl = ttl or settings.UPDATE_DEDUP_TTL
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        if not await self.__first_delivery(bot_id=data['bot'].id, update_id=event.update_id):
+            logger.info(f'Обновление {event.update_id} уже принято, пропускаю повтор')
+            DUPLICATE_UPDATES.inc()
+            return None
+        return await handler(event, data)
+
+    async def __first_delivery(self, bot_id: int, update_id: int) -> bool:
+        """ Атомарно отмечает обновление принятым. Без Redis обновление обрабатывается, как без дедупликации """
+        try:
+            return bool(await self._redis.set(
+                f'{UPDATE_KEY_PREFIX}:{bot_id}:{update_id}', 1, nx=True, ex=max(1, int(self._ttl))
+            ))
+        except Exception as e:
+            logger.error(f'Не удалось проверить повтор обновления {update_id}, обрабатываю его: {e}')
+            return True
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+from multiprocessing.process import BaseProcess
+from typing import Dict
+
+from loguru import logger
+
+from settings.config import settings
+
+
+def run_webhook_workers(workers: int = None) -> None:
+    """
+    Запускает процессы бота, которые вместе слушают WEBHOOK_PORT в режиме webhook.
+    Каждый процесс - отдельный бот со своими браузерами, обновления между ними распределяет ядро (SO_REUSEPORT).
+
+    Завершившийся воркер перезапускается. По SIGINT/SIGTERM воркеры получают SIGTERM, дорабатывают начатые поиски
+    и закрывают скрапперы, не успевшие за BOT_SHUTDOWN_TIMEOUT завершаются принудительно.
+
+    :param workers: Сколько процессов запустить, по умолчанию WEBHOOK_WORKERS
+    """
+    workers = workers or settings.WEBHOOK_WORKERS
+    # Воркеры запускаются с чистого интерпретатора: fork процесса с event loop и потоками небезопасен
+    context = multiprocessing.get_context('spawn')
+    processes: Dict[int, BaseProcess] = {}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    def start_worker(index: int) -> None:
+        process = context.Process(target=_run_worker, args=(index,), name=f'bot-worker-{index}')
+        process.start()
+        processes[index] = process
+
+    logger.info(f'Запуск {workers} воркеров бота на порту {settings.WEBHOOK_PORT}')
+    for index in range(workers):
+        start_worker(index)
+
+    while not stopping:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            if not stopping and not process.is_alive():
+                logger.error(f'Воркер бота {index} завершился с кодом {process.exitcode}, перезапускаю')
+                start_worker(index)
+
+    logger.info('Остановка воркеров бота: дорабатываются начатые поиски')
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+
+    # Запас сверх BOT_SHUTDOWN_TIMEOUT на закрытие браузеров
+    deadline = time.monotonic() + settings.BOT_SHUTDOWN_TIMEOUT + 15
+    for index, process in processes.items():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f'Воркер бота {index} не завершился вовремя, останавливаю принудительно')
+            process.kill()
+            process.join()
+
+
+def _run_worker(index: int) -> None:
+    """ Точка входа процесса-воркера """
+    from src.bots.tg_bot import TelegramBot
+    from src.monitoring.metrics import start_metrics_server
+
+    if settings.METRICS_PORT:
+        # Порт метрик не делится между процессами, у каждого воркера свой
+        settings.METRICS_PORT += index
+    start_metrics_server()
+
+    asyncio.run(TelegramBot(worker_index=index).start_bot())
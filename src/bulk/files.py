@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List
+
+from src.bulk.models import BulkItem, BulkResult
+from src.scrappers.exceptions import ProductUrlError
+from src.scrappers.wildberries.urls import build_product_url, parse_nm_id
+
+# Разделитель запросов в одной ячейке CSV или строке JSONL
+QUERIES_SEPARATOR = ';'
+
+CSV_COLUMNS = (
+    'index', 'id', 'product_url', 'nm_id', 'status', 'error',
+    'query', 'query_status', 'page_number', 'position_on_page', 'pages_checked', 'total_results',
+    'skip_reason', 'page_url', 'query_error',
+)
+
+
+def detect_format(path: Path) -> str:
+    """ Формат файла по расширению: csv или jsonl """
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        return 'csv'
+    if suffix in ('.jsonl', '.json'):
+        return 'jsonl'
+    raise ValueError(f'Неизвестный формат файла {path}, поддерживаются .csv и .jsonl')
+
+
+def read_items(path: Path) -> Iterator[BulkItem]:
+    """
+    Построчно читает записи входного файла, файл целиком в память не загружается.
+
+    Колонки CSV и ключи JSONL:
+    * url или nm_id - ссылка на товар или его артикул
+    * queries - необязательные явные запросы: список в JSONL или строка через `;`
+    * id - необязательный id записи, переносится в результат
+    """
+    if detect_format(path) == 'csv':
+        with path.open(encoding='utf-8-sig', newline='') as file:
+            for index, row in enumerate(csv.DictReader(file)):
+                yield _parse_record(index=index, record={
+                    (name or '').strip().lower(): value for name, value in row.items()
+                })
+        return
+
+    with path.open(encoding='utf-8') as file:
+        index = 0
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('ожидается объект')
+            except ValueError as e:
+                yield BulkItem(index=index, error=f'Не удалось разобрать строку: {e}')
+            else:
+                yield _parse_record(index=index, record=record)
+            index += 1
+
+
+def _parse_record(index: int, record: Dict[str, Any]) -> BulkItem:
+    """ Запись входного файла -> товар. Ссылка приводится к виду `WILDBERRIES_BASE_URL/catalog/<nm_id>/detail.aspx` """
+    item_id = str(record.get('id') or '')
+    url = str(record.get('url') or record.get('product_url') or '').strip()
+    nm_id = str(record.get('nm_id') or '').strip()
+
+    try:
+        nm_id = int(nm_id) if nm_id else parse_nm_id(url)
+    except (ValueError, ProductUrlError):
+        return BulkItem(index=index, id=item_id, error=f'Не найден артикул товара: url={url!r}, nm_id={nm_id!r}')
+
+    queries = record.get('queries') or []
+    if isinstance(queries, str):
+        queries = queries.split(QUERIES_SEPARATOR)
+
+    return BulkItem(
+        index=index,
+        id=item_id,
+        product_url=build_product_url(nm_id),
+        queries=[str(query).strip() for query in queries if str(query).strip()],
+    )
+
+
+class ResultWriter(ABC):
+    """
+    Дописывает результаты в выходной файл и после каждой записи сбрасывает его на диск.
+    Файл открывается в двоичном режиме, чтобы размер после записи совпадал с позицией для чекпоинта
+    """
+
+    def __init__(self, path: Path, offset: int = 0) -> None:
+        """
+        :param offset: Размер файла по чекпоинту. Все, что дописано после него, - результаты незавершенного
+            прогона, которые не попали в чекпоинт, они отрезаются и будут получены заново
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: BinaryIO = path.open('r+b' if path.exists() else 'w+b')
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def write(self, result: BulkResult) -> int:
+        """ :return: Размер файла после записи """
+        self._file.write(self._format(result).encode('utf-8'))
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+    @abstractmethod
+    def _format(self, result: BulkResult) -> str:
+        """ Текст, который дописывается в файл для одного товара """
+
+
+class JsonlResultWriter(ResultWriter):
+    """ Один товар - одна строка JSON """
+
+    def _format(self, result: BulkResult) -> str:
+        return result.model_dump_json() + '\n'
+
+
+class CsvResultWriter(ResultWriter):
+    """ Один запрос товара - одна строка CSV, товар без запросов - строка с пустыми колонками запроса """
+
+    def __init__(self, path: Path, offset: int = 0) -> None:
+        super().__init__(path=path, offset=offset)
+        if offset == 0:
+            self._file.write(self.__format_rows([dict(zip(CSV_COLUMNS, CSV_COLUMNS))]).encode('utf-8'))
+            self._file.flush()
+
+    def _format(self, result: BulkResult) -> str:
+        item_columns = {
+            'index': result.index,
+            'id': result.id,
+            'product_url': result.product_url,
+            'nm_id': result.nm_id,
+            'status': result.status,
+            'error': result.error,
+        }
+        rows: List[Dict[str, Any]] = [
+            {
+                **item_columns,
+                **query_result.model_dump(exclude={'status', 'error'}),
+                'query_status': query_result.status,
+                'query_error': query_result.error,
+            }
+            for query_result in result.queries
+        ]
+        return self.__format_rows(rows or [item_columns])
+
+    @staticmethod
+    def __format_rows(rows: List[Dict[str, Any]]) -> str:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, lineterminator='\n')
+        writer.writerows({name: '' if value is None else value for name, value in row.items()} for row in rows)
+        return buffer.getvalue()
+
+
+def create_result_writer(path: Path, offset: int = 0) -> ResultWriter:
+    """ Писатель результатов по расширению файла """
+    if detect_format(path) == 'csv':
+        return CsvResultWriter(path=path, offset=offset)
+    return JsonlResultWriter(path=path, offset=offset)
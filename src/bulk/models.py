@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+from typing import List, Literal, Set, Union
+
+from pydantic import BaseModel
+
+
+class BulkItem(BaseModel):
+    # Номер записи во входном файле, по нему ведется чекпоинт
+    index: int
+    # id записи из входного файла, переносится в результат как есть
+    id: str = ''
+    product_url: str = ''
+    # Явные запросы. Пусто - запросы выделяются из описания товара
+    queries: List[str] = []
+    # Почему запись не удалось разобрать
+    error: str = ''
+
+
+class BulkQueryResult(BaseModel):
+    query: str
+    # found, not_found, failed - как в QuerySearchResult, skipped - запрос отброшен при отборе
+    status: Literal['found', 'not_found', 'failed', 'skipped']
+    page_number: Union[int, None] = None
+    position_on_page: Union[int, None] = None
+    page_url: str = ''
+    pages_checked: int = 0
+    total_results: Union[int, None] = None
+    skip_reason: str = ''
+    error: str = ''
+
+
+class BulkResult(BaseModel):
+    index: int
+    id: str = ''
+    product_url: str = ''
+    nm_id: Union[int, None] = None
+    # ok - поиск выполнен, product_not_found - товара нет на сайте, error - запись или поиск не удались
+    status: Literal['ok', 'product_not_found', 'error']
+    queries: List[BulkQueryResult] = []
+    error: str = ''
+
+
+class BulkCheckpoint(BaseModel):
+    """
+    Прогресс пакетной проверки. Записи с номером меньше next_index и из done обработаны,
+    их результаты лежат в выходном файле в первых output_size байтах.
+
+    Записи завершаются не по порядку, но в done остаются только номера после первой незавершенной,
+    поэтому чекпоинт не растет с размером входного файла
+    """
+
+    input_path: str
+    output_path: str
+    next_index: int = 0
+    done: Set[int] = set()
+    output_size: int = 0
+
+    def is_done(self, index: int) -> bool:
+        return index < self.next_index or index in self.done
+
+    def mark_done(self, index: int, output_size: int) -> None:
+        self.done.add(index)
+        while self.next_index in self.done:
+            self.done.remove(self.next_index)
+            self.next_index += 1
+        self.output_size = output_size
+
+    @classmethod
+    def load(cls, path: Path) -> 'BulkCheckpoint':
+        return cls.model_validate_json(path.read_text(encoding='utf-8'))
+
+    def save(self, path: Path) -> None:
+        """ Атомарная запись: при падении посреди записи остается прошлый чекпоинт """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(self.model_dump_json(), encoding='utf-8')
+        os.replace(tmp_path, path)
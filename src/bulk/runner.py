@@ -0,0 +1,270 @@
+"""
+Пакетная проверка позиций товаров без Telegram.
+
+    python bulk.py products.csv results.jsonl
+    python bulk.py products.jsonl results.csv --concurrency 8
+
+Товары читаются из CSV или JSONL построчно, результаты дописываются по мере готовности.
+Прогресс сохраняется в чекпоинт, повторный запуск с теми же файлами продолжает с места остановки.
+"""
+import argparse
+import asyncio
+import signal
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Set
+
+from loguru import logger
+
+from settings.config import settings
+from src.bulk.files import create_result_writer, read_items, ResultWriter
+from src.bulk.models import BulkCheckpoint, BulkItem, BulkQueryResult, BulkResult
+from src.monitoring.metrics import span
+from src.queries_extraction.executor import AsyncQueryExtractor
+from src.scrappers.exceptions import ProductNotFound
+from src.scrappers.models import QuerySearchResult
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.query_screening import QueryScreener
+from src.scrappers.wildberries.urls import parse_nm_id
+from src.scrappers.wildberries.wildberries_catalog_http import create_catalog_scrapper
+from src.scrappers.wildberries.wildberries_product import WildberriesProductScrapper
+
+
+class BulkRunner:
+    """
+    Проверка позиций списка товаров: описание -> запросы -> отбор запросов -> позиции, как у бота.
+    Для записей с явными запросами описание не загружается и запросы не отбираются.
+
+    Одновременно проверяется не больше concurrency товаров, входной файл читается по мере освобождения мест,
+    поэтому память не зависит от размера входного файла.
+    """
+
+    def __init__(self, concurrency: int = None) -> None:
+        """
+        :param concurrency: Сколько товаров проверять одновременно, по умолчанию BULK_CONCURRENCY
+        """
+        self._concurrency = max(1, concurrency or settings.BULK_CONCURRENCY)
+
+        self._browser_backend = BrowserBackend()
+        self._product_scrapper = WildberriesProductScrapper(backend=self._browser_backend)
+        self._catalog_scrapper = create_catalog_scrapper(backend=self._browser_backend)
+        self._queries_extractor = AsyncQueryExtractor()
+        self._query_screener = QueryScreener(catalog_scrapper=self._catalog_scrapper)
+
+        self._stopping = asyncio.Event()
+
+    async def run(
+            self,
+            items: Iterable[BulkItem],
+            writer: ResultWriter,
+            checkpoint: BulkCheckpoint,
+            checkpoint_path: Path,
+    ) -> Dict[str, int]:
+        """
+        Проверяет товары, которых нет в чекпоинте. Результат каждого товара сразу дописывается
+        в выходной файл, после чего товар отмечается в чекпоинте.
+
+        По SIGINT/SIGTERM новые товары не берутся, начатые дорабатываются.
+
+        :return: Сколько товаров проверено по статусам результата и сколько пропущено по чекпоинту
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        counts: Dict[str, int] = {'skipped': 0}
+        slots = asyncio.Semaphore(self._concurrency)
+        tasks: Set[asyncio.Task] = set()
+        started_at = time.monotonic()
+
+        async def process(item: BulkItem) -> None:
+            with span('bulk', 'item'):
+                result = await self.__check_item(item)
+            # Между записью результата и чекпоинтом нет await, другие товары не вклиниваются
+            checkpoint.mark_done(item.index, output_size=writer.write(result))
+            checkpoint.save(checkpoint_path)
+
+            counts[result.status] = counts.get(result.status, 0) + 1
+            checked = sum(counts.values()) - counts['skipped']
+            logger.info(
+                f'Товар {item.index} ({result.nm_id}): {self.__describe_result(result)}. '
+                f'Проверено {checked}, {checked / (time.monotonic() - started_at):.2f} товаров/с'
+            )
+
+        def release(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            slots.release()
+
+        try:
+            for item in items:
+                if checkpoint.is_done(item.index):
+                    counts['skipped'] += 1
+                    continue
+
+                await slots.acquire()
+                if self._stopping.is_set():
+                    slots.release()
+                    break
+
+                task = asyncio.create_task(process(item))
+                tasks.add(task)
+                task.add_done_callback(release)
+        finally:
+            await asyncio.gather(*tasks)
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+
+        if self._stopping.is_set():
+            logger.info('Прогон остановлен, повторный запуск с теми же файлами продолжит его с места остановки')
+        return counts
+
+    def stop(self) -> None:
+        logger.info('Остановка пакетной проверки: дорабатываю начатые товары')
+        self._stopping.set()
+
+    async def close(self) -> None:
+        await self._product_scrapper.close()
+        await self._catalog_scrapper.close()
+        await self._browser_backend.close()
+        self._queries_extractor.close()
+
+    async def __check_item(self, item: BulkItem) -> BulkResult:
+        """ Полный цикл проверки одного товара, ошибки попадают в результат, а не прерывают прогон """
+        result = BulkResult(index=item.index, id=item.id, product_url=item.product_url, status='ok')
+        if item.error:
+            result.status, result.error = 'error', item.error
+            return result
+
+        result.nm_id = parse_nm_id(item.product_url)
+        # Каждый товар - отдельный владелец вкладок, чтобы одновременные товары делили пул поровну
+        owner = f'bulk:{item.index}'
+
+        try:
+            queries = item.queries
+            page_budgets = None
+            first_pages = []
+            if not queries:
+                description = await self._product_scrapper.get_product_description(url=item.product_url, owner=owner)
+                queries = await self._queries_extractor.extract_queries(description)
+
+                if settings.QUERY_SCREENING_TOP_K > 0:
+                    screened = await self._query_screener.screen(
+                        product_url=item.product_url, queries=queries, owner=owner
+                    )
+                    page_budgets = {
+                        screened_query.query: screened_query.page_budget for screened_query in screened
+                        if screened_query.page_budget
+                    }
+                    result.queries = [
+                        BulkQueryResult(query=screened_query.query, status='skipped',
+                                        total_results=screened_query.total_results,
+                                        skip_reason=screened_query.skip_reason)
+                        for screened_query in screened if not screened_query.page_budget
+                    ]
+                    queries = [query for query in queries if query in page_budgets]
+                    first_pages = [
+                        screened_query.first_page for screened_query in screened
+                        if screened_query.page_budget and screened_query.first_page is not None
+                    ]
+
+            positions = await self._catalog_scrapper.find_product_positions(
+                product_url=item.product_url,
+                queries=queries,
+                owner=owner,
+                page_budgets=page_budgets,
+                known_pages=first_pages,
+            )
+        except ProductNotFound:
+            result.status = 'product_not_found'
+            return result
+        except Exception as e:
+            logger.exception(f'Ошибка при проверке товара {item.index} ({item.product_url}): {e}')
+            result.status, result.error = 'error', f'{type(e).__name__}: {e}'
+            return result
+
+        result.queries = [
+            self.__convert_search_result(query, search_result) for query, search_result in positions.items()
+        ] + result.queries
+        return result
+
+    @staticmethod
+    def __convert_search_result(query: str, search_result: QuerySearchResult) -> BulkQueryResult:
+        position = search_result.position
+        return BulkQueryResult(
+            query=query,
+            status=search_result.status,
+            page_number=position.page_number if position else None,
+            position_on_page=position.position_on_page if position else None,
+            page_url=position.page_url if position else '',
+            pages_checked=search_result.pages_checked,
+            total_results=search_result.total_results,
+            error=search_result.error,
+        )
+
+    @staticmethod
+    def __describe_result(result: BulkResult) -> str:
+        if result.status != 'ok':
+            return result.error or result.status
+        found = sum(query_result.status == 'found' for query_result in result.queries)
+        return f'найден по {found} из {len(result.queries)} запросов'
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Пакетная проверка позиций товаров Wildberries')
+    parser.add_argument('input', type=Path,
+                        help='CSV или JSONL с колонками url или nm_id и необязательными queries и id')
+    parser.add_argument('output', type=Path, help='Куда писать результаты: .jsonl или .csv')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Сколько товаров проверять одновременно, по умолчанию BULK_CONCURRENCY')
+    parser.add_argument('--checkpoint', type=Path, default=None,
+                        help='Файл прогресса, по умолчанию <output>.checkpoint.json')
+    parser.add_argument('--restart', action='store_true',
+                        help='Начать заново, не продолжая прогон из чекпоинта')
+    return parser.parse_args()
+
+
+def load_checkpoint(args: argparse.Namespace, checkpoint_path: Path) -> BulkCheckpoint:
+    """ Чекпоинт прошлого прогона тех же файлов или новый """
+    checkpoint = BulkCheckpoint(input_path=str(args.input.resolve()), output_path=str(args.output.resolve()))
+    if args.restart or not checkpoint_path.exists():
+        return checkpoint
+
+    saved = BulkCheckpoint.load(checkpoint_path)
+    if (saved.input_path, saved.output_path) != (checkpoint.input_path, checkpoint.output_path):
+        raise SystemExit(
+            f'Чекпоинт {checkpoint_path} относится к прогону {saved.input_path} -> {saved.output_path}. '
+            f'Укажите другой --checkpoint или --restart'
+        )
+    if not args.output.exists() or args.output.stat().st_size < saved.output_size:
+        raise SystemExit(f'Выходной файл {args.output} короче, чем записано в чекпоинте. Запустите с --restart')
+
+    logger.info(f'Продолжаю прогон из чекпоинта: проверено товаров {saved.next_index + len(saved.done)}')
+    return saved
+
+
+async def run_bulk(args: argparse.Namespace) -> Dict[str, int]:
+    checkpoint_path = args.checkpoint or args.output.with_name(args.output.name + '.checkpoint.json')
+    checkpoint = load_checkpoint(args=args, checkpoint_path=checkpoint_path)
+
+    runner = BulkRunner(concurrency=args.concurrency)
+    writer = create_result_writer(path=args.output, offset=checkpoint.output_size)
+    try:
+        return await runner.run(
+            items=read_items(args.input),
+            writer=writer,
+            checkpoint=checkpoint,
+            checkpoint_path=checkpoint_path,
+        )
+    finally:
+        writer.close()
+        await runner.close()
+
+
+def main() -> None:
+    args = parse_args()
+    counts = asyncio.run(run_bulk(args))
+    logger.info('Пакетная проверка завершена: ' + ', '.join(f'{status} {count}' for status, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Tuple, Union
+
+
+class CacheBackend:
+    """ Хранилище значений кеша со сроком жизни. Значения должны сериализоваться в JSON """
+
+    async def get(self, key: str) -> Union[Any, None]:
+        entry = await self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def get_entry(self, key: str) -> Union[Tuple[Any, float], None]:
+        """ Значение и сколько секунд ему осталось жить или None """
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """ LRU кеш в памяти процесса, ограниченный числом записей """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_entry(self, key: str) -> Union[Tuple[Any, float], None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        ttl = expires_at - time.monotonic()
+        if ttl <= 0:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value, ttl
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    Кеш в файле SQLite, переживающий перезапуск. При превышении max_entries
+    удаляются записи, к которым дольше всего не обращались
+    """
+
+    def __init__(self, path: Union[str, Path], max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+
+    async def get_entry(self, key: str) -> Union[Tuple[Any, float], None]:
+        return await asyncio.to_thread(self.__get_entry, key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await asyncio.to_thread(self.__set, key, json.dumps(value, ensure_ascii=False), ttl)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __get_entry(self, key: str) -> Union[Tuple[Any, float], None]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at <= now:
+                self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return None
+
+            self._connection.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(value), expires_at - now
+
+    def __set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now),
+            )
+            self._connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self._max_entries,),
+            )
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Union
+
+from loguru import logger
+from pydantic import BaseModel
+
+from src.caching.backends import CacheBackend, MemoryCacheBackend
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+
+
+class AsyncCache:
+    """
+    Кеш с загрузкой по промаху.
+
+    * Сначала проверяется LRU в памяти, затем постоянное хранилище, если оно задано.
+      Запись из постоянного хранилища попадает в память с оставшимся сроком жизни, а не с полным
+    * Одновременные промахи по одному ключу объединяются в одну загрузку
+    * Если loader падает, ошибка получат все ожидающие, в кеш ничего не пишется
+    """
+
+    def __init__(
+            self,
+            ttl: float,
+            max_entries: int,
+            persistent_backend: Union[CacheBackend, None] = None,
+    ) -> None:
+        self._ttl = ttl
+        self._memory = MemoryCacheBackend(max_entries=max_entries)
+        self._persistent = persistent_backend
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._stats = CacheStats()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats.model_copy()
+
+    async def get(self, key: str) -> Union[Any, None]:
+        """ Значение из кеша или None """
+        value = await self._memory.get(key)
+        if value is None and self._persistent is not None:
+            entry = await self._persistent.get_entry(key)
+            if entry is not None:
+                value, ttl = entry
+                await self._memory.set(key, value, ttl)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        await self._memory.set(key, value, self._ttl)
+        if self._persistent is not None:
+            await self._persistent.set(key, value, self._ttl)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает значение из кеша, а при промахе загружает его через loader.
+        Если по ключу уже идет загрузка, ждет ее результата вместо повторной загрузки
+        """
+        value = await self.get(key)
+        if value is not None:
+            self._stats.hits += 1
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._stats.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # Загрузку отменил ее инициатор, загружаем сами
+            return await self.get_or_load(key, loader)
+
+        self._stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await loader()
+            await self.set(key, value)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # Ожидающие не должны падать из-за отмены чужой загрузки, они загрузят сами
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Исключение получено через await loader, не логируем как необработанное в future
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    async def close(self) -> None:
+        if self._persistent is not None:
+            await self._persistent.close()
+        logger.debug(f'Кеш закрыт, статистика: {self._stats}')
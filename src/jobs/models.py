@@ -0,0 +1,21 @@
+import time
+from typing import Any, Dict
+
+from pydantic import BaseModel, Field
+
+
+class Job(BaseModel):
+    id: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    created_at: float = Field(default_factory=time.time)
+    last_error: str = ''
+
+
+class ProductLookupJob(BaseModel):
+    # Сообщение пользователя со ссылкой
+    chat_id: int
+    user_message_id: int
+    # Ответ бота, который редактируется по ходу поиска
+    reply_message_id: int
+    product_url: str
@@ -0,0 +1,237 @@
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Union
+
+from loguru import logger
+
+from settings.config import settings
+from src.jobs.models import Job
+
+IN_PROCESS_REDIS_URL = 'memory://'
+
+
+def is_in_process_redis(url: str = None) -> bool:
+    """ Redis по адресу живет внутри процесса и не виден другим процессам """
+    return (url or settings.REDIS_URL).startswith(IN_PROCESS_REDIS_URL)
+
+
+def create_redis(url: str = None) -> Any:
+    """
+    Создает асинхронный клиент Redis.
+    Адрес `memory://` - встроенная в процесс замена на fakeredis для тестов. Ее данные видит только
+    создавший ее процесс, поэтому для очереди задач между ботом и воркерами она не подходит.
+    """
+    url = url or settings.REDIS_URL
+    if is_in_process_redis(url):
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError as e:
+            raise RuntimeError('Для REDIS_URL=memory:// требуется пакет fakeredis') from e
+        return FakeAsyncRedis(decode_responses=True)
+
+    from redis.asyncio import Redis
+    return Redis.from_url(url, decode_responses=True)
+
+
+class JobQueue:
+    """
+    Надежная очередь задач поверх Redis.
+
+    * pending - список id задач, ожидающих воркера
+    * processing - список id задач, взятых воркерами. Задача переносится туда атомарно через BLMOVE
+    * deadlines - время, до которого воркер должен подтвердить задачу (visibility timeout).
+      Задачи с истекшим временем возвращаются в pending, как если бы воркер упал
+    * delayed - задачи, ожидающие повторной попытки после ошибки
+    * dead - задачи, исчерпавшие попытки или с испорченным телом. Хранятся последние JOB_DEAD_MAX_JOBS,
+      тела более старых удаляются
+    * jobs - тела задач по id
+    """
+
+    def __init__(
+            self,
+            redis: Any,
+            name: str = None,
+            visibility_timeout: float = None,
+            max_attempts: int = None,
+            retry_backoff: float = None,
+            dead_max_jobs: int = None,
+    ) -> None:
+        self._redis = redis
+        self._name = name or settings.JOB_QUEUE_NAME
+        self._visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+        self._max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        self._retry_backoff = retry_backoff if retry_backoff is not None else settings.JOB_RETRY_BACKOFF
+        self._dead_max_jobs = max(1, dead_max_jobs or settings.JOB_DEAD_MAX_JOBS)
+
+    async def enqueue(self, payload: Dict[str, Any], job_id: str = None) -> Union[str, None]:
+        """
+        Ставит задачу в очередь.
+
+        :param job_id: Id задачи, повторная постановка задачи с тем же id игнорируется
+        :return: Id задачи или None, если такая задача уже есть
+        """
+        job = Job(id=job_id or uuid.uuid4().hex, payload=payload)
+        if not await self._redis.hsetnx(self.__key('jobs'), job.id, job.model_dump_json()):
+            logger.info(f'Задача {job.id} уже в очереди')
+            return None
+
+        await self._redis.lpush(self.__key('pending'), job.id)
+        logger.debug(f'Задача {job.id} поставлена в очередь')
+        return job.id
+
+    async def reserve(self, timeout: float = 1) -> Union[Job, None]:
+        """
+        Забирает следующую задачу. Пока задача не подтверждена через ack, она невидима для других воркеров
+        не дольше JOB_VISIBILITY_TIMEOUT.
+
+        :param timeout: Сколько секунд ждать задачу
+        """
+        job_id = await self._redis.blmove(
+            self.__key('pending'), self.__key('processing'), timeout, src='RIGHT', dest='LEFT'
+        )
+        if job_id is None:
+            return None
+
+        await self._redis.zadd(self.__key('deadlines'), {job_id: time.time() + self._visibility_timeout})
+
+        raw_job = await self._redis.hget(self.__key('jobs'), job_id)
+        if raw_job is None:
+            # Тело задачи удалено, например задача уже подтверждена после повторной выдачи
+            await self.__forget(job_id)
+            return None
+
+        job = Job.model_validate_json(raw_job)
+        job.attempts += 1
+        await self._redis.hset(self.__key('jobs'), job.id, job.model_dump_json())
+        return job
+
+    async def extend(self, job: Job) -> None:
+        """ Продлевает время невидимости задачи, пока она обрабатывается """
+        await self._redis.zadd(
+            self.__key('deadlines'), {job.id: time.time() + self._visibility_timeout}, xx=True
+        )
+
+    async def ack(self, job: Job) -> None:
+        """ Подтверждает успешную обработку задачи """
+        await self.__forget(job.id)
+        await self._redis.hdel(self.__key('jobs'), job.id)
+
+    async def nack(self, job: Job, error: str = '') -> bool:
+        """
+        Возвращает задачу после ошибки. Повтор откладывается с экспоненциальной задержкой и разбросом.
+
+        :return: True, если задача будет повторена, False - если попытки кончились и она ушла в dead
+        """
+        job.last_error = error
+        await self._redis.hset(self.__key('jobs'), job.id, job.model_dump_json())
+
+        if not await self._redis.lrem(self.__key('processing'), 1, job.id):
+            # Задачу уже вернул в очередь сборщик просроченных задач
+            return True
+        await self._redis.zrem(self.__key('deadlines'), job.id)
+
+        return await self.__retry_or_bury(job)
+
+    async def bury(self, job: Job, error: str) -> None:
+        """ Переносит задачу в dead без повторов, например если ее тело не удается разобрать """
+        job.last_error = error
+        await self._redis.hset(self.__key('jobs'), job.id, job.model_dump_json())
+        if not await self._redis.lrem(self.__key('processing'), 1, job.id):
+            # Задачу уже вернул в очередь сборщик просроченных задач, повтор она не получит
+            await self._redis.zrem(self.__key('delayed'), job.id)
+            await self._redis.lrem(self.__key('pending'), 0, job.id)
+        await self._redis.zrem(self.__key('deadlines'), job.id)
+
+        logger.error(f'Задача {job.id} отброшена без повторов: {error}')
+        await self.__add_to_dead(job.id)
+
+    async def requeue_expired(self) -> int:
+        """
+        Возвращает в очередь просроченные задачи упавших воркеров и отложенные задачи, время которых пришло.
+        Безопасно вызывать из нескольких воркеров одновременно.
+
+        :return: Сколько задач возвращено в pending
+        """
+        now = time.time()
+        requeued = 0
+
+        for job_id in await self._redis.zrangebyscore(self.__key('delayed'), '-inf', now):
+            if await self._redis.zrem(self.__key('delayed'), job_id):
+                await self._redis.lpush(self.__key('pending'), job_id)
+                requeued += 1
+
+        processing = await self._redis.lrange(self.__key('processing'), 0, -1)
+        for job_id in processing:
+            deadline = await self._redis.zscore(self.__key('deadlines'), job_id)
+            if deadline is None:
+                # Воркер упал между BLMOVE и установкой срока, даем задаче полный срок
+                await self._redis.zadd(
+                    self.__key('deadlines'), {job_id: now + self._visibility_timeout}, nx=True
+                )
+                continue
+            if deadline > now:
+                continue
+
+            # Задачу заберет только тот, кто успел удалить ее из processing
+            if not await self._redis.lrem(self.__key('processing'), 1, job_id):
+                continue
+            await self._redis.zrem(self.__key('deadlines'), job_id)
+
+            raw_job = await self._redis.hget(self.__key('jobs'), job_id)
+            if raw_job is None:
+                continue
+
+            logger.warning(f'Истекло время обработки задачи {job_id}, возвращаю в очередь')
+            job = Job.model_validate_json(raw_job)
+            job.last_error = job.last_error or 'visibility timeout'
+            await self._redis.hset(self.__key('jobs'), job.id, job.model_dump_json())
+            if await self.__retry_or_bury(job, delay=0):
+                requeued += 1
+
+        return requeued
+
+    async def dead_jobs(self) -> List[Job]:
+        """ Задачи, исчерпавшие попытки """
+        jobs = []
+        for job_id in await self._redis.lrange(self.__key('dead'), 0, -1):
+            if raw_job := await self._redis.hget(self.__key('jobs'), job_id):
+                jobs.append(Job.model_validate_json(raw_job))
+        return jobs
+
+    async def stats(self) -> Dict[str, int]:
+        """ Размеры очередей """
+        return {
+            'pending': await self._redis.llen(self.__key('pending')),
+            'processing': await self._redis.llen(self.__key('processing')),
+            'delayed': await self._redis.zcard(self.__key('delayed')),
+            'dead': await self._redis.llen(self.__key('dead')),
+        }
+
+    async def __retry_or_bury(self, job: Job, delay: float = None) -> bool:
+        """ Откладывает повтор задачи или переносит ее в dead """
+        if job.attempts >= self._max_attempts:
+            logger.error(f'Задача {job.id} не выполнена за {job.attempts} попыток: {job.last_error}')
+            await self.__add_to_dead(job.id)
+            return False
+
+        if delay is None:
+            delay = self._retry_backoff * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5)
+        await self._redis.zadd(self.__key('delayed'), {job.id: time.time() + delay})
+        logger.info(f'Задача {job.id} будет повторена через {delay:.1f} с')
+        return True
+
+    async def __add_to_dead(self, job_id: str) -> None:
+        """ Добавляет задачу в dead и удаляет тела задач, вытесненных из него """
+        await self._redis.lpush(self.__key('dead'), job_id)
+        trimmed = await self._redis.lrange(self.__key('dead'), self._dead_max_jobs, -1)
+        if trimmed:
+            await self._redis.ltrim(self.__key('dead'), 0, self._dead_max_jobs - 1)
+            await self._redis.hdel(self.__key('jobs'), *trimmed)
+
+    async def __forget(self, job_id: str) -> None:
+        await self._redis.lrem(self.__key('processing'), 1, job_id)
+        await self._redis.zrem(self.__key('deadlines'), job_id)
+
+    def __key(self, name: str) -> str:
+        return f'{self._name}:{name}'
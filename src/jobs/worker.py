@@ -0,0 +1,169 @@
+import asyncio
+import signal
+import time
+from typing import Set, Union
+
+from loguru import logger
+from pydantic import ValidationError
+
+from settings.config import settings
+from src.bots.product_lookup import ProductLookup
+from src.bots.telegram_api import create_bot
+from src.jobs.models import Job, ProductLookupJob
+from src.jobs.queue import JobQueue, create_redis, is_in_process_redis
+from src.monitoring.metrics import JOB_QUEUE_WAIT, register_browser_backend
+from src.queries_extraction.executor import AsyncQueryExtractor
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.wildberries_catalog_http import create_catalog_scrapper
+from src.scrappers.wildberries.wildberries_product import WildberriesProductScrapper
+
+
+class LookupWorker:
+    """
+    Воркер очереди поиска позиций. Забирает задачи, поставленные ботом, выполняет поиск
+    и редактирует ответ пользователю по (chat_id, message_id). Воркеров можно запускать
+    сколько угодно отдельными процессами, независимо от бота.
+    """
+
+    def __init__(self, queue: JobQueue = None, concurrency: int = None) -> None:
+        if queue is None and is_in_process_redis():
+            raise ValueError(
+                f'REDIS_URL={settings.REDIS_URL} доступен только внутри процесса, воркер не увидит задачи бота. '
+                f'Укажите общий Redis'
+            )
+        self._queue = queue or JobQueue(redis=create_redis())
+        self._concurrency = max(1, concurrency or settings.WORKER_CONCURRENCY)
+
+        self._bot = create_bot()
+        self._browser_backend = BrowserBackend()
+        register_browser_backend(self._browser_backend)
+        self._product_scrapper = WildberriesProductScrapper(backend=self._browser_backend)
+        self._catalog_scrapper = create_catalog_scrapper(backend=self._browser_backend)
+        self._queries_extractor = AsyncQueryExtractor()
+        self._lookup = ProductLookup(
+            product_scrapper=self._product_scrapper,
+            catalog_scrapper=self._catalog_scrapper,
+            queries_extractor=self._queries_extractor,
+        )
+
+        self._stopping = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        """ Основной цикл: берет задачи, пока есть свободные слоты, до сигнала остановки """
+        logger.info(f'Запуск воркера очереди, одновременно задач: {self._concurrency}')
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        await self._browser_backend.start()
+        reaper = asyncio.create_task(self.__reap_expired_jobs())
+        slots = asyncio.Semaphore(self._concurrency)
+
+        try:
+            while not self._stopping.is_set():
+                await slots.acquire()
+                if self._stopping.is_set():
+                    # Сигнал пришел, пока все слоты были заняты
+                    slots.release()
+                    break
+                job = await self.__reserve()
+                if job is None:
+                    slots.release()
+                    continue
+
+                task = asyncio.create_task(self.__process(job))
+                self._tasks.add(task)
+                task.add_done_callback(lambda done_task: (self._tasks.discard(done_task), slots.release()))
+        finally:
+            reaper.cancel()
+            # Дожидаемся взятых задач, новые не берем
+            await asyncio.gather(*self._tasks, reaper, return_exceptions=True)
+            await self.__close()
+
+    def stop(self) -> None:
+        logger.info('Остановка воркера: дорабатываю взятые задачи')
+        self._stopping.set()
+
+    async def __reserve(self) -> Union[Job, None]:
+        try:
+            return await self._queue.reserve(timeout=1)
+        except Exception as e:
+            logger.error(f'Не удалось получить задачу из очереди: {e}')
+            await asyncio.sleep(1)
+            return None
+
+    async def __process(self, job: Job) -> None:
+        """ Выполняет задачу и подтверждает ее, при ошибке возвращает в очередь """
+        try:
+            lookup_job = ProductLookupJob.model_validate(job.payload)
+        except ValidationError as e:
+            # Повтор с тем же телом упадет так же
+            await self._queue.bury(job, error=f'Некорректная задача: {e}')
+            return
+
+        logger.info(f'Беру задачу {job.id}, попытка {job.attempts}: {lookup_job.product_url}')
+        if job.attempts == 1:
+            # У повторов время с постановки включает прошлые попытки
+            JOB_QUEUE_WAIT.observe(time.time() - job.created_at)
+
+        async def edit_message(text: str, parse_mode: Union[str, None]) -> None:
+            await self._bot.edit_message_text(
+                text=text,
+                chat_id=lookup_job.chat_id,
+                message_id=lookup_job.reply_message_id,
+                parse_mode=parse_mode,
+            )
+
+        heartbeat = asyncio.create_task(self.__extend_visibility(job))
+        try:
+            await self._lookup.run(
+                product_url=lookup_job.product_url,
+                owner=lookup_job.chat_id,
+                edit_message=edit_message,
+            )
+        except Exception as e:
+            logger.exception(f'Ошибка при выполнении задачи {job.id}: {e}')
+            if not await self._queue.nack(job, error=str(e)):
+                await self.__notify_failure(lookup_job=lookup_job, error=e)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._queue.ack(job)
+        logger.info(f'Задача {job.id} выполнена')
+
+    async def __extend_visibility(self, job: Job) -> None:
+        """ Продлевает невидимость задачи, пока она выполняется """
+        while True:
+            await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT / 3)
+            await self._queue.extend(job)
+
+    async def __reap_expired_jobs(self) -> None:
+        """ Периодически возвращает в очередь задачи упавших воркеров и отложенные повторы """
+        while True:
+            try:
+                await self._queue.requeue_expired()
+            except Exception as e:
+                logger.error(f'Не удалось вернуть просроченные задачи в очередь: {e}')
+            await asyncio.sleep(1)
+
+    async def __notify_failure(self, lookup_job: ProductLookupJob, error: Exception) -> None:
+        """ Сообщает пользователю об ошибке, когда попытки кончились """
+        try:
+            await self._bot.send_message(
+                chat_id=lookup_job.chat_id,
+                text=f'При запросе произошла ошибка:\n{error}',
+                reply_to_message_id=lookup_job.user_message_id,
+            )
+        except Exception as e:
+            logger.error(f'Не удалось сообщить пользователю об ошибке: {e}')
+
+    async def __close(self) -> None:
+        await self._product_scrapper.close()
+        await self._catalog_scrapper.close()
+        await self._browser_backend.close()
+        self._queries_extractor.close()
+        await self._bot.session.close()
+        logger.info('Воркер остановлен')
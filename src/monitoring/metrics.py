@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Tuple, Type, Union, TYPE_CHECKING
+
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from settings.config import settings
+
+if TYPE_CHECKING:
+    from src.scrappers.wildberries.browser_backend import BrowserBackend
+
+# Границы подобраны под этапы от миллисекунд (разбор карточек) до десятков секунд (прокрутка, полный поиск)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_DURATION = Histogram(
+    'wb_stage_duration_seconds',
+    'Длительность этапов поиска',
+    ['component', 'stage'],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    'wb_stage_errors_total',
+    'Ошибки этапов поиска',
+    ['component', 'stage', 'error'],
+)
+CATALOG_PAGES = Counter(
+    'wb_catalog_pages_total',
+    'Проверенные страницы выдачи по источнику: browser, http, http_blocked, cache, not_found',
+    ['source'],
+)
+PAGE_QUEUE_WAIT = Histogram(
+    'wb_page_queue_wait_seconds',
+    'Ожидание свободной вкладки в пуле',
+    buckets=STAGE_BUCKETS,
+)
+JOB_QUEUE_WAIT = Histogram(
+    'wb_job_queue_wait_seconds',
+    'Время от постановки задачи в очередь до начала ее выполнения',
+    buckets=STAGE_BUCKETS,
+)
+LOAD_RETRIES = Counter(
+    'wb_load_retries_total',
+    'Повторы загрузок страниц после временных ошибок',
+    ['component'],
+)
+HEDGED_LOADS = Counter(
+    'wb_hedged_loads_total',
+    'Дублирующие загрузки медленных страниц по тому, какая загрузка закончилась первой: primary, hedge, failed',
+    ['component', 'winner'],
+)
+SCREENED_QUERIES = Counter(
+    'wb_screened_queries_total',
+    'Запросы после предварительного отбора: selected, no_results, low_rank, budget',
+    ['outcome'],
+)
+LOOKUPS = Counter(
+    'wb_lookups_total',
+    'Поиски позиций товара по результату: found, not_found, failed, product_not_found, error',
+    ['result'],
+)
+LOOKUPS_IN_PROGRESS = Gauge(
+    'wb_lookups_in_progress',
+    'Поиски позиций, выполняющиеся сейчас',
+)
+DUPLICATE_UPDATES = Counter(
+    'wb_duplicate_updates_total',
+    'Повторно доставленные обновления Telegram, пропущенные без обработки',
+)
+WARM_STARTS = Counter(
+    'wb_warm_starts_total',
+    'Поиски со страницы из истории позиций: hit - товар найден рядом с ней, miss - понадобился полный просмотр',
+    ['outcome'],
+)
+
+_tracer = None
+
+
+class BrowserBackendCollector:
+    """
+    Состояние браузеров снимается в момент запроса метрик, поэтому не стоит ничего на горячем пути скрапинга
+    """
+
+    def __init__(self, backend: BrowserBackend) -> None:
+        self._backend = backend
+
+    def collect(self) -> Iterator[Union[GaugeMetricFamily, CounterMetricFamily]]:
+        open_pages = GaugeMetricFamily('wb_open_pages', 'Открытые вкладки', labels=['worker'])
+        pages_in_use = GaugeMetricFamily('wb_pages_in_use', 'Занятые вкладки', labels=['worker'])
+        queue_depth = GaugeMetricFamily('wb_page_queue_depth', 'Запросы, ожидающие вкладку', labels=['worker'])
+        blocked = CounterMetricFamily('wb_blocked_requests', 'Заблокированные запросы браузера', labels=['type'])
+        rss = GaugeMetricFamily('wb_browser_rss_bytes', 'RSS процессов браузера', labels=['worker', 'processes'])
+        pages_served = GaugeMetricFamily(
+            'wb_context_pages_served', 'Вкладки, выданные текущим контекстом браузера', labels=['worker']
+        )
+        recycles = CounterMetricFamily('wb_context_recycles', 'Пересоздания контекста браузера', labels=['worker'])
+        restarts = CounterMetricFamily('wb_browser_restarts', 'Перезапуски браузера', labels=['worker'])
+        crashes = CounterMetricFamily('wb_browser_crashes', 'Падения браузера', labels=['worker'])
+
+        if self._backend.started:
+            for index, stats in enumerate(self._backend.stats):
+                open_pages.add_metric([str(index)], stats.open_pages)
+                pages_in_use.add_metric([str(index)], stats.pages_in_use)
+                queue_depth.add_metric([str(index)], stats.queue_depth)
+
+            for memory in self._backend.memory_stats:
+                worker = str(memory.worker)
+                if memory.browser_rss_bytes is not None:
+                    rss.add_metric([worker, 'all'], memory.browser_rss_bytes)
+                    rss.add_metric([worker, 'renderer'], memory.renderer_rss_bytes)
+                pages_served.add_metric([worker], memory.pages_served)
+                recycles.add_metric([worker], memory.context_recycles)
+                restarts.add_metric([worker], memory.browser_restarts)
+                crashes.add_metric([worker], memory.crashes)
+
+            for resource_type, count in self._backend.resource_blocking_stats.blocked_by_type.items():
+                blocked.add_metric([resource_type], count)
+
+        yield from (open_pages, pages_in_use, queue_depth, blocked, rss, pages_served, recycles, restarts, crashes)
+
+
+def register_browser_backend(backend: BrowserBackend) -> None:
+    """ Добавляет в метрики состояние пулов вкладок и блокировки запросов набора браузеров """
+    REGISTRY.register(BrowserBackendCollector(backend))
+
+
+def start_metrics_server() -> None:
+    """
+    Запускает HTTP endpoint /metrics в формате Prometheus на METRICS_PORT и, если включено,
+    трассировку OpenTelemetry. METRICS_PORT=0 - endpoint не запускается, метрики только собираются
+    """
+    if settings.METRICS_PORT:
+        try:
+            start_http_server(settings.METRICS_PORT)
+            logger.info(f'Метрики доступны на :{settings.METRICS_PORT}/metrics')
+        except OSError as e:
+            # Например, порт занят другим процессом бота или воркера на той же машине
+            logger.error(f'Не удалось запустить endpoint метрик на порту {settings.METRICS_PORT}: {e}')
+
+    if settings.OTEL_ENABLED:
+        _init_tracer()
+
+
+def _init_tracer() -> None:
+    """
+    Трассировка через API OpenTelemetry. Если провайдер спанов уже настроен (например, запуск через
+    opentelemetry-instrument), спаны идут в него. Иначе, если установлены opentelemetry-sdk
+    и opentelemetry-exporter-otlp-proto-http, спаны отправляются по OTLP, адрес и имя сервиса задаются
+    стандартными переменными OTEL_*. Без SDK API отдает пустой трассировщик, и спаны никуда не отправляются
+    """
+    global _tracer
+    try:
+        from opentelemetry import trace
+    except ImportError as e:
+        raise RuntimeError('Для OTEL_ENABLED=true требуется пакет opentelemetry-api') from e
+
+    if not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        logger.info('Трассировка OpenTelemetry включена, спаны идут в уже настроенный провайдер')
+    else:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            logger.warning(
+                'OTEL_ENABLED=true, но спаны никуда не отправляются: установите opentelemetry-sdk '
+                'и opentelemetry-exporter-otlp-proto-http или запускайте через opentelemetry-instrument'
+            )
+        else:
+            provider = TracerProvider()
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+            logger.info('Трассировка OpenTelemetry включена, спаны отправляются по OTLP')
+
+    _tracer = trace.get_tracer('wb_scrapper')
+
+
+@contextmanager
+def span(component: str, stage: str, expected: Tuple[Type[BaseException], ...] = ()) -> Iterator[None]:
+    """
+    Замер этапа: длительность попадает в wb_stage_duration_seconds, исключения - в wb_stage_errors_total.
+
+    :param component: Компонент: catalog, product, query_extraction, lookup, bot
+    :param stage: Этап внутри компонента
+    :param expected: Исключения, которые являются штатным результатом этапа и не считаются ошибкой
+    """
+    started_at = time.perf_counter()
+    with _tracer.start_as_current_span(f'{component}.{stage}') if _tracer else nullcontext():
+        try:
+            yield
+        except expected:
+            raise
+        except Exception as e:
+            STAGE_ERRORS.labels(component, stage, type(e).__name__).inc()
+            raise
+        finally:
+            STAGE_DURATION.labels(component, stage).observe(time.perf_counter() - started_at)
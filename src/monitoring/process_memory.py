@@ -0,0 +1,47 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+PROC_DIR = Path('/proc')
+
+
+def proc_available() -> bool:
+    """ Память процессов читается из /proc, на других ОС замеры недоступны """
+    return PROC_DIR.is_dir()
+
+
+def process_rss_bytes(pid: int) -> Union[int, None]:
+    """ RSS процесса, None если процесс уже завершился """
+    try:
+        for line in (PROC_DIR / str(pid) / 'status').read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def total_rss_bytes(pids: Iterable[int]) -> int:
+    """ Суммарный RSS процессов, завершившиеся пропускаются """
+    return sum(process_rss_bytes(pid) or 0 for pid in pids)
+
+
+def descendant_pids(pid: int) -> List[int]:
+    """ Все процессы-потомки. Браузеры запускаются драйвером playwright, а не самим python """
+    children: Dict[int, List[int]] = {}
+    for entry in PROC_DIR.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы, ppid идет вторым полем после него
+        parent = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(entry.name))
+
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
@@ -0,0 +1,39 @@
+import re
+from typing import List
+
+
+class BaseQueryExtractor:
+    """
+    Общая часть экстракторов поисковых запросов из описания товара
+    """
+
+    def extract_query_from_description(self, description: str) -> List[str]:
+        """ Извлечение потенциальных поисковых запросов из описания товара.
+
+        :param description: Текстовое описание товара
+        :return: Список очищенных поисковых запросов
+        """
+        raise NotImplementedError
+
+    def extract_queries_from_descriptions(self, descriptions: List[str]) -> List[List[str]]:
+        """
+        Извлечение запросов для пачки описаний. По умолчанию описания обрабатываются по одному,
+        экстракторы, которым выгодна пачка целиком, переопределяют метод
+        """
+        return [self.extract_query_from_description(description) for description in descriptions]
+
+    def _clean_and_normalize_phrases(self, phrases: List[str]) -> List[str]:
+        """ Очистка и нормализация списка фраз """
+
+        return [self._clean_text(phrase).lower() for phrase in phrases]
+
+    @staticmethod
+    def _clean_text(text: str) -> str:
+        """
+        * Удаляем любой не буква-символьный знак перед пробелом
+        * Делаем из последовательности пробелов один
+        """
+
+        text = re.sub(r'[^\w\s]', ' ', text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple, Type
+
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.metrics import STAGE_DURATION, span
+from src.queries_extraction.base import BaseQueryExtractor
+from src.queries_extraction.rake import RAKEQueryExtractor
+from src.queries_extraction.tfidf import TfidfQueryExtractor
+
+# Значение QUERY_EXTRACTOR -> класс экстрактора
+QUERY_EXTRACTORS: Dict[str, Type[BaseQueryExtractor]] = {
+    'rake': RAKEQueryExtractor,
+    'tfidf': TfidfQueryExtractor,
+}
+
+# У каждого потока или процесса пула свой экстрактор: RAKE хранит состояние между вызовами
+_worker_state = threading.local()
+
+
+def _init_worker(extractor_class: Type) -> None:
+    _worker_state.extractor = extractor_class()
+
+
+def _warm_up_worker() -> None:
+    """ Пустая задача: заставляет пул запустить воркер и создать в нем экстрактор """
+
+
+def _extract_batch(descriptions: List[str]) -> List[Tuple[List[str], float]]:
+    """
+    Выполняется в пуле: извлекает запросы для пачки описаний.
+    Вместе с запросами возвращает время извлечения на одно описание, метрики пишет основной процесс
+    """
+    started_at = time.perf_counter()
+    batch_queries = _worker_state.extractor.extract_queries_from_descriptions(descriptions)
+    duration = (time.perf_counter() - started_at) / max(1, len(descriptions))
+    return [(queries, duration) for queries in batch_queries]
+
+
+class AsyncQueryExtractor:
+    """
+    Асинхронная обертка над экстрактором запросов. Извлечение выполняется в пуле процессов или потоков,
+    поэтому не блокирует event loop бота. Результаты запоминаются по хешу описания.
+    """
+
+    def __init__(
+            self,
+            extractor_class: Type[BaseQueryExtractor] = None,
+            max_workers: int = None,
+            executor_type: str = None,
+            cache_size: int = None,
+    ) -> None:
+        """
+        :param extractor_class: Класс экстрактора, по умолчанию выбранный в QUERY_EXTRACTOR
+        :param max_workers: Размер пула, по умолчанию QUERY_EXTRACTION_WORKERS
+        :param executor_type: process или thread, по умолчанию QUERY_EXTRACTION_EXECUTOR
+        :param cache_size: Сколько результатов запоминать, по умолчанию QUERY_EXTRACTION_CACHE_SIZE
+        """
+        self._extractor_class = extractor_class or self.__get_extractor_class(settings.QUERY_EXTRACTOR)
+        self._max_workers = max(1, max_workers or settings.QUERY_EXTRACTION_WORKERS)
+        self._executor_type = executor_type or settings.QUERY_EXTRACTION_EXECUTOR
+        self._cache_size = cache_size if cache_size is not None else settings.QUERY_EXTRACTION_CACHE_SIZE
+
+        self._executor: Executor = None
+        self._cache: OrderedDict[str, List[str]] = OrderedDict()
+
+    async def extract_queries(self, description: str) -> List[str]:
+        """ Извлечение потенциальных поисковых запросов из описания товара вне event loop """
+        return (await self.extract_queries_batch([description]))[0]
+
+    async def extract_queries_batch(self, descriptions: List[str]) -> List[List[str]]:
+        """
+        Извлечение запросов для многих описаний сразу. Описания без запомненного результата
+        делятся на пачки по числу воркеров пула.
+
+        :return: Списки запросов в порядке переданных описаний
+        """
+        keys = [self.__hash_description(description) for description in descriptions]
+
+        known: Dict[str, List[str]] = {}
+        missing: Dict[str, str] = {}
+        for key, description in zip(keys, descriptions):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                known[key] = self._cache[key]
+            else:
+                missing[key] = description
+
+        if missing:
+            missing_keys = list(missing)
+            chunk_size = math.ceil(len(missing_keys) / self._max_workers)
+            chunks = [missing_keys[i:i + chunk_size] for i in range(0, len(missing_keys), chunk_size)]
+
+            loop = asyncio.get_running_loop()
+            executor = self.__get_executor()
+            with span('query_extraction', 'pool'):
+                chunks_results = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _extract_batch, [missing[key] for key in chunk])
+                    for chunk in chunks
+                ))
+
+            for chunk, chunk_results in zip(chunks, chunks_results):
+                for key, (queries, duration) in zip(chunk, chunk_results):
+                    STAGE_DURATION.labels('query_extraction', 'extract').observe(duration)
+                    known[key] = queries
+                    self.__remember(key=key, queries=queries)
+
+        return [list(known[key]) for key in keys]
+
+    async def warm_up(self) -> None:
+        """ Заранее запускает все воркеры пула, что бы первый запрос не ждал загрузки nltk """
+        loop = asyncio.get_running_loop()
+        executor = self.__get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_up_worker) for _ in range(self._max_workers)))
+
+    def close(self) -> None:
+        """ Остановка пула """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __get_executor(self) -> Executor:
+        """ Пул создается при первом использовании """
+        if self._executor is None:
+            logger.info(f'Запускаю пул извлечения запросов: {self._executor_type}, воркеров {self._max_workers}')
+            executor_class = ProcessPoolExecutor if self._executor_type == 'process' else ThreadPoolExecutor
+            self._executor = executor_class(
+                max_workers=self._max_workers,
+                initializer=_init_worker,
+                initargs=(self._extractor_class,),
+            )
+        return self._executor
+
+    def __remember(self, key: str, queries: List[str]) -> None:
+        if self._cache_size <= 0:
+            return
+        self._cache[key] = queries
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def __get_extractor_class(name: str) -> Type[BaseQueryExtractor]:
+        try:
+            return QUERY_EXTRACTORS[name]
+        except KeyError:
+            raise ValueError(
+                f'Неизвестный QUERY_EXTRACTOR={name}, доступны: {", ".join(QUERY_EXTRACTORS)}'
+            ) from None
+
+    @staticmethod
+    def __hash_description(description: str) -> str:
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
@@ -0,0 +1,71 @@
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+from loguru import logger
+
+from settings.config import settings
+
+# Ресурс nltk -> путь, по которому его ищет nltk.data.find
+REQUIRED_NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'punkt_tab': 'tokenizers/punkt_tab',
+}
+
+
+def ensure_nltk_data() -> None:
+    """
+    Проверяет без обращения к сети, что корпуса nltk уже лежат на диске (скачаны при сборке образа).
+    Сам nltk при этом не импортируется, он нужен только процессам пула извлечения запросов.
+    Недостающие корпуса скачиваются только при NLTK_DOWNLOAD_MISSING=true.
+
+    :raises RuntimeError: Если корпусов нет и скачивание выключено
+    """
+    if settings.NLTK_DATA_DIR:
+        # Через переменную окружения путь увидят и процессы пула извлечения запросов
+        os.environ['NLTK_DATA'] = settings.NLTK_DATA_DIR
+
+    missing = find_missing_nltk_resources()
+    if not missing:
+        return
+
+    if not settings.NLTK_DOWNLOAD_MISSING:
+        raise RuntimeError(
+            f'Не найдены корпуса nltk: {", ".join(missing)}. '
+            f'Скачайте их при сборке образа (python -m nltk.downloader {" ".join(missing)}) '
+            f'или включите NLTK_DOWNLOAD_MISSING'
+        )
+
+    import nltk
+
+    for resource in missing:
+        logger.info(f'Скачиваю корпус nltk {resource}')
+        nltk.download(resource, download_dir=settings.NLTK_DATA_DIR or None, quiet=True)
+
+
+def nltk_data_paths() -> List[Path]:
+    """ Каталоги, в которых nltk.data.find ищет корпуса, в том же порядке, что и nltk.data.path """
+    paths = [Path(path) for path in os.environ.get('NLTK_DATA', '').split(os.pathsep) if path]
+    paths.append(Path('~', 'nltk_data').expanduser())
+    if sys.platform.startswith('win'):
+        paths += [Path(sys.prefix, 'nltk_data'), Path(sys.prefix, 'share', 'nltk_data'),
+                  Path(sys.prefix, 'lib', 'nltk_data'), Path(os.environ.get('APPDATA', 'C:\\'), 'nltk_data'),
+                  Path('C:\\nltk_data'), Path('D:\\nltk_data'), Path('E:\\nltk_data')]
+    else:
+        paths += [Path(sys.prefix, 'nltk_data'), Path(sys.prefix, 'share', 'nltk_data'),
+                  Path(sys.prefix, 'lib', 'nltk_data'), Path('/usr/share/nltk_data'),
+                  Path('/usr/local/share/nltk_data'), Path('/usr/lib/nltk_data'), Path('/usr/local/lib/nltk_data')]
+    return paths
+
+
+def find_missing_nltk_resources() -> List[str]:
+    """ Корпуса nltk, которых нет на диске ни распакованными, ни в zip-архиве """
+    missing = []
+    for resource, path in REQUIRED_NLTK_RESOURCES.items():
+        if not any(
+                Path(root, path).exists() or Path(root, path + '.zip').exists()
+                for root in nltk_data_paths()
+        ):
+            missing.append(resource)
+    return missing
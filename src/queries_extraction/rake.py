@@ -1,16 +1,19 @@
-from nltk.corpus import stopwords
-from rake_nltk import Rake
 from typing import List
 from loguru import logger
-import re
 
+from src.queries_extraction.base import BaseQueryExtractor
 
-class RAKEQueryExtractor:
+
+class RAKEQueryExtractor(BaseQueryExtractor):
     """
     Класс для составления потенциальных запросов поиска товаров на основе его описания
     """
 
     def __init__(self):
+        # nltk и rake_nltk тяжелые, импортируем их только при создании экстрактора
+        from nltk.corpus import stopwords
+        from rake_nltk import Rake
+
         self.MAX_OUTPUT_PHRASES = 5
         self.MIN_PHRASE_LENGTH = 2
         self.MAX_PHRASE_LENGTH = 5
@@ -36,22 +39,6 @@ class RAKEQueryExtractor:
         self.rake.extract_keywords_from_text(text)
         return self.rake.get_ranked_phrases()[:self.MAX_OUTPUT_PHRASES]
 
-    def _clean_and_normalize_phrases(self, phrases: List[str]) -> List[str]:
-        """ Очистка и нормализация списка фраз """
-
-        return [self.__clean_text(phrase).lower() for phrase in phrases]
-
-    @staticmethod
-    def __clean_text(text: str) -> str:
-        """
-        * Удаляем любой не буква-символьный знак перед пробелом
-        * Делаем из последовательности пробелов один
-        """
-
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
-
 
 def main():
     queries = RAKEQueryExtractor().extract_query_from_description(
@@ -0,0 +1,198 @@
+import argparse
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Union
+
+from loguru import logger
+from pydantic import BaseModel
+
+from settings.config import settings, BASE_DIR
+from src.queries_extraction.base import BaseQueryExtractor
+
+# Знаки, на которых заканчивается фраза: n-граммы не переходят через них
+PHRASE_DELIMITERS_RE = re.compile(r'[.,;:!?()\[\]{}«»"“”„…•|/\\]+|\s[-–—]\s')
+
+
+class CorpusIdf(BaseModel):
+    """ Документные частоты n-грамм по корпусу описаний, сохраняется в JSON """
+
+    documents: int = 0
+    document_frequencies: Dict[str, int] = {}
+
+    def update(self, descriptions_ngrams: Iterable[Iterable[str]]) -> None:
+        for ngrams in descriptions_ngrams:
+            self.documents += 1
+            for ngram in set(ngrams):
+                self.document_frequencies[ngram] = self.document_frequencies.get(ngram, 0) + 1
+
+    @classmethod
+    def load(cls, path: Path) -> 'CorpusIdf':
+        return cls.model_validate_json(path.read_text(encoding='utf-8'))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.model_dump_json(), encoding='utf-8')
+
+
+class TfidfQueryExtractor(BaseQueryExtractor):
+    """
+    Класс для составления потенциальных запросов поиска товаров по TF-IDF n-грамм описания.
+
+    Описания обрабатываются пачкой: n-граммы всех описаний собираются в одну разреженную матрицу,
+    и оценки считаются для всей пачки сразу. Редкость n-граммы берется из самой пачки
+    и, если задан QUERY_EXTRACTION_IDF_PATH, из сохраненного корпуса описаний
+    """
+
+    def __init__(self):
+        # nltk тяжелый, импортируем его только при создании экстрактора
+        from nltk.corpus import stopwords
+
+        self.MAX_OUTPUT_PHRASES = 5
+        self.MIN_PHRASE_LENGTH = 2
+        self.MAX_PHRASE_LENGTH = 3
+
+        self.stopwords = set(stopwords.words('russian'))
+        self.corpus_idf = self.__load_corpus_idf()
+
+    def extract_query_from_description(self, description: str) -> List[str]:
+        """ Извлечение потенциальных поисковых запросы из описания товара.
+
+        :param description: Текстовое описание товара
+        :return: Список очищенных поисковых запросов (не более max_phrases)
+        """
+        return self.extract_queries_from_descriptions([description])[0]
+
+    def extract_queries_from_descriptions(self, descriptions: List[str]) -> List[List[str]]:
+        """ Извлечение запросов для пачки описаний одной матричной операцией """
+        import numpy as np
+        from scipy import sparse
+
+        descriptions_ngrams = [self.extract_ngrams(description) for description in descriptions]
+
+        # Номер столбца n-граммы - порядок ее первого появления, он же решает при равных оценках
+        vocabulary: Dict[str, int] = {}
+        rows, columns = [], []
+        for row, ngrams in enumerate(descriptions_ngrams):
+            for ngram in ngrams:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(ngram, len(vocabulary)))
+
+        if not vocabulary:
+            return [[] for _ in descriptions]
+
+        # Повторы одной пары (описание, n-грамма) при сборке матрицы суммируются в частоту
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)),
+            shape=(len(descriptions), len(vocabulary)),
+        )
+        counts.sum_duplicates()
+
+        terms = np.array(list(vocabulary), dtype=object)
+        lengths = np.array([ngram.count(' ') + 1 for ngram in terms], dtype=float)
+
+        scores = counts.copy()
+        scores.data = 1 + np.log(scores.data)
+        # Длинные фразы точнее описывают товар, но без перекоса в сторону обрывков предложений
+        scores = sparse.csr_matrix(scores.multiply(self.__idf(counts=counts, terms=terms) * np.sqrt(lengths)))
+
+        results = []
+        for row in range(len(descriptions)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            indices, data = scores.indices[start:end], scores.data[start:end]
+            order = np.lexsort((indices, -data))
+            results.append(self.__select_phrases(terms[indices[order]]))
+        return results
+
+    def extract_ngrams(self, description: str) -> List[str]:
+        """
+        N-граммы описания с повторами. Стоп-слова и числа разрывают фразу, как в RAKE,
+        слова нормализуются той же очисткой, что и запросы RAKE
+        """
+        ngrams = []
+        for fragment in PHRASE_DELIMITERS_RE.split(description):
+            run: List[str] = []
+            for word in self._clean_text(fragment).lower().split():
+                if word in self.stopwords or word.isdigit() or len(word) < 2:
+                    ngrams += self.__run_ngrams(run)
+                    run = []
+                else:
+                    run.append(word)
+            ngrams += self.__run_ngrams(run)
+        return ngrams
+
+    def __run_ngrams(self, words: List[str]) -> List[str]:
+        """ Все n-граммы допустимой длины внутри фразы без стоп-слов """
+        return [
+            ' '.join(words[start:start + length])
+            for length in range(self.MIN_PHRASE_LENGTH, self.MAX_PHRASE_LENGTH + 1)
+            for start in range(len(words) - length + 1)
+        ]
+
+    def __idf(self, counts, terms):
+        """ Сглаженный IDF по пачке вместе с корпусом """
+        import numpy as np
+
+        document_frequencies = np.asarray((counts > 0).sum(axis=0), dtype=float).ravel()
+        documents = counts.shape[0]
+        if self.corpus_idf is not None:
+            corpus_frequencies = self.corpus_idf.document_frequencies
+            document_frequencies += np.array([corpus_frequencies.get(term, 0) for term in terms], dtype=float)
+            documents += self.corpus_idf.documents
+
+        return np.log((1 + documents) / (1 + document_frequencies)) + 1
+
+    def __select_phrases(self, ranked_ngrams: Iterable[str]) -> List[str]:
+        """
+        Лучшие фразы. Из фраз с двумя и более общими словами (соседние n-граммы одного места описания)
+        остается фраза с большей оценкой
+        """
+        selected: List[str] = []
+        selected_words: List[Set[str]] = []
+        for ngram in ranked_ngrams:
+            words = set(ngram.split())
+            if any(len(words & phrase_words) >= 2 for phrase_words in selected_words):
+                continue
+            selected.append(ngram)
+            selected_words.append(words)
+            if len(selected) >= self.MAX_OUTPUT_PHRASES:
+                break
+        return selected
+
+    @staticmethod
+    def __load_corpus_idf() -> Union[CorpusIdf, None]:
+        if not settings.QUERY_EXTRACTION_IDF_PATH:
+            return None
+
+        path = Path(BASE_DIR, settings.QUERY_EXTRACTION_IDF_PATH)
+        if not path.exists():
+            logger.warning(f'Файл корпуса IDF {path} не найден, редкость фраз считается только по пачке описаний')
+            return None
+        return CorpusIdf.load(path)
+
+
+def main():
+    """ Сборка корпуса IDF из файла описаний, по одному описанию в строке """
+    parser = argparse.ArgumentParser(description='Сборка корпуса IDF для TF-IDF экстрактора запросов')
+    parser.add_argument('descriptions', type=Path, help='Файл описаний, одно описание в строке')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='Куда сохранить корпус, по умолчанию QUERY_EXTRACTION_IDF_PATH')
+    args = parser.parse_args()
+
+    output = args.output or (Path(BASE_DIR, settings.QUERY_EXTRACTION_IDF_PATH)
+                             if settings.QUERY_EXTRACTION_IDF_PATH else None)
+    if output is None:
+        raise SystemExit('Укажите --output или QUERY_EXTRACTION_IDF_PATH')
+
+    # Корпус строится заново, а не дополняет уже сохраненный
+    settings.QUERY_EXTRACTION_IDF_PATH = ''
+    extractor = TfidfQueryExtractor()
+
+    corpus = CorpusIdf()
+    with args.descriptions.open(encoding='utf-8') as file:
+        corpus.update(extractor.extract_ngrams(line) for line in file if line.strip())
+    corpus.save(output)
+    logger.info(f'Корпус IDF из {corpus.documents} описаний, {len(corpus.document_frequencies)} фраз: {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,3 +8,15 @@ class ProductNotFound(ContentError):
 
 class CatalogFindItemsError(ContentError):
     pass
+
+
+class IncompleteCatalogPageError(ContentError):
+    pass
+
+
+class ProductUrlError(ContentError):
+    pass
+
+
+class CatalogRequestBlocked(ContentError):
+    pass
@@ -1,3 +1,5 @@
+from typing import Dict, List, Literal, Union
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,95 @@ class ProductPosition(BaseModel):
     page_number: int
     position_on_page: int
     page_url: str
+
+
+class QuerySearchResult(BaseModel):
+    # found - товар найден, not_found - не найден на проверенных страницах,
+    # failed - часть страниц не загрузилась или поиск по запросу упал, и товар мог быть на них
+    status: Literal['found', 'not_found', 'failed']
+    position: Union[ProductPosition, None] = None
+    # До какой страницы выдачи просматривался запрос
+    pages_checked: int = 0
+    # Страницы, которые не удалось загрузить даже после повторов
+    failed_pages: List[int] = []
+    # Сколько товаров и страниц в выдаче по запросу, None - сайт не показал число товаров
+    total_results: Union[int, None] = None
+    total_pages: Union[int, None] = None
+    # Сколько страниц выдачи проверено при поиске, включая взятые из кеша
+    pages_loaded: int = 0
+    # Товар не найден, но просмотр остановил бюджет страниц раньше конца выдачи и MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+    truncated: bool = False
+    error: str = ''
+
+    @property
+    def found(self) -> bool:
+        return self.status == 'found'
+
+
+class CatalogPage(BaseModel):
+    query: str
+    page_number: int
+    page_url: str
+    nm_ids: List[int]
+    # False, если прокрутка остановилась раньше загрузки всех карточек
+    complete: bool = True
+    # Число товаров по запросу, которое сайт показывает над выдачей
+    total_results: Union[int, None] = None
+
+
+class ScreenedQuery(BaseModel):
+    query: str
+    # False, если по запросу ничего не нашлось или сайт показал только похожие товары
+    has_results: bool = True
+    total_results: Union[int, None] = None
+    # Искомый товар уже есть на первой странице выдачи
+    found_on_first_page: bool = False
+    # Сколько страниц выдачи отведено на запрос, 0 - запрос не просматривается
+    page_budget: int = 0
+    # Почему запрос не просматривается: no_results, low_rank, budget
+    skip_reason: str = ''
+    # Загруженная при отборе первая страница, полный поиск ее повторно не загружает
+    first_page: Union[CatalogPage, None] = None
+
+
+class CatalogSweep(BaseModel):
+    # Позиции найденных артикулов на самых ранних страницах
+    positions: Dict[int, ProductPosition] = {}
+    # Страницы, которые не загрузились даже после повторов
+    failed_pages: List[int] = []
+    # Последняя страница, которую нужно было проверить
+    last_page_number: int = 0
+    total_results: Union[int, None] = None
+    # Сколько страниц проверено, включая незагрузившиеся и пустые
+    pages_loaded: int = 0
+
+
+class PagePoolStats(BaseModel):
+    max_pages: int
+    open_pages: int
+    pages_in_use: int
+    queue_depth: int
+    waiting_owners: int
+    total_acquired: int
+    avg_wait_time: float
+    max_wait_time: float
+
+
+class ResourceBlockingStats(BaseModel):
+    allowed_requests: int = 0
+    blocked_requests: int = 0
+    estimated_blocked_bytes: int = 0
+    blocked_by_type: Dict[str, int] = {}
+    blocked_by_profile: Dict[str, int] = {}
+
+
+class BrowserMemoryStats(BaseModel):
+    worker: int
+    # None, если память процессов браузера не удалось замерить
+    browser_rss_bytes: Union[int, None] = None
+    renderer_rss_bytes: Union[int, None] = None
+    pages_served: int = 0
+    context_recycles: int = 0
+    browser_restarts: int = 0
+    crashes: int = 0
+    draining_contexts: int = 0
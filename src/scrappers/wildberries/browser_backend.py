@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Hashable, List, Set, Tuple, TypeVar, Union, TYPE_CHECKING
+
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.process_memory import proc_available, total_rss_bytes
+from src.scrappers.models import BrowserMemoryStats, PagePoolStats, ResourceBlockingStats
+from src.scrappers.wildberries.page_pool import PagePool
+from src.scrappers.wildberries.resource_blocking import RequestBlocker, ResourceBlockingProfile
+
+if TYPE_CHECKING:
+    # playwright импортируется только при запуске браузеров, что бы не замедлять старт
+    from playwright.async_api import Playwright, Browser, BrowserContext, Page
+
+T = TypeVar('T')
+
+
+class BrowserContextSlot:
+    """
+    Контекст браузера. При пересоздании контекста или перезапуске браузера старый слот больше
+    не выдает новые вкладки, дорабатывает выданные и закрывается
+    """
+
+    def __init__(self, browser: Browser, generation: int, context: BrowserContext) -> None:
+        self.browser = browser
+        # Номер запуска браузера, которому принадлежит контекст
+        self.generation = generation
+        self.context = context
+        self.pages_served = 0
+        self.pages_in_use = 0
+
+    @property
+    def drained(self) -> bool:
+        return self.pages_in_use == 0
+
+    async def close(self) -> None:
+        """ Закрывает контекст вместе с вкладками, ошибки упавшего браузера игнорируются """
+        try:
+            await self.context.close()
+        except Exception as e:
+            logger.debug(f'Не удалось закрыть контекст браузера: {e}')
+
+
+class BrowserWorker:
+    """
+    Один экземпляр Chromium со своим контекстом и пулом вкладок.
+    Каждый браузер работает в отдельном дереве процессов, поэтому несколько воркеров нагружают разные ядра.
+
+    Воркер следит за памятью браузера:
+        * контекст пересоздается после CONTEXT_MAX_PAGES выданных вкладок
+        * браузер перезапускается, если его RSS превысил BROWSER_MAX_RSS_MB
+        * упавший браузер перезапускается при следующем запросе вкладки
+    Старые контексты дорабатывают уже выданные вкладки и закрываются, когда освободятся.
+    Пул вкладок с очередью и ограничением MAX_OPEN_PAGES общий для всех контекстов воркера.
+    """
+
+    def __init__(self, playwright: Playwright, index: int) -> None:
+        self.index = index
+
+        self._playwright = playwright
+        self._browser: Browser = None
+        self._slot: BrowserContextSlot = None
+        self._draining_slots: List[BrowserContextSlot] = []
+        self._page_pool = PagePool(max_pages=settings.MAX_OPEN_PAGES)
+        self._request_blocker = RequestBlocker()
+
+        self._lock = asyncio.Lock()
+        self._closing = False
+        self._memory_monitor: asyncio.Task = None
+        self._crash_restart: asyncio.Task = None
+
+        # Номер текущего запуска браузера, по нему отличаются вкладки упавшего браузера
+        self.browser_generation = 0
+        self._crashed_generations: Set[int] = set()
+        self._closed_generations: Set[int] = set()
+
+        self._browser_rss_bytes: Union[int, None] = None
+        self._renderer_rss_bytes: Union[int, None] = None
+        self._context_recycles = 0
+        self._browser_restarts = 0
+        self._crashes = 0
+
+    @property
+    def load(self) -> int:
+        """ Занятые и ожидающие вкладки воркера """
+        stats = self._page_pool.stats
+        return stats.pages_in_use + stats.queue_depth
+
+    @property
+    def stats(self) -> PagePoolStats:
+        return self._page_pool.stats
+
+    @property
+    def resource_blocking_stats(self) -> ResourceBlockingStats:
+        return self._request_blocker.stats
+
+    @property
+    def memory_stats(self) -> BrowserMemoryStats:
+        return BrowserMemoryStats(
+            worker=self.index,
+            browser_rss_bytes=self._browser_rss_bytes,
+            renderer_rss_bytes=self._renderer_rss_bytes,
+            pages_served=self._slot.pages_served if self._slot else 0,
+            context_recycles=self._context_recycles,
+            browser_restarts=self._browser_restarts,
+            crashes=self._crashes,
+            draining_contexts=len(self._draining_slots),
+        )
+
+    def crashed_since(self, generation: int) -> bool:
+        """ Упал ли браузер, запущенный под этим номером """
+        return generation in self._crashed_generations
+
+    async def start(self) -> None:
+        """ Запуск браузера и создание контекста """
+        await self.__launch_browser()
+        if settings.BROWSER_MEMORY_CHECK_INTERVAL > 0:
+            self._memory_monitor = asyncio.create_task(self.__monitor_memory())
+
+    @asynccontextmanager
+    async def page(
+            self,
+            owner: Hashable,
+            profile: Union[ResourceBlockingProfile, None] = None,
+    ) -> AsyncIterator[Page]:
+        slot: Union[BrowserContextSlot, None] = None
+
+        async def take_slot() -> None:
+            # Контекст выбирается, когда вкладка уже получена, поэтому в очереди не ждут вкладок старого контекста
+            nonlocal slot
+            slot = await self.__current_slot()
+            slot.pages_served += 1
+            slot.pages_in_use += 1
+
+        try:
+            async with self._page_pool.page(owner=owner, prepare=take_slot) as page:
+                self._request_blocker.assign(page=page, profile=profile)
+                try:
+                    yield page
+                finally:
+                    self._request_blocker.release(page=page)
+        finally:
+            if slot is not None:
+                slot.pages_in_use -= 1
+            if self._draining_slots:
+                await self.__close_drained_slots()
+
+    async def close(self) -> None:
+        """ Закрытие вкладок, контекстов и браузеров воркера """
+        self._closing = True
+        for task in (self._memory_monitor, self._crash_restart):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        slots, self._draining_slots = self._draining_slots, []
+        if self._slot is not None:
+            slots.append(self._slot)
+        browsers = {slot.browser: slot.generation for slot in slots}
+        if self._browser is not None:
+            browsers.setdefault(self._browser, self.browser_generation)
+
+        await self._page_pool.close()
+        for slot in slots:
+            await slot.close()
+        for browser, generation in browsers.items():
+            await self.__close_browser(browser=browser, generation=generation)
+
+        self._slot = None
+        self._browser = None
+
+    async def __current_slot(self) -> BrowserContextSlot:
+        """ Слот для новой вкладки. Перезапускает упавший браузер и пересоздает отслуживший контекст """
+        async with self._lock:
+            if self._closing:
+                raise RuntimeError(f'Браузер воркера #{self.index} остановлен')
+
+            if self.crashed_since(self.browser_generation):
+                await self.__restart_browser(reason='падение')
+            elif 0 < settings.CONTEXT_MAX_PAGES <= self._slot.pages_served:
+                await self.__recycle_context()
+
+            return self._slot
+
+    async def __launch_browser(self) -> None:
+        logger.info(f'Запускаю браузер воркера #{self.index}')
+
+        browser = await self._playwright.chromium.launch(headless=True)
+        self.browser_generation += 1
+        generation = self.browser_generation
+        browser.on('disconnected', lambda _: self.__on_disconnected(generation=generation))
+
+        self._browser = browser
+        self._slot = await self.__new_slot()
+        await self._page_pool.replace_context(self._slot.context)
+
+    async def __new_slot(self) -> BrowserContextSlot:
+        context = await self._browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:136.0) Gecko/20100101 Firefox/136.0',
+        )
+        if settings.BLOCK_HEAVY_RESOURCES:
+            await context.route('**/*', self._request_blocker.handle)
+
+        return BrowserContextSlot(
+            browser=self._browser,
+            generation=self.browser_generation,
+            context=context,
+        )
+
+    async def __recycle_context(self) -> None:
+        """ Новые вкладки открываются в новом контексте, старый закроется после возврата своих вкладок """
+        logger.info(f'Пересоздаю контекст воркера #{self.index} после {self._slot.pages_served} вкладок')
+        self._draining_slots.append(self._slot)
+        self._slot = await self.__new_slot()
+        await self._page_pool.replace_context(self._slot.context)
+        self._context_recycles += 1
+        await self.__close_drained_slots()
+
+    async def __restart_browser(self, reason: str) -> None:
+        """ Запускает новый браузер, старый закроется после возврата своих вкладок """
+        logger.warning(f'Перезапускаю браузер воркера #{self.index}, причина: {reason}')
+        self._draining_slots.append(self._slot)
+        await self.__launch_browser()
+        self._browser_restarts += 1
+        await self.__close_drained_slots()
+
+    async def __close_drained_slots(self) -> None:
+        """ Закрывает освободившиеся старые контексты и браузеры, у которых не осталось контекстов """
+        drained = [slot for slot in self._draining_slots if slot.drained]
+        if not drained:
+            return
+
+        self._draining_slots = [slot for slot in self._draining_slots if slot not in drained]
+        for slot in drained:
+            await slot.close()
+
+        in_use = {slot.browser for slot in self._draining_slots} | {self._browser}
+        for browser, generation in {slot.browser: slot.generation for slot in drained}.items():
+            if browser not in in_use:
+                await self.__close_browser(browser=browser, generation=generation)
+
+    async def __close_browser(self, browser: Browser, generation: int) -> None:
+        # Закрытие вызывает disconnected, который не должен считаться падением
+        self._closed_generations.add(generation)
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.debug(f'Не удалось закрыть браузер: {e}')
+
+    def __on_disconnected(self, generation: int) -> None:
+        if self._closing or generation in self._closed_generations:
+            return
+
+        logger.error(f'Браузер воркера #{self.index} упал')
+        self._crashed_generations.add(generation)
+        self._crashes += 1
+        if generation == self.browser_generation:
+            # Перезапускаем сразу, не дожидаясь следующего запроса вкладки
+            self._crash_restart = asyncio.create_task(self.__restart_after_crash())
+
+    async def __restart_after_crash(self) -> None:
+        try:
+            await self.__current_slot()
+        except Exception as e:
+            logger.error(f'Не удалось перезапустить браузер воркера #{self.index}: {e}')
+
+    async def __monitor_memory(self) -> None:
+        """
+        Периодически замеряет память браузера, закрывает освободившиеся контексты
+        и перезапускает разросшийся браузер
+        """
+        while True:
+            await asyncio.sleep(settings.BROWSER_MEMORY_CHECK_INTERVAL)
+            try:
+                await self.__close_drained_slots()
+                self._browser_rss_bytes, self._renderer_rss_bytes = await self.__measure_rss()
+
+                rss_mb = (self._browser_rss_bytes or 0) / 2 ** 20
+                # Пока старый браузер дорабатывает вкладки, новый не перезапускаем
+                if 0 < settings.BROWSER_MAX_RSS_MB < rss_mb and not self._draining_slots:
+                    async with self._lock:
+                        await self.__restart_browser(
+                            reason=f'RSS {rss_mb:.0f} МБ больше {settings.BROWSER_MAX_RSS_MB} МБ'
+                        )
+            except Exception as e:
+                logger.warning(f'Не удалось проверить память браузера воркера #{self.index}: {e}')
+
+    async def __measure_rss(self) -> Tuple[Union[int, None], Union[int, None]]:
+        """ RSS всех процессов браузера и отдельно процессов отрисовки вкладок """
+        if not proc_available():
+            return None, None
+
+        session = await self._browser.new_browser_cdp_session()
+        try:
+            info = await session.send('SystemInfo.getProcessInfo')
+        finally:
+            await session.detach()
+
+        processes = info['processInfo']
+        all_pids = [process['id'] for process in processes]
+        renderer_pids = [process['id'] for process in processes if process['type'] == 'renderer']
+        return await asyncio.to_thread(
+            lambda: (total_rss_bytes(all_pids), total_rss_bytes(renderer_pids))
+        )
+
+
+class BrowserBackend:
+    """
+    Набор из BROWSER_WORKERS браузеров, между которыми распределяются проверки страниц.
+    Один бекенд может использоваться несколькими скрапперами одновременно.
+    """
+
+    def __init__(self, workers_count: int = None) -> None:
+        self._workers_count = max(1, workers_count or settings.BROWSER_WORKERS)
+
+        self._playwright: Playwright = None
+        self._workers: List[BrowserWorker] = []
+        self._start_lock = asyncio.Lock()
+        self._next_worker = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def stats(self) -> List[PagePoolStats]:
+        """ Состояние пулов вкладок всех воркеров """
+        return [worker.stats for worker in self._workers]
+
+    @property
+    def memory_stats(self) -> List[BrowserMemoryStats]:
+        """ Память браузеров, пересоздания контекстов, перезапуски и падения по воркерам """
+        return [worker.memory_stats for worker in self._workers]
+
+    @property
+    def resource_blocking_stats(self) -> ResourceBlockingStats:
+        """ Суммарная статистика заблокированных запросов по всем воркерам """
+        total = ResourceBlockingStats()
+        for worker in self._workers:
+            stats = worker.resource_blocking_stats
+            total.allowed_requests += stats.allowed_requests
+            total.blocked_requests += stats.blocked_requests
+            total.estimated_blocked_bytes += stats.estimated_blocked_bytes
+            for resource_type, count in stats.blocked_by_type.items():
+                total.blocked_by_type[resource_type] = total.blocked_by_type.get(resource_type, 0) + count
+            for profile, count in stats.blocked_by_profile.items():
+                total.blocked_by_profile[profile] = total.blocked_by_profile.get(profile, 0) + count
+        return total
+
+    async def start(self) -> None:
+        """ Запуск всех браузеров. Повторный вызов ничего не делает """
+        async with self._start_lock:
+            if self.started:
+                return
+
+            from playwright.async_api import async_playwright
+
+            logger.info(f'Запускаю {self._workers_count} браузеров')
+            self._playwright = await async_playwright().start()
+
+            workers = [BrowserWorker(playwright=self._playwright, index=i) for i in range(self._workers_count)]
+            await asyncio.gather(*(worker.start() for worker in workers))
+            self._workers = workers
+
+    @asynccontextmanager
+    async def page(
+            self,
+            owner: Hashable,
+            profile: Union[ResourceBlockingProfile, None] = None,
+    ) -> AsyncIterator[Page]:
+        """
+        Выдает вкладку наименее загруженного воркера
+
+        :param owner: Владелец запроса для честного распределения вкладок
+        :param profile: Профиль блокировки запросов, действующий пока вкладка выдана
+        """
+        async with self.__pick_worker().page(owner=owner, profile=profile) as page:
+            yield page
+
+    async def run_on_page(
+            self,
+            owner: Hashable,
+            action: Callable[[Page], Awaitable[T]],
+            profile: Union[ResourceBlockingProfile, None] = None,
+    ) -> T:
+        """
+        Выполняет action во вкладке наименее загруженного воркера.
+        Если браузер упал во время выполнения, action повторяется в перезапущенном браузере
+        (не больше BROWSER_CRASH_RETRIES раз), поэтому падение браузера не доходит до пользователя.
+        """
+        attempt = 0
+        while True:
+            worker = self.__pick_worker()
+            generation = worker.browser_generation
+            try:
+                async with worker.page(owner=owner, profile=profile) as page:
+                    return await action(page)
+            except Exception as e:
+                if attempt >= settings.BROWSER_CRASH_RETRIES or not worker.crashed_since(generation):
+                    raise
+                attempt += 1
+                logger.warning(f'Браузер воркера #{worker.index} упал во время загрузки страницы, повторяю: {e}')
+
+    async def close(self) -> None:
+        """ Закрытие всех браузеров и playwright """
+        async with self._start_lock:
+            workers, self._workers = self._workers, []
+            await asyncio.gather(*(worker.close() for worker in workers), return_exceptions=True)
+
+            if self._playwright:
+                await self._playwright.stop()
+            self._playwright = None
+
+    def __pick_worker(self) -> BrowserWorker:
+        """ Выбирает воркер с наименьшей нагрузкой, при равенстве - по кругу """
+        count = len(self._workers)
+        candidates = [self._workers[(self._next_worker + i) % count] for i in range(count)]
+        worker = min(candidates, key=lambda candidate: candidate.load)
+        self._next_worker = (worker.index + 1) % count
+        return worker
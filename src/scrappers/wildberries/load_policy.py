@@ -0,0 +1,124 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Set, TypeVar, Union
+
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.metrics import HEDGED_LOADS, LOAD_RETRIES
+from src.scrappers.exceptions import ContentError
+
+T = TypeVar('T')
+
+# Сколько последних длительностей загрузок учитывается при расчете порога хеджирования
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """ Длительности последних успешных загрузок, по ним считается порог для дублирующей загрузки """
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._durations: Deque[float] = deque(maxlen=window)
+
+    def observe(self, duration: float) -> None:
+        self._durations.append(duration)
+
+    def percentile(self, percentile: float) -> Union[float, None]:
+        """ Перцентиль длительности загрузки, None пока замеров меньше PAGE_HEDGE_MIN_SAMPLES """
+        if len(self._durations) < max(1, settings.PAGE_HEDGE_MIN_SAMPLES):
+            return None
+        durations = sorted(self._durations)
+        index = min(len(durations) - 1, math.ceil(percentile / 100 * len(durations)) - 1)
+        return durations[max(0, index)]
+
+    def hedge_after(self) -> Union[float, None]:
+        """ Через сколько секунд запускать дублирующую загрузку, None - не запускать """
+        if settings.PAGE_HEDGE_PERCENTILE <= 0:
+            return None
+        return self.percentile(settings.PAGE_HEDGE_PERCENTILE)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Повторять имеет смысл таймауты и сетевые ошибки браузера.
+    ContentError - это ответ сайта (товара нет, выдача пустая), повтор его не изменит
+    """
+    return isinstance(error, Exception) and not isinstance(error, ContentError)
+
+
+async def load_with_retries(load: Callable[[], Awaitable[T]], component: str, description: str) -> T:
+    """
+    Выполняет загрузку, при временной ошибке повторяет ее до PAGE_LOAD_RETRIES раз.
+    Пауза перед повтором растет экспоненциально от PAGE_RETRY_BACKOFF со случайным разбросом,
+    что бы одновременно упавшие загрузки не повторялись одной волной
+    """
+    attempt = 0
+    while True:
+        try:
+            return await load()
+        except Exception as e:
+            if not is_transient(e) or attempt >= settings.PAGE_LOAD_RETRIES:
+                raise
+            delay = settings.PAGE_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            LOAD_RETRIES.labels(component).inc()
+            logger.warning(
+                f'Ошибка загрузки {description}: {type(e).__name__}: {e}. '
+                f'Повтор {attempt}/{settings.PAGE_LOAD_RETRIES} через {delay:.2f} с'
+            )
+            await asyncio.sleep(delay)
+
+
+async def hedged_load(
+        load: Callable[[], Awaitable[T]],
+        latency: LatencyTracker,
+        component: str,
+        description: str,
+) -> T:
+    """
+    Запускает загрузку и, если она идет дольше перцентиля PAGE_HEDGE_PERCENTILE последних загрузок,
+    параллельно запускает вторую такую же. Берется результат той, что закончится первой, вторая отменяется.
+    Длительности успешных загрузок попадают в latency.
+    """
+
+    async def timed_load() -> T:
+        started_at = time.monotonic()
+        result = await load()
+        latency.observe(time.monotonic() - started_at)
+        return result
+
+    hedge_after = latency.hedge_after()
+    if hedge_after is None:
+        return await timed_load()
+
+    primary = asyncio.create_task(timed_load())
+    pending: Set[asyncio.Task] = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        logger.debug(f'Загрузка {description} идет дольше {hedge_after:.2f} с, запускаю дублирующую')
+        hedge = asyncio.create_task(timed_load())
+        pending.add(hedge)
+
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None or not is_transient(error):
+                    # Ответ сайта, в том числе "товара нет", считается результатом загрузки
+                    HEDGED_LOADS.labels(component, 'hedge' if task is hedge else 'primary').inc()
+                    return task.result()
+                first_error = first_error or error
+
+        HEDGED_LOADS.labels(component, 'failed').inc()
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
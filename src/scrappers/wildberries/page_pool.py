@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Hashable, List, Tuple, TYPE_CHECKING
+
+from loguru import logger
+
+from src.monitoring.metrics import PAGE_QUEUE_WAIT
+from src.scrappers.models import PagePoolStats
+
+if TYPE_CHECKING:
+    from playwright.async_api import BrowserContext, Page
+
+
+class PagePool:
+    """
+    Пул переиспользуемых вкладок с глобальным ограничением на число открытых вкладок.
+
+    Слоты раздаются честно: ожидающие владельцы (запрос, чат) обслуживаются по кругу,
+    поэтому поиск по множеству запросов от одного пользователя не блокирует остальных.
+
+    Вкладки открываются в текущем BrowserContext. После replace_context новые вкладки открываются в новом
+    контексте, а вкладки прежнего закрываются при возврате, поэтому пока старый контекст дорабатывает,
+    открытых вкладок все равно не больше max_pages.
+    """
+
+    def __init__(self, max_pages: int, context: BrowserContext = None) -> None:
+        self._context = context
+        self._max_pages = max(1, max_pages)
+
+        self._idle_pages: List[Page] = []
+        self._pages_in_use = 0
+        # Очереди ожидания слотов по владельцам, порядок ключей - порядок обхода по кругу
+        self._waiters: OrderedDict[Hashable, Deque[Tuple[asyncio.Future, float]]] = OrderedDict()
+
+        self._total_acquired = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """ Количество ожидающих слот запросов """
+        return sum(len(queue) for queue in self._waiters.values())
+
+    @property
+    def stats(self) -> PagePoolStats:
+        """ Текущее состояние пула """
+        return PagePoolStats(
+            max_pages=self._max_pages,
+            open_pages=self._pages_in_use + len(self._idle_pages),
+            pages_in_use=self._pages_in_use,
+            queue_depth=self.queue_depth,
+            waiting_owners=len(self._waiters),
+            total_acquired=self._total_acquired,
+            avg_wait_time=self._total_wait_time / self._total_acquired if self._total_acquired else 0.0,
+            max_wait_time=self._max_wait_time,
+        )
+
+    @asynccontextmanager
+    async def page(self, owner: Hashable, prepare: Callable[[], Awaitable[None]] = None) -> AsyncIterator[Page]:
+        """
+        Выдает вкладку из пула на время работы с ней
+
+        :param owner: Владелец запроса (чат, запрос пользователя), по которому распределяются слоты
+        :param prepare: Вызывается после получения слота, до выдачи вкладки. Например, пересоздает контекст
+        """
+        await self.__acquire_slot(owner=owner)
+        try:
+            if prepare is not None:
+                await prepare()
+            context = self._context
+            page = await self.__take_page()
+        except BaseException:
+            self.__release_slot()
+            raise
+
+        try:
+            yield page
+        finally:
+            await self.__return_page(page=page, context=context)
+
+    async def replace_context(self, context: BrowserContext) -> None:
+        """ Новые вкладки открываются в context, свободные вкладки прежнего контекста закрываются """
+        self._context = context
+        idle_pages, self._idle_pages = self._idle_pages, []
+        for page in idle_pages:
+            await self.__close_page(page)
+
+    async def close(self) -> None:
+        """ Закрывает свободные вкладки и отменяет ожидающие запросы """
+        for queue in self._waiters.values():
+            for future, _ in queue:
+                future.cancel()
+        self._waiters.clear()
+
+        idle_pages, self._idle_pages = self._idle_pages, []
+        for page in idle_pages:
+            await self.__close_page(page)
+
+    async def __acquire_slot(self, owner: Hashable) -> None:
+        """ Ждет свободный слот в порядке честной очереди """
+        started_at = time.monotonic()
+
+        if self._pages_in_use < self._max_pages and not self._waiters:
+            self._pages_in_use += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(owner, deque()).append((future, started_at))
+            logger.debug(f'Нет свободных вкладок, в очереди {self.queue_depth} запросов')
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже был выдан, возвращаем его следующему в очереди
+                    self.__release_slot()
+                else:
+                    self.__remove_waiter(owner=owner, future=future)
+                raise
+
+        wait_time = time.monotonic() - started_at
+        self._total_acquired += 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        PAGE_QUEUE_WAIT.observe(wait_time)
+
+    def __release_slot(self) -> None:
+        """ Передает освободившийся слот следующему владельцу по кругу """
+        while self._waiters:
+            owner, queue = self._waiters.popitem(last=False)
+            future, _ = queue.popleft()
+            if queue:
+                # Остальные запросы владельца встают в конец круга
+                self._waiters[owner] = queue
+            if not future.done():
+                # Слот переходит ожидающему, счетчик занятых вкладок не меняется
+                future.set_result(None)
+                return
+
+        self._pages_in_use -= 1
+
+    def __remove_waiter(self, owner: Hashable, future: asyncio.Future) -> None:
+        """ Убирает отмененный запрос из очереди """
+        queue = self._waiters.get(owner)
+        if not queue:
+            return
+
+        for item in queue:
+            if item[0] is future:
+                queue.remove(item)
+                break
+        if not queue:
+            del self._waiters[owner]
+
+    async def __take_page(self) -> Page:
+        """ Берет свободную вкладку или открывает новую """
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed():
+                return page
+        return await self._context.new_page()
+
+    async def __return_page(self, page: Page, context: BrowserContext) -> None:
+        """ Возвращает вкладку в пул и освобождает слот. Вкладка прежнего контекста закрывается """
+        try:
+            if page.is_closed():
+                return
+            if context is self._context:
+                self._idle_pages.append(page)
+            else:
+                await self.__close_page(page)
+        finally:
+            self.__release_slot()
+
+    @staticmethod
+    async def __close_page(page: Page) -> None:
+        """ Закрывает вкладку, игнорируя ошибки уже закрытого браузера """
+        try:
+            await page.close()
+        except Exception as e:
+            logger.debug(f'Не удалось закрыть вкладку: {e}')
@@ -0,0 +1,102 @@
+import asyncio
+import math
+from typing import Hashable, List
+
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.metrics import SCREENED_QUERIES
+from src.scrappers.exceptions import CatalogFindItemsError
+from src.scrappers.models import ScreenedQuery
+from src.scrappers.wildberries.urls import parse_nm_id
+from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+
+
+class QueryScreener:
+    """
+    Предварительный отбор запросов перед полным поиском позиций.
+
+    По каждому запросу загружается только первая страница выдачи: запросы без выдачи отбрасываются,
+    остальные ранжируются, и полный поиск идет только по QUERY_SCREENING_TOP_K лучшим
+    в пределах PRODUCT_PAGES_BUDGET страниц на товар.
+    Первая страница возвращается в ScreenedQuery.first_page и передается в полный поиск,
+    поэтому повторно не загружается и не расходует бюджет даже без кеша выдачи.
+    """
+
+    def __init__(self, catalog_scrapper: WildberriesCatalogScrapper) -> None:
+        self._catalog_scrapper = catalog_scrapper
+
+    async def screen(self, product_url: str, queries: List[str], owner: Hashable) -> List[ScreenedQuery]:
+        """
+        Проверяет запросы и распределяет между ними бюджет страниц.
+
+        :return: Запросы в порядке приоритета. Отобранные для поиска - с page_budget > 0,
+            остальные - с причиной в skip_reason
+        """
+        nm_id = parse_nm_id(product_url)
+        screened = await asyncio.gather(*(self.__screen_query(query, nm_id, owner) for query in queries))
+
+        candidates = [screened_query for screened_query in screened if screened_query.has_results]
+        for screened_query in screened:
+            if not screened_query.has_results:
+                screened_query.skip_reason = 'no_results'
+
+        # Сначала запросы, где товар уже нашелся, затем запросы с более короткой выдачей: ее можно
+        # просмотреть целиком за меньшее число страниц. Это оценка стоимости запроса, а не позиции товара.
+        # Порядок выделения запросов - порядок их значимости, он решает при равенстве
+        candidates.sort(key=lambda screened_query: (
+            not screened_query.found_on_first_page,
+            self.__result_pages(screened_query),
+        ))
+
+        budget_left = settings.PRODUCT_PAGES_BUDGET or math.inf
+        for rank, screened_query in enumerate(candidates):
+            if rank >= settings.QUERY_SCREENING_TOP_K:
+                screened_query.skip_reason = 'low_rank'
+            elif budget_left < 1:
+                screened_query.skip_reason = 'budget'
+            else:
+                screened_query.page_budget = int(min(self.__result_pages(screened_query), budget_left))
+                budget_left -= screened_query.page_budget
+
+        for screened_query in screened:
+            SCREENED_QUERIES.labels(screened_query.skip_reason or 'selected').inc()
+
+        ranked = candidates + [screened_query for screened_query in screened if not screened_query.has_results]
+        logger.info(f'Отбор запросов для товара {nm_id}: ' + ', '.join(
+            f'{screened_query.query} ({screened_query.page_budget} стр.)' if screened_query.page_budget
+            else f'{screened_query.query} (пропущен: {screened_query.skip_reason})'
+            for screened_query in ranked
+        ))
+        return ranked
+
+    async def __screen_query(self, query: str, nm_id: int, owner: Hashable) -> ScreenedQuery:
+        """ Проверка запроса по первой странице выдачи """
+        try:
+            catalog_page = await self._catalog_scrapper.get_catalog_page(query=query, page_number=1, owner=owner)
+        except CatalogFindItemsError:
+            return ScreenedQuery(query=query, has_results=False)
+        except Exception as e:
+            # Без первой страницы о запросе ничего не известно, отбрасывать его нельзя
+            logger.warning(f'Не удалось проверить запрос {query}: {type(e).__name__}: {e}')
+            return ScreenedQuery(query=query)
+
+        return ScreenedQuery(
+            query=query,
+            total_results=catalog_page.total_results,
+            found_on_first_page=nm_id in catalog_page.nm_ids,
+            first_page=catalog_page,
+        )
+
+    @staticmethod
+    def __result_pages(screened_query: ScreenedQuery) -> int:
+        """
+        Сколько страниц занимает выдача запроса, не больше MAX_N_PAGES_TO_SEARCH_IN_CATALOG.
+        Если товар уже на первой странице, дальше смотреть не нужно
+        """
+        if screened_query.found_on_first_page:
+            return 1
+        if screened_query.total_results is None:
+            return settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        total_pages = max(1, math.ceil(screened_query.total_results / max(1, settings.CATALOG_PAGE_SIZE)))
+        return min(total_pages, settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG)
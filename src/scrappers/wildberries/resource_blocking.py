@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, FrozenSet, Tuple, Union, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from loguru import logger
+from pydantic import BaseModel
+
+from settings.config import settings
+from src.scrappers.models import ResourceBlockingStats
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page, Route
+
+# Примерный размер ресурсов на страницах WB, по нему оцениваются сэкономленные байты.
+# Точный размер заблокированного ответа узнать нельзя, так как он не скачивается
+TYPICAL_RESOURCE_SIZE = {
+    'image': 25_000,
+    'media': 500_000,
+    'font': 40_000,
+    'stylesheet': 30_000,
+    'script': 60_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+DEFAULT_RESOURCE_SIZE = 10_000
+
+WILDBERRIES_DOMAINS = (
+    'wildberries.ru',
+    'wb.ru',
+    'wbbasket.ru',
+    'wbstatic.net',
+    'wbcontent.net',
+)
+
+
+class ResourceBlockingProfile(BaseModel):
+    """
+    Правила блокировки запросов для страниц одного скраппера
+
+    * blocked_resource_types - типы ресурсов playwright, которые не загружаются
+    * allowed_domains - домены (вместе с поддоменами), запросы к остальным блокируются
+    * blocked_url_patterns - подстроки адресов, которые блокируются даже на разрешенных доменах
+    """
+
+    name: str
+    blocked_resource_types: FrozenSet[str] = frozenset()
+    allowed_domains: Tuple[str, ...] = WILDBERRIES_DOMAINS
+    blocked_url_patterns: Tuple[str, ...] = ()
+
+
+# На выдаче нужны только ссылки карточек, стили оставляем - от них зависит видимость каталога и подгрузка при скролле
+CATALOG_RESOURCE_PROFILE = ResourceBlockingProfile(
+    name='catalog',
+    blocked_resource_types=frozenset({'image', 'media', 'font', 'texttrack', 'eventsource', 'manifest'}),
+    blocked_url_patterns=('/analytics', '/metrics', 'banners', 'recommendations'),
+)
+
+# На странице товара нужна кнопка описания и текст, картинки и видео галереи не нужны
+PRODUCT_RESOURCE_PROFILE = ResourceBlockingProfile(
+    name='product',
+    blocked_resource_types=frozenset({'image', 'media', 'font', 'texttrack', 'eventsource', 'manifest'}),
+    blocked_url_patterns=('/analytics', '/metrics', 'banners', 'feedbacks', 'questions'),
+)
+
+
+class RequestBlocker:
+    """
+    Обработчик маршрутов BrowserContext. Профиль блокировки выбирается по вкладке,
+    которой принадлежит запрос. Запросы вкладок без профиля пропускаются.
+    Хост WILDBERRIES_BASE_URL разрешен всегда, даже если это локальная замена сайта.
+    """
+
+    def __init__(self) -> None:
+        self._profiles: Dict[Page, ResourceBlockingProfile] = {}
+        self._base_host = urlsplit(settings.WILDBERRIES_BASE_URL).hostname or ''
+
+        self._allowed_requests = 0
+        self._blocked_requests = 0
+        self._estimated_blocked_bytes = 0
+        self._blocked_by_type: Counter = Counter()
+        self._blocked_by_profile: Counter = Counter()
+
+    @property
+    def stats(self) -> ResourceBlockingStats:
+        return ResourceBlockingStats(
+            allowed_requests=self._allowed_requests,
+            blocked_requests=self._blocked_requests,
+            estimated_blocked_bytes=self._estimated_blocked_bytes,
+            blocked_by_type=dict(self._blocked_by_type),
+            blocked_by_profile=dict(self._blocked_by_profile),
+        )
+
+    def assign(self, page: Page, profile: Union[ResourceBlockingProfile, None]) -> None:
+        """ Назначает вкладке профиль блокировки на время ее использования """
+        if profile is None:
+            self._profiles.pop(page, None)
+        else:
+            self._profiles[page] = profile
+
+    def release(self, page: Page) -> None:
+        self._profiles.pop(page, None)
+
+    async def handle(self, route: Route) -> None:
+        """ Пропускает или отменяет запрос в соответствии с профилем вкладки """
+        request = route.request
+        profile = self.__get_profile(route=route)
+
+        if profile is None or not self.__should_block(
+                profile=profile, url=request.url, resource_type=request.resource_type, base_host=self._base_host
+        ):
+            self._allowed_requests += 1
+            await route.continue_()
+            return
+
+        self._blocked_requests += 1
+        self._blocked_by_type[request.resource_type] += 1
+        self._blocked_by_profile[profile.name] += 1
+        self._estimated_blocked_bytes += TYPICAL_RESOURCE_SIZE.get(request.resource_type, DEFAULT_RESOURCE_SIZE)
+        await route.abort('blockedbyclient')
+
+    def __get_profile(self, route: Route) -> Union[ResourceBlockingProfile, None]:
+        """ Ищет профиль вкладки, отправившей запрос """
+        try:
+            page = route.request.frame.page
+        except Exception:
+            # Запросы service worker не привязаны к вкладке
+            return None
+        return self._profiles.get(page)
+
+    @staticmethod
+    def __should_block(profile: ResourceBlockingProfile, url: str, resource_type: str, base_host: str) -> bool:
+        host = urlsplit(url).hostname or ''
+        allowed_domains = (*profile.allowed_domains, base_host)
+        if not any(host == domain or host.endswith('.' + domain) for domain in allowed_domains if domain):
+            logger.trace(f'Блокирую сторонний запрос {url}')
+            return True
+
+        if resource_type == 'document':
+            # Документы с разрешенных доменов, в том числе саму навигацию вкладки, не блокируем
+            return False
+
+        if resource_type in profile.blocked_resource_types:
+            return True
+
+        return any(pattern in url for pattern in profile.blocked_url_patterns)
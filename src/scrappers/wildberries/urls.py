@@ -0,0 +1,24 @@
+import re
+
+from settings.config import settings
+from src.scrappers.exceptions import ProductUrlError
+
+NM_ID_PATTERN = re.compile(r'/catalog/(\d+)/')
+
+
+def parse_nm_id(url: str) -> int:
+    """
+    Достает артикул товара (nm ID) из ссылки вида `.../catalog/149751046/detail.aspx?...`.
+    Хост, схема и параметры запроса не важны.
+
+    :raises ProductUrlError: Если в ссылке нет артикула
+    """
+    match = NM_ID_PATTERN.search(url)
+    if not match:
+        raise ProductUrlError(f'В ссылке {url} не найден артикул товара')
+    return int(match.group(1))
+
+
+def build_product_url(nm_id: int) -> str:
+    """ Ссылка на товар по артикулу на сайте WILDBERRIES_BASE_URL """
+    return f'{settings.WILDBERRIES_BASE_URL.rstrip("/")}/catalog/{nm_id}/detail.aspx'
@@ -1,37 +1,102 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Hashable, List, TypeVar, Union, TYPE_CHECKING
+
 from loguru import logger
-from playwright.async_api import Playwright, Browser, BrowserContext, Page
-from playwright.async_api import async_playwright
+
+from src.scrappers.models import BrowserMemoryStats, PagePoolStats, ResourceBlockingStats
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.load_policy import LatencyTracker, hedged_load, load_with_retries
+from src.scrappers.wildberries.resource_blocking import ResourceBlockingProfile
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
+T = TypeVar('T')
 
 
 class WildberriesBaseScrapper:
-    def __init__(self) -> None:
-        self._playwright: Playwright = None
-        self._browser: Browser = None
-        self._context: BrowserContext = None
+    # Профиль блокировки тяжелых ресурсов для вкладок скраппера, None - загружать все
+    RESOURCE_PROFILE: Union[ResourceBlockingProfile, None] = None
+
+    def __init__(self, backend: BrowserBackend = None) -> None:
+        """
+        :param backend: Общий набор браузеров. Если не передан, скраппер создает и закрывает собственный
+        """
+        self._owns_backend = backend is None
+        self._backend = backend or BrowserBackend()
+        self._load_latency = LatencyTracker()
 
     async def init(self) -> None:
         """ Инициализация скраппера """
         logger.info('Начата инициализация скраппера Wildberries')
+        await self._backend.start()
+
+    @asynccontextmanager
+    async def _page(self, owner: Hashable) -> AsyncIterator[Page]:
+        """
+        Выдает вкладку из общего пула на время запроса
 
-        self._playwright = await async_playwright().start()
-        self._browser = await self._playwright.chromium.launch(headless=True)
-        self._context = await self._browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:136.0) Gecko/20100101 Firefox/136.0',
+        :param owner: Владелец запроса (чат или запрос пользователя), между владельцами вкладки делятся честно
+        """
+        async with self._backend.page(owner=owner, profile=self.RESOURCE_PROFILE) as page:
+            yield page
+
+    async def _run_on_page(self, owner: Hashable, action: Callable[[Page], Awaitable[T]]) -> T:
+        """
+        Выполняет action во вкладке из общего пула. При падении браузера action повторяется в перезапущенном
+
+        :param owner: Владелец запроса (чат или запрос пользователя), между владельцами вкладки делятся честно
+        """
+        return await self._backend.run_on_page(owner=owner, action=action, profile=self.RESOURCE_PROFILE)
+
+    async def _load_on_page(
+            self,
+            owner: Hashable,
+            action: Callable[[Page], Awaitable[T]],
+            component: str,
+            description: str,
+    ) -> T:
+        """
+        Загрузка страницы во вкладке из пула: медленная загрузка дублируется (PAGE_HEDGE_PERCENTILE),
+        после временной ошибки загрузка повторяется (PAGE_LOAD_RETRIES)
+
+        :param component: Компонент для метрик: catalog, product
+        :param description: Что загружается, для логов
+        """
+        return await load_with_retries(
+            load=lambda: hedged_load(
+                load=lambda: self._run_on_page(owner=owner, action=action),
+                latency=self._load_latency,
+                component=component,
+                description=description,
+            ),
+            component=component,
+            description=description,
         )
 
-    async def _create_page(self) -> Page:
-        """ Создаем новую страницу для запросов """
-        return await self._context.new_page()
+    @property
+    def page_pool_stats(self) -> List[PagePoolStats]:
+        """ Состояние пулов вкладок по браузерам: открытые вкладки, глубина очереди и время ожидания """
+        return self._backend.stats
+
+    @property
+    def resource_blocking_stats(self) -> ResourceBlockingStats:
+        """ Сколько запросов и примерно байт не было загружено благодаря блокировке ресурсов """
+        return self._backend.resource_blocking_stats
+
+    @property
+    def browser_memory_stats(self) -> List[BrowserMemoryStats]:
+        """ Память браузеров, пересоздания контекстов, перезапуски и падения """
+        return self._backend.memory_stats
 
     async def close(self) -> None:
-        """ Закрытие всех ресурсов скраппера """
-        if self._playwright:
-            await self._playwright.stop()
-        self._context = None
-        self._browser = None
+        """ Закрытие всех ресурсов скраппера. Общий бекенд закрывает его владелец """
+        if self._owns_backend:
+            await self._backend.close()
 
     async def _ensure_browser_initialized(self) -> None:
         """ Проверка инициализации браузера """
-        if not self._browser:
+        if not self._backend.started:
             await self.init()
@@ -1,14 +1,106 @@
+from __future__ import annotations
+
 import asyncio
-from typing import Union, List, Dict, Tuple
+import math
+from pathlib import Path
+from typing import Union, List, Dict, Tuple, Hashable, Set, Iterable, AsyncIterator, Callable, TYPE_CHECKING
 
 from loguru import logger
-from playwright.async_api import ElementHandle
-from playwright.async_api import Page
 
-from settings.config import settings
-from src.scrappers.exceptions import CatalogFindItemsError
-from src.scrappers.models import ProductPosition
+from settings.config import settings, BASE_DIR
+from src.caching.backends import SqliteCacheBackend
+from src.caching.cache import AsyncCache
+from src.monitoring.metrics import CATALOG_PAGES, WARM_STARTS, span
+from src.scrappers.exceptions import CatalogFindItemsError, IncompleteCatalogPageError
+from src.scrappers.models import CatalogPage, CatalogSweep, ProductPosition, QuerySearchResult
+from src.scrappers.wildberries.resource_blocking import CATALOG_RESOURCE_PROFILE
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.urls import parse_nm_id
 from src.scrappers.wildberries.wildberries_base import WildberriesBaseScrapper
+from src.tracking.history import PositionHistory, create_position_history
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
+
+PRODUCT_CARD_SELECTOR = 'div.product-card-overflow a.product-card__link'
+CATALOG_SORT = 'popular'
+
+# Вызывается с (запрос, номер страницы) после проверки очередной страницы выдачи
+ProgressCallback = Callable[[str, int], None]
+
+# Артикулы карточек в порядке показа, карточки без артикула в ссылке пропускаются
+EXTRACT_CARDS_NM_IDS_SCRIPT = """
+cards => cards
+    .map(card => /\\/catalog\\/(\\d+)\\//.exec(card.getAttribute('href') || ''))
+    .filter(match => match !== null)
+    .map(match => Number(match[1]))
+"""
+
+# Число товаров по запросу из заголовка выдачи: "12 345 товаров" или "По запросу ... найдено 345 товаров"
+EXTRACT_TOTAL_RESULTS_SCRIPT = """
+() => {
+    const element = document.querySelector('.searching-results__count')
+        || document.querySelector('.searching-results__text');
+    const match = element && /(\\d[\\d\\s]*)\\s*товар/.exec(element.textContent);
+    return match ? Number(match[1].replace(/\\s/g, '')) : null;
+}
+"""
+
+# Прокрутка выполняется одним вызовом внутри страницы: после каждого шага ждем появления новых узлов
+# через MutationObserver (но не дольше 100мс), а не фиксированную паузу
+SCROLL_UNTIL_CARDS_LOADED_SCRIPT = """
+async ({cardSelector, targetNmIds, expectedCount, quietMs, timeoutMs}) => {
+    const startedAt = performance.now();
+    let wakeUp = null;
+    const observer = new MutationObserver(() => wakeUp && wakeUp());
+    observer.observe(document.body, {childList: true, subtree: true});
+    const waitForMutation = (ms) => new Promise(resolve => {
+        wakeUp = resolve;
+        setTimeout(resolve, ms);
+    });
+
+    const targetPaths = targetNmIds.map(nmId => `/catalog/${nmId}/`);
+    let lastCount = -1;
+    let lastCountChangedAt = startedAt;
+    try {
+        while (true) {
+            const cards = document.querySelectorAll(cardSelector);
+            const now = performance.now();
+            if (cards.length !== lastCount) {
+                lastCount = cards.length;
+                lastCountChangedAt = now;
+            }
+
+            if (targetPaths.length) {
+                const hrefs = Array.from(cards, card => card.getAttribute('href') || '');
+                if (targetPaths.every(path => hrefs.some(href => href.includes(path)))) {
+                    return {count: cards.length, reason: 'target'};
+                }
+            }
+            if (expectedCount && cards.length >= expectedCount) {
+                return {count: cards.length, reason: 'full'};
+            }
+
+            const atBottom = window.innerHeight + window.scrollY >= document.body.scrollHeight - 2;
+            if (atBottom && now - lastCountChangedAt >= quietMs) {
+                return {count: cards.length, reason: 'stable'};
+            }
+            if (now - startedAt >= timeoutMs) {
+                return {count: cards.length, reason: 'timeout'};
+            }
+
+            if (!atBottom) {
+                // Скролим на 80% экрана, что бы часть старого контента осталась
+                window.scrollBy(0, window.innerHeight * 0.8);
+            }
+            await waitForMutation(100);
+        }
+    } finally {
+        observer.disconnect();
+    }
+}
+"""
 
 
 class WildberriesCatalogScrapper(WildberriesBaseScrapper):
@@ -17,156 +109,900 @@ class WildberriesCatalogScrapper(WildberriesBaseScrapper):
         * Поиск товара в выдаче по запросу
     """
 
+    RESOURCE_PROFILE = CATALOG_RESOURCE_PROFILE
+
+    def __init__(
+            self,
+            backend: BrowserBackend = None,
+            serp_cache: AsyncCache = None,
+            position_history: PositionHistory = None,
+    ) -> None:
+        """
+        :param backend: Общий набор браузеров
+        :param serp_cache: Общий кеш страниц выдачи. Если не передан, создается по настройкам SERP_CACHE_*
+        :param position_history: История позиций, в которую записывается каждый результат поиска.
+            Если не передана, создается по POSITION_HISTORY_PATH
+        """
+        super().__init__(backend=backend)
+
+        self._owns_serp_cache = serp_cache is None
+        self._serp_cache = serp_cache if serp_cache is not None else self.__create_serp_cache()
+        self._owns_position_history = position_history is None
+        self._position_history = position_history if position_history is not None else create_position_history()
+
+    async def close(self) -> None:
+        if self._owns_serp_cache and self._serp_cache is not None:
+            await self._serp_cache.close()
+        if self._owns_position_history and self._position_history is not None:
+            await self._position_history.close()
+        await super().close()
+
     async def find_product_positions(
             self,
             product_url: str,
             queries: List[str],
-    ) -> Dict[str, Union[ProductPosition, None]]:
+            owner: Hashable = None,
+            page_budgets: Dict[str, int] = None,
+            warm_start: bool = False,
+            known_pages: Iterable[CatalogPage] = (),
+    ) -> Dict[str, QuerySearchResult]:
         """
         Ищет позицию товара по нескольким поисковым запросам.
 
         Args:
             product_url: URL искомого товара
             queries: Список поисковых запросов
+            owner: Владелец запроса (например, id чата) для честного распределения вкладок.
+                По умолчанию каждый вызов считается отдельным владельцем
+            page_budgets: Сколько страниц выдачи просматривать по отдельным запросам,
+                для остальных - MAX_N_PAGES_TO_SEARCH_IN_CATALOG. Если товар не найден, а бюджет кончился
+                раньше выдачи, результат помечается truncated
+            warm_start: Начинать поиск со страницы, на которой товар был в прошлый раз по истории позиций
+            known_pages: Уже загруженные страницы выдачи, например первые страницы после отбора запросов.
+                Они учитываются в поиске и повторно не загружаются
+
+        Returns:
+            Словарь с результатами поиска для каждого запроса: найден, не найден на проверенных страницах
+            или поиск не удался
+        """
+        positions = await self.find_products_positions(
+            products={product_url: queries},
+            owner=owner,
+            page_budgets=page_budgets,
+            warm_start=warm_start,
+            known_pages=known_pages,
+        )
+        return positions[product_url]
+
+    async def find_products_positions(
+            self,
+            products: Dict[str, List[str]],
+            owner: Hashable = None,
+            page_budgets: Dict[str, int] = None,
+            warm_start: bool = False,
+            known_pages: Iterable[CatalogPage] = (),
+    ) -> Dict[str, Dict[str, QuerySearchResult]]:
+        """
+        Ищет позиции сразу нескольких товаров. Одинаковые запросы разных товаров объединяются,
+        и выдача по каждому запросу просматривается один раз для всех товаров.
+
+        Args:
+            products: Словарь URL товара -> список поисковых запросов для него
+            owner: Владелец запроса (например, id чата) для честного распределения вкладок.
+                По умолчанию каждый вызов считается отдельным владельцем
+            page_budgets: Сколько страниц выдачи просматривать по отдельным запросам,
+                для остальных - MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+            warm_start: Начинать поиск со страницы из истории позиций. Действует для запросов одного товара
+            known_pages: Уже загруженные страницы выдачи, они не загружаются повторно
 
         Returns:
-            Словарь с результатами поиска для каждого запроса
+            Словарь URL товара -> (запрос -> результат поиска)
+        """
+        await self._ensure_browser_initialized()
+        return await self.__search_products_by_all_queries(
+            products=products,
+            owner=owner if owner is not None else object(),
+            page_budgets=page_budgets,
+            warm_start=warm_start,
+            known_pages=known_pages,
+        )
+
+    async def get_catalog_page(self, query: str, page_number: int, owner: Hashable = None) -> CatalogPage:
+        """
+        Загружает одну страницу выдачи и возвращает артикулы товаров на ней в порядке показа.
+
+        :param query: Поисковый запрос
+        :param page_number: Номер страницы выдачи
+        :param owner: Владелец запроса для честного распределения вкладок
+        :raises CatalogFindItemsError: Если по запросу на странице ничего не нашлось
         """
         await self._ensure_browser_initialized()
-        return await self.__search_product_by_all_queries(product_url, queries)
+        return await self.__load_catalog_page(
+            query=query,
+            page_number=page_number,
+            owner=owner if owner is not None else object(),
+        )
 
-    async def __search_product_by_all_queries(
+    async def iter_product_positions(
             self,
             product_url: str,
-            queries: List[str]
-    ) -> Dict[str, Union[ProductPosition, None]]:
-        """ Организация поиска товара по всем запросам """
-        async def process_query(query: str) -> Tuple[str, Union[ProductPosition, None]]:
-            """ Функция для запуска поиска по конкретному запросу товара в gather """
-            logger.info(f'Начинаю поиск товара по запросу: {query}')
-            search_url = self.__build_search_url(query=query)
+            queries: List[str],
+            owner: Hashable = None,
+            on_progress: ProgressCallback = None,
+            page_budgets: Dict[str, int] = None,
+            known_pages: Iterable[CatalogPage] = (),
+    ) -> AsyncIterator[Tuple[str, QuerySearchResult]]:
+        """
+        Ищет позицию товара по нескольким запросам и отдает результат каждого запроса сразу, как он готов.
+
+        Args:
+            product_url: URL искомого товара
+            queries: Список поисковых запросов
+            owner: Владелец запроса (например, id чата) для честного распределения вкладок
+            on_progress: Вызывается с (запрос, номер страницы) после проверки каждой страницы выдачи
+            page_budgets: Сколько страниц выдачи просматривать по отдельным запросам
+            known_pages: Уже загруженные страницы выдачи, они не загружаются повторно
+
+        Yields:
+            Пары (запрос, результат поиска) в порядке готовности
+        """
+        await self._ensure_browser_initialized()
+
+        products = {product_url: queries}
+        products_nm_ids, unique_queries = self.__group_queries(products=products)
+        nm_id = products_nm_ids[product_url]
+
+        original_queries: Dict[str, List[str]] = {}
+        for query in queries:
+            original_queries.setdefault(self.__normalize_query(query), []).append(query)
+
+        def report_progress(searched_query: str, page_number: int) -> None:
+            # Прогресс сообщаем в терминах запросов, переданных вызывающим
+            for query in original_queries[self.__normalize_query(searched_query)]:
+                on_progress(query, page_number)
+
+        async for normalized_query, result in self.__iter_queries_results(
+                unique_queries=unique_queries,
+                owner=owner if owner is not None else object(),
+                on_progress=report_progress if on_progress is not None else None,
+                page_budgets=self.__group_page_budgets(page_budgets),
+                known_pages=self.__group_known_pages(known_pages),
+        ):
+            for query in original_queries[normalized_query]:
+                yield query, result[nm_id]
+
+    async def __search_products_by_all_queries(
+            self,
+            products: Dict[str, List[str]],
+            owner: Hashable,
+            page_budgets: Dict[str, int] = None,
+            warm_start: bool = False,
+            known_pages: Iterable[CatalogPage] = (),
+    ) -> Dict[str, Dict[str, QuerySearchResult]]:
+        """ Организация поиска товаров по всем запросам, каждый уникальный запрос просматривается один раз """
+        products_nm_ids, unique_queries = self.__group_queries(products=products)
+
+        results = {}
+        async for normalized_query, result in self.__iter_queries_results(
+                unique_queries=unique_queries,
+                owner=owner,
+                page_budgets=self.__group_page_budgets(page_budgets),
+                warm_start=warm_start,
+                known_pages=self.__group_known_pages(known_pages),
+        ):
+            results[normalized_query] = result
+
+        # Раскладываем найденные позиции обратно по товарам и их запросам
+        positions = {
+            product_url: {
+                query: results[self.__normalize_query(query)][products_nm_ids[product_url]]
+                for query in queries
+            }
+            for product_url, queries in products.items()
+        }
+        logger.info(f'results: {positions}')
+        return positions
+
+    def __group_queries(
+            self,
+            products: Dict[str, List[str]],
+    ) -> Tuple[Dict[str, int], Dict[str, Tuple[str, Set[int]]]]:
+        """
+        Объединяет одинаковые запросы разных товаров
+
+        :return: URL товара -> артикул и нормализованный запрос -> (запрос для поиска, артикулы товаров)
+        """
+        products_nm_ids = {product_url: parse_nm_id(product_url) for product_url in products}
+
+        unique_queries: Dict[str, Tuple[str, Set[int]]] = {}
+        for product_url, queries in products.items():
+            for query in queries:
+                _, nm_ids = unique_queries.setdefault(self.__normalize_query(query), (query, set()))
+                nm_ids.add(products_nm_ids[product_url])
+
+        return products_nm_ids, unique_queries
+
+    def __group_page_budgets(self, page_budgets: Union[Dict[str, int], None]) -> Dict[str, int]:
+        """ Бюджеты страниц по нормализованным запросам, из одинаковых запросов берется больший """
+        grouped: Dict[str, int] = {}
+        for query, budget in (page_budgets or {}).items():
+            normalized_query = self.__normalize_query(query)
+            grouped[normalized_query] = max(budget, grouped.get(normalized_query, 0))
+        return grouped
+
+    def __group_known_pages(self, known_pages: Iterable[CatalogPage]) -> Dict[str, Dict[int, CatalogPage]]:
+        """ Загруженные страницы по нормализованным запросам и номерам страниц """
+        grouped: Dict[str, Dict[int, CatalogPage]] = {}
+        for catalog_page in known_pages or ():
+            grouped.setdefault(self.__normalize_query(catalog_page.query), {})[catalog_page.page_number] = catalog_page
+        return grouped
+
+    async def __iter_queries_results(
+            self,
+            unique_queries: Dict[str, Tuple[str, Set[int]]],
+            owner: Hashable,
+            on_progress: ProgressCallback = None,
+            page_budgets: Dict[str, int] = None,
+            warm_start: bool = False,
+            known_pages: Dict[str, Dict[int, CatalogPage]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[int, QuerySearchResult]]]:
+        """ Запускает поиск по всем запросам параллельно и отдает результаты по мере готовности """
+
+        async def process_query(normalized_query: str) -> Tuple[str, Dict[int, QuerySearchResult]]:
+            """ Функция для запуска поиска по конкретному запросу """
+            query, nm_ids = unique_queries[normalized_query]
+            logger.info(f'Начинаю поиск товаров {sorted(nm_ids)} по запросу: {query}')
             try:
-                result = await self.__search_product_by_query(
-                    search_page_template_url=search_url,
-                    product_url=product_url
+                result = await self.__search_products_by_query(
+                    query=query,
+                    nm_ids=nm_ids,
+                    owner=owner,
+                    on_progress=on_progress,
+                    max_pages=(page_budgets or {}).get(normalized_query),
+                    warm_start=warm_start,
+                    known_pages=(known_pages or {}).get(normalized_query),
                 )
             except Exception as e:
-                logger.error(f'При попытке найти страницу {query} для продукта {product_url} произошла ошибка:\n{e}')
-                result = None
+                logger.error(f'При попытке найти страницу {query} для товаров {sorted(nm_ids)} произошла ошибка:\n{e}')
+                result = {
+                    nm_id: QuerySearchResult(status='failed', error=f'{type(e).__name__}: {e}') for nm_id in nm_ids
+                }
 
-            return query, result
+            return normalized_query, result
 
-        tasks = [process_query(query) for query in queries]
-        results = await asyncio.gather(*tasks)
+        tasks = [asyncio.create_task(process_query(normalized_query)) for normalized_query in unique_queries]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # Потребитель мог прекратить итерацию раньше, останавливаем оставшиеся поиски
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-        # Преобразуем список кортежей в словарь
-        logger.info(f'results: {results}')
-        return dict(results)
+    @staticmethod
+    def __normalize_query(query: str) -> str:
+        return ' '.join(query.lower().split())
 
     @staticmethod
-    def __build_search_url(query: str) -> str:
+    def _build_search_url(query: str, page_number: int) -> str:
         """Формирует URL для поиска по заданному запросу."""
         return (
-                'https://www.wildberries.ru/catalog/0/search.aspx?'
-                'page={page_number}&sort=popular&search=' + query.replace(' ', '+')
+                f'{settings.WILDBERRIES_BASE_URL.rstrip("/")}/catalog/0/search.aspx?'
+                f'page={page_number}&sort={CATALOG_SORT}&search=' + query.replace(' ', '+')
         )
 
-    async def __search_product_by_query(
-            self,
-            search_page_template_url: str,
-            product_url: str
-    ) -> Union[ProductPosition, None]:
-        """ Поиск товара по одному запросу """
-
-        result = await self.__iterate_through_pages(
-            search_page_template_url=search_page_template_url,
-            product_url=product_url
+    @staticmethod
+    def __build_cache_key(query: str, page_number: int) -> str:
+        """ Ключ кеша страницы выдачи: нормализованный запрос, номер страницы и сортировка """
+        normalized_query = WildberriesCatalogScrapper.__normalize_query(query)
+        return f'serp:{CATALOG_SORT}:{page_number}:{normalized_query}'
+
+    @staticmethod
+    def __build_total_results_cache_key(query: str) -> str:
+        """ Ключ кеша числа товаров в выдаче по запросу """
+        normalized_query = WildberriesCatalogScrapper.__normalize_query(query)
+        return f'serp_total:{CATALOG_SORT}:{normalized_query}'
+
+    @staticmethod
+    def __count_pages(total_results: int) -> int:
+        """ Сколько страниц выдачи занимают total_results товаров """
+        return max(1, math.ceil(total_results / max(1, settings.CATALOG_PAGE_SIZE)))
+
+    async def __get_recorded_total_results(self, query: str) -> Union[int, None]:
+        """ Число товаров по запросу с прошлого поиска, пока оно не устарело вместе с кешем выдачи """
+        if self._serp_cache is None:
+            return None
+        cached = await self._serp_cache.get(self.__build_total_results_cache_key(query))
+        return cached['total_results'] if cached else None
+
+    async def __record_total_results(self, query: str, total_results: int) -> None:
+        if self._serp_cache is not None:
+            await self._serp_cache.set(
+                key=self.__build_total_results_cache_key(query),
+                value={'total_results': total_results},
+            )
+
+    @staticmethod
+    def __create_serp_cache() -> Union[AsyncCache, None]:
+        """ Кеш страниц выдачи по настройкам, None если кеш выключен """
+        if settings.SERP_CACHE_TTL <= 0:
+            return None
+
+        persistent_backend = None
+        if settings.SERP_CACHE_SQLITE_PATH:
+            persistent_backend = SqliteCacheBackend(
+                path=Path(BASE_DIR, settings.SERP_CACHE_SQLITE_PATH),
+                max_entries=settings.SERP_CACHE_MAX_ENTRIES,
+            )
+
+        return AsyncCache(
+            ttl=settings.SERP_CACHE_TTL,
+            max_entries=settings.SERP_CACHE_MAX_ENTRIES,
+            persistent_backend=persistent_backend,
         )
 
-        if result is None:
-            logger.info(
-                f'Товар {product_url} не найден на первых {settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG} страницах'
+    async def __search_products_by_query(
+            self,
+            query: str,
+            nm_ids: Set[int],
+            owner: Hashable,
+            on_progress: ProgressCallback = None,
+            max_pages: int = None,
+            warm_start: bool = False,
+            known_pages: Dict[int, CatalogPage] = None,
+    ) -> Dict[int, QuerySearchResult]:
+        """
+        Поиск товаров по одному запросу. Товар, не найденный на загрузившихся страницах,
+        считается не найденным, только если до конца просмотра не было незагрузившихся страниц
+
+        :param max_pages: Сколько страниц выдачи просматривать, по умолчанию MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        :param warm_start: Для одного артикула сначала проверить страницы вокруг позиции из истории
+        :param known_pages: Уже загруженные страницы выдачи по номерам
+        """
+
+        # Недогрузившиеся страницы без искомых товаров загружаются заново, как обычные
+        known_pages = {
+            page_number: catalog_page for page_number, catalog_page in (known_pages or {}).items()
+            if not self.__misses_targets(catalog_page, nm_ids)
+        }
+
+        recorded_total_results = await self.__get_recorded_total_results(query)
+        last_position = None
+        if warm_start and self._position_history is not None and len(nm_ids) == 1:
+            last_position = await self._position_history.last_position(nm_id=next(iter(nm_ids)), query=query)
+
+        if last_position is not None:
+            sweep = await self.__warm_start_sweep(
+                query=query,
+                nm_ids=nm_ids,
+                owner=owner,
+                last_position=last_position,
+                on_progress=on_progress,
+                max_pages=max_pages,
+                total_results=recorded_total_results,
+                known_pages=known_pages,
+            )
+        else:
+            sweep = await self.__iterate_through_pages(
+                query=query,
+                nm_ids=nm_ids,
+                owner=owner,
+                on_progress=on_progress,
+                max_pages=max_pages,
+                total_results=recorded_total_results,
+                known_pages=known_pages,
             )
+        positions, last_page_number = sweep.positions, sweep.last_page_number
+        # Страницы за пределами просмотра на результат уже не влияют
+        failed_pages = sorted(page_number for page_number in sweep.failed_pages if page_number <= last_page_number)
+
+        total_pages = None
+        if sweep.total_results is not None:
+            total_pages = self.__count_pages(sweep.total_results)
+            logger.info(f'По запросу {query} найдено {sweep.total_results} товаров, страниц выдачи: {total_pages}')
+            if sweep.total_results != recorded_total_results:
+                await self.__record_total_results(query=query, total_results=sweep.total_results)
+
+        # Просмотр остановил бюджет страниц, а не конец выдачи или MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        truncated = (
+            max_pages is not None
+            and max_pages < settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+            and last_page_number >= max_pages
+            and (total_pages is None or total_pages > max_pages)
+        )
+
+        result = {}
+        for nm_id in nm_ids:
+            if nm_id in positions:
+                position = positions[nm_id]
+                result[nm_id] = QuerySearchResult(
+                    status='found',
+                    position=position,
+                    pages_checked=position.page_number,
+                    pages_loaded=sweep.pages_loaded,
+                    failed_pages=[page_number for page_number in failed_pages if page_number < position.page_number],
+                    total_results=sweep.total_results,
+                    total_pages=total_pages,
+                )
+            else:
+                result[nm_id] = QuerySearchResult(
+                    status='failed' if failed_pages else 'not_found',
+                    pages_checked=last_page_number,
+                    pages_loaded=sweep.pages_loaded,
+                    failed_pages=failed_pages,
+                    total_results=sweep.total_results,
+                    total_pages=total_pages,
+                    truncated=truncated,
+                )
+
+        if not_found := nm_ids - positions.keys():
+            if failed_pages:
+                logger.warning(
+                    f'Товары {sorted(not_found)} не найдены по запросу {query}, но страницы {failed_pages} '
+                    f'не загрузились'
+                )
+            else:
+                logger.info(f'Товары {sorted(not_found)} не найдены на первых {last_page_number} страницах')
 
+        await self.__record_history(query=query, result=result)
         return result
 
+    async def __record_history(self, query: str, result: Dict[int, QuerySearchResult]) -> None:
+        """
+        Сохраняет результаты поиска в историю позиций. Ошибка записи не должна ломать сам поиск.
+        Поиск, урезанный бюджетом страниц (например, при отборе запросов в боте), помечается как truncated
+        и не затирает последнюю известную позицию
+        """
+        if self._position_history is None:
+            return
+        for nm_id, search_result in result.items():
+            try:
+                await self._position_history.record(nm_id=nm_id, query=query, result=search_result)
+            except Exception as e:
+                logger.error(f'Не удалось сохранить позицию товара {nm_id} по запросу {query} в историю: {e}')
+
+    async def __warm_start_sweep(
+            self,
+            query: str,
+            nm_ids: Set[int],
+            owner: Hashable,
+            last_position: ProductPosition,
+            on_progress: ProgressCallback = None,
+            max_pages: int = None,
+            total_results: int = None,
+            known_pages: Dict[int, CatalogPage] = None,
+    ) -> CatalogSweep:
+        """
+        Поиск от страницы, на которой товар был в прошлый раз: сначала она сама вместе с первой страницей
+        и уже загруженными страницами, затем волнами по соседним страницам с обеих сторон, не дальше
+        WARM_START_RADIUS. Страницы одной волны загружаются одновременно, просмотр останавливается на первой
+        волне с находкой, из найденных позиций берется самая ранняя.
+
+        Первая страница проверяется всегда: товар, поднявшийся в начало выдачи (например, рекламой),
+        иначе был бы найден ниже, чем при полном просмотре. Страницы между первой и окрестностью прошлой
+        позиции не проверяются, это цена быстрой перепроверки.
+
+        Если рядом товара нет, выдача просматривается полностью с первой страницы,
+        уже проверенные страницы повторно не загружаются.
+        """
+        stop_page_number = max_pages or settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        start_page_number = last_position.page_number
+        radius = max(0, settings.WARM_START_RADIUS)
+
+        known_pages = known_pages or {}
+        positions: Dict[int, ProductPosition] = {}
+        checked_pages: Set[int] = set()
+        failed_pages: List[int] = []
+        pages_loaded = 0
+
+        async def check_page(page_number: int) -> Tuple[Dict[int, ProductPosition], Union[int, None]]:
+            if page_number in known_pages:
+                catalog_page = known_pages[page_number]
+                return self.__find_page_positions(catalog_page, nm_ids), catalog_page.total_results
+            return await self.__check_page(query=query, page_number=page_number, nm_ids=nm_ids, owner=owner)
+
+        def last_page_number() -> int:
+            if total_results is None:
+                return stop_page_number
+            return min(stop_page_number, self.__count_pages(total_results))
+
+        for distance in range(radius + 1):
+            wave = {start_page_number - distance, start_page_number + distance}
+            if distance == 0:
+                wave |= {1} | known_pages.keys()
+            wave = sorted(wave - checked_pages - set(failed_pages))
+            wave = [page_number for page_number in wave if 1 <= page_number <= last_page_number()]
+            if not wave:
+                continue
+
+            wave_results = await asyncio.gather(
+                *(check_page(page_number) for page_number in wave),
+                return_exceptions=True,
+            )
+            for page_number, page_result in zip(wave, wave_results):
+                pages_loaded += page_number not in known_pages
+                if on_progress is not None:
+                    on_progress(query, page_number)
+                if isinstance(page_result, CatalogFindItemsError):
+                    # Дальше этой страницы товаров нет
+                    stop_page_number = min(stop_page_number, page_number - 1)
+                    checked_pages.add(page_number)
+                    continue
+                if isinstance(page_result, Exception):
+                    logger.error(
+                        f'Не удалось загрузить страницу {page_number} по запросу {query}: '
+                        f'{type(page_result).__name__}: {page_result}'
+                    )
+                    failed_pages.append(page_number)
+                    continue
+
+                page_positions, page_total_results = page_result
+                checked_pages.add(page_number)
+                if page_total_results is not None:
+                    total_results = page_total_results
+                for nm_id, position in page_positions.items():
+                    if nm_id not in positions or position.page_number < positions[nm_id].page_number:
+                        positions[nm_id] = position
+
+            if positions.keys() >= nm_ids:
+                WARM_STARTS.labels('hit').inc()
+                return CatalogSweep(
+                    positions=positions,
+                    failed_pages=failed_pages,
+                    last_page_number=max(position.page_number for position in positions.values()),
+                    total_results=total_results,
+                    pages_loaded=pages_loaded,
+                )
+
+        WARM_STARTS.labels('miss').inc()
+        logger.info(
+            f'Товары {sorted(nm_ids)} не найдены рядом со страницей {start_page_number} по запросу {query}, '
+            f'просматриваю выдачу полностью'
+        )
+        # Незагрузившиеся страницы пробуем еще раз при полном просмотре
+        sweep = await self.__iterate_through_pages(
+            query=query,
+            nm_ids=nm_ids,
+            owner=owner,
+            on_progress=on_progress,
+            max_pages=stop_page_number,
+            total_results=total_results,
+            skip_pages=checked_pages,
+            known_pages={
+                page_number: catalog_page for page_number, catalog_page in known_pages.items()
+                if page_number not in checked_pages
+            },
+        )
+        sweep.pages_loaded += pages_loaded
+        return sweep
+
     async def __iterate_through_pages(
             self,
-            search_page_template_url: str,
-            product_url: str
-    ) -> Union[ProductPosition, None]:
-        """Итерируется по страницам поиска, пока не найдет товар или не достигнет предела."""
+            query: str,
+            nm_ids: Set[int],
+            owner: Hashable,
+            on_progress: ProgressCallback = None,
+            max_pages: int = None,
+            total_results: int = None,
+            skip_pages: Set[int] = frozenset(),
+            known_pages: Dict[int, CatalogPage] = None,
+    ) -> CatalogSweep:
+        """
+        Проходит по страницам поиска скользящим окном из CATALOG_PAGES_WINDOW_SIZE одновременно загружаемых страниц.
+        Для каждого артикула возвращает позицию на самой ранней странице, на которой он найден.
+
+        Страницы загружаются не дальше max_pages и не дальше последней страницы выдачи, которая считается
+        по числу товаров над выдачей. Число берется с прошлого поиска (total_results) и уточняется
+        по каждой загруженной странице.
+
+        Когда найдены все артикулы, загрузки страниц после самой дальней находки отменяются.
+        Загрузки страниц после страницы без товаров отменяются всегда.
+        Страница, которая не загрузилась и после повторов, пропускается, остальные продолжают проверяться.
+        Страницы из skip_pages уже проверены без находок и не загружаются.
+        Страницы из known_pages уже загружены, они проверяются до начала обхода и тоже не загружаются.
+        """
+
+        window_size = max(1, settings.CATALOG_PAGES_WINDOW_SIZE)
+        # Граница по бюджету, находкам и пустым страницам, со временем только уменьшается
+        stop_page_number = max_pages or settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        next_page_number = 1
+
+        result: Dict[int, ProductPosition] = {}
+        failed_pages: List[int] = []
+        pages_loaded = 0
+        in_flight: Dict[asyncio.Task, int] = {}
+        cancelled: List[asyncio.Task] = []
+
+        def last_page_number() -> int:
+            if total_results is None:
+                return stop_page_number
+            return min(stop_page_number, self.__count_pages(total_results))
+
+        known_pages = known_pages or {}
+        skip_pages = set(skip_pages) | known_pages.keys()
+        for page_number, catalog_page in sorted(known_pages.items()):
+            if page_number > last_page_number():
+                continue
+            if on_progress is not None:
+                on_progress(query, page_number)
+            if catalog_page.total_results is not None:
+                total_results = catalog_page.total_results
+            for nm_id, position in self.__find_page_positions(catalog_page, nm_ids).items():
+                if nm_id not in result or position.page_number < result[nm_id].page_number:
+                    result[nm_id] = position
+        if result and result.keys() >= nm_ids:
+            stop_page_number = min(stop_page_number, max(position.page_number for position in result.values()) - 1)
+
+        def cancel_pages_after(page_number: int) -> None:
+            """ Отменяем загрузку страниц, которые уже не могут улучшить результат """
+            for task, task_page_number in list(in_flight.items()):
+                if task_page_number > page_number:
+                    task.cancel()
+                    cancelled.append(task)
+                    del in_flight[task]
+
+        try:
+            while True:
+                while len(in_flight) < window_size and next_page_number <= last_page_number():
+                    if next_page_number not in skip_pages:
+                        in_flight[asyncio.create_task(self.__check_page(
+                            query=query, page_number=next_page_number, nm_ids=nm_ids, owner=owner
+                        ))] = next_page_number
+                    next_page_number += 1
+
+                if not in_flight:
+                    break
+
+                done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=in_flight.get):
+                    if task not in in_flight:
+                        # Страница уже отброшена после обработки более ранней страницы из этой же пачки
+                        continue
+                    page_number = in_flight.pop(task)
+                    pages_loaded += 1
+                    if on_progress is not None:
+                        on_progress(query, page_number)
+                    try:
+                        positions, page_total_results = task.result()
+                    except CatalogFindItemsError:
+                        # Дальше этой страницы товаров нет
+                        stop_page_number = min(stop_page_number, page_number - 1)
+                        cancel_pages_after(last_page_number())
+                        continue
+                    except Exception as e:
+                        # Товар мог быть на этой странице, поэтому без нее запрос уже не будет "не найден"
+                        logger.error(
+                            f'Не удалось загрузить страницу {page_number} по запросу {query}: {type(e).__name__}: {e}'
+                        )
+                        failed_pages.append(page_number)
+                        continue
+
+                    if page_total_results is not None and page_total_results != total_results:
+                        # Выдача могла вырасти или сократиться с прошлого поиска
+                        total_results = page_total_results
+                        cancel_pages_after(last_page_number())
+
+                    for nm_id, position in positions.items():
+                        if nm_id not in result or position.page_number < result[nm_id].page_number:
+                            result[nm_id] = position
+
+                    if result.keys() >= nm_ids:
+                        # Нужны только страницы до самой дальней находки: на них товары могут оказаться выше
+                        stop_page_number = min(
+                            stop_page_number,
+                            max(position.page_number for position in result.values()) - 1,
+                        )
+                        cancel_pages_after(last_page_number())
+        finally:
+            for task in in_flight:
+                task.cancel()
+            # Дожидаемся отмененных задач, что бы их страницы были закрыты
+            await asyncio.gather(*in_flight, *cancelled, return_exceptions=True)
+
+        return CatalogSweep(
+            positions=result,
+            failed_pages=failed_pages,
+            last_page_number=last_page_number(),
+            total_results=total_results,
+            pages_loaded=pages_loaded,
+        )
+
+    async def __check_page(
+            self,
+            query: str,
+            page_number: int,
+            nm_ids: Set[int],
+            owner: Hashable,
+    ) -> Tuple[Dict[int, ProductPosition], Union[int, None]]:
+        """ Проверка одной страницы поиска, возвращает позиции найденных на ней артикулов и число товаров """
+        catalog_page = await self.__load_catalog_page(
+            query=query,
+            page_number=page_number,
+            owner=owner,
+            target_nm_ids=nm_ids,
+        )
+        return self.__find_page_positions(catalog_page, nm_ids), catalog_page.total_results
+
+    def __find_page_positions(self, catalog_page: CatalogPage, nm_ids: Set[int]) -> Dict[int, ProductPosition]:
+        """ Позиции искомых артикулов на загруженной странице выдачи """
+        positions = {}
+        for nm_id, position in self.__find_products_positions(nm_ids=catalog_page.nm_ids, targets=nm_ids).items():
+            logger.info(f'Товар {nm_id} найден на странице {catalog_page.page_number}, позиции {position}')
+            positions[nm_id] = ProductPosition(
+                page_number=catalog_page.page_number,
+                position_on_page=position,
+                page_url=catalog_page.page_url,
+            )
+        return positions
+
+    async def __load_catalog_page(
+            self,
+            query: str,
+            page_number: int,
+            owner: Hashable,
+            target_nm_ids: Iterable[int] = (),
+    ) -> CatalogPage:
+        """
+        Возвращает страницу выдачи из кеша или загружает ее через _fetch_catalog_page.
+        Одновременные загрузки одной и той же страницы объединяются в одну.
+
+        Страница, прокрутка которой остановилась раньше карточек искомых товаров (на карточках других товаров
+        или по таймауту), загружается заново полностью. Если и повторная загрузка не дошла до конца страницы,
+        отсутствие товаров на ней ничего не значит, и страница считается незагрузившейся.
 
-        # TODO add run gather with batches for pages
-        for page_number in range(1, settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG + 1):
-            search_page_url = search_page_template_url.format(page_number=page_number)
-            logger.info(f'Сканирую страницу: {search_page_url}')
+        :raises IncompleteCatalogPageError: Если страница не догрузилась и после повтора
+        """
+        if self._serp_cache is None:
+            catalog_page = await self._fetch_catalog_page(
+                query=query, page_number=page_number, owner=owner, target_nm_ids=target_nm_ids
+            )
+            if self.__misses_targets(catalog_page, target_nm_ids):
+                catalog_page = await self._fetch_catalog_page(query=query, page_number=page_number, owner=owner)
+            return self.__ensure_targets_checked(catalog_page, target_nm_ids)
+
+        cache_key = self.__build_cache_key(query=query, page_number=page_number)
+        loaded = False
 
+        async def load() -> dict:
+            nonlocal loaded
+            loaded = True
             try:
-                if position := await self.__check_for_product_on_page(
-                        search_page_url=search_page_url,
-                        product_url=product_url
-                ):
-                    logger.info(f'Товар найден на странице {page_number}, позиции {position}')
-                    return ProductPosition(page_number=page_number, position_on_page=position, page_url=search_page_url)
+                catalog_page = await self._fetch_catalog_page(
+                    query=query, page_number=page_number, owner=owner, target_nm_ids=target_nm_ids
+                )
             except CatalogFindItemsError:
-                break
+                # Пустые страницы тоже кешируем, что бы не открывать их повторно
+                return {'no_results': True}
+            return catalog_page.model_dump()
+
+        cached = await self._serp_cache.get_or_load(key=cache_key, loader=load)
+        if not loaded:
+            CATALOG_PAGES.labels('cache').inc()
+        if cached.get('no_results'):
+            raise CatalogFindItemsError
 
-        return None
+        catalog_page = CatalogPage(**cached)
+        if self.__misses_targets(catalog_page, target_nm_ids):
+            catalog_page = await self._fetch_catalog_page(query=query, page_number=page_number, owner=owner)
+            if catalog_page.complete:
+                await self._serp_cache.set(key=cache_key, value=catalog_page.model_dump())
 
-    async def __check_for_product_on_page(
+        return self.__ensure_targets_checked(catalog_page, target_nm_ids)
+
+    @staticmethod
+    def __misses_targets(catalog_page: CatalogPage, target_nm_ids: Iterable[int]) -> bool:
+        """ Страница загрузилась не полностью, и части искомых товаров на ней нет """
+        return not catalog_page.complete and not set(target_nm_ids) <= set(catalog_page.nm_ids)
+
+    def __ensure_targets_checked(self, catalog_page: CatalogPage, target_nm_ids: Iterable[int]) -> CatalogPage:
+        if self.__misses_targets(catalog_page, target_nm_ids):
+            raise IncompleteCatalogPageError(
+                f'Страница {catalog_page.page_number} по запросу {catalog_page.query} не догрузилась: '
+                f'{len(catalog_page.nm_ids)} карточек'
+            )
+        return catalog_page
+
+    async def _fetch_catalog_page(
             self,
-            search_page_url: str,
-            product_url: str
-    ) -> Union[int, None]:
-        """Проверяем наличие продукта на странице и возвращает его позицию или None """
+            query: str,
+            page_number: int,
+            owner: Hashable,
+            target_nm_ids: Iterable[int] = (),
+    ) -> CatalogPage:
+        """
+        Загружает страницу выдачи в браузере и достает из нее артикулы товаров.
+        Если переданы target_nm_ids, прокрутка заканчивается, как только появятся карточки всех этих товаров.
+        Другие движки поиска переопределяют этот метод, кеш и обход страниц остаются общими.
 
-        page = await self._create_page()
-        try:
-            await self.__navigate_to_searching_page(search_page_url=search_page_url, page=page)
-            product_cards = await self.__get_product_cards_from_page(page=page)
-            return await self.__find_product_position(product_cards=product_cards, product_url=product_url)
-        finally:
-            await page.close()
+        :raises CatalogFindItemsError: Если по запросу на странице ничего не нашлось
+        """
+        search_page_url = self._build_search_url(query=query, page_number=page_number)
+        logger.info(f'Сканирую страницу: {search_page_url}')
+
+        async def scrape(page: Page) -> Tuple[bool, List[int], Union[int, None]]:
+            try:
+                complete = await self.__navigate_to_searching_page(
+                    search_page_url=search_page_url,
+                    page=page,
+                    target_nm_ids=target_nm_ids,
+                )
+            except CatalogFindItemsError:
+                CATALOG_PAGES.labels('not_found').inc()
+                raise
+            nm_ids = await self.__get_product_nm_ids_from_page(page=page)
+            return complete, nm_ids, await self.__get_total_results_from_page(page=page)
+
+        with span('catalog', 'page', expected=(CatalogFindItemsError,)):
+            complete, nm_ids, total_results = await self._load_on_page(
+                owner=owner, action=scrape, component='catalog', description=search_page_url
+            )
+        CATALOG_PAGES.labels('browser').inc()
+
+        return CatalogPage(
+            query=query,
+            page_number=page_number,
+            page_url=search_page_url,
+            nm_ids=nm_ids,
+            complete=complete,
+            total_results=total_results,
+        )
 
-    async def __navigate_to_searching_page(self, search_page_url: str, page: Page) -> None:
-        """Переходит на страницу поиска и дожидается её загрузки."""
+    async def __navigate_to_searching_page(
+            self,
+            search_page_url: str,
+            page: Page,
+            target_nm_ids: Iterable[int] = (),
+    ) -> bool:
+        """
+        Переходит на страницу поиска и дожидается её загрузки.
+
+        :return: True, если загрузились все карточки страницы
+        """
 
         logger.debug(f'Заходим на страницу {search_page_url}')
         try:
-            await page.goto(search_page_url, wait_until='domcontentloaded')
-            await page.wait_for_selector('div.catalog-page:not(.hide)')
+            with span('catalog', 'goto'):
+                await page.goto(
+                    search_page_url, wait_until='domcontentloaded', timeout=settings.PAGE_GOTO_TIMEOUT * 1000
+                )
+            with span('catalog', 'wait_for_catalog'):
+                await page.wait_for_selector(
+                    'div.catalog-page:not(.hide)', timeout=settings.PAGE_SELECTOR_TIMEOUT * 1000
+                )
             await self.__check_for_no_result(page_url=search_page_url, page=page)
         except CatalogFindItemsError as e:
             raise e
         logger.debug(f'Зашли на страницу {search_page_url}')
-        await self.__scroll_page_to_the_end(page=page)
+        with span('catalog', 'scroll'):
+            return await self.__scroll_page_to_the_end(page=page, target_nm_ids=target_nm_ids)
 
     @staticmethod
-    async def __get_product_cards_from_page(page: Page) -> List[ElementHandle]:
-        """Получает все карточки продуктов со страницы."""
+    async def __get_product_nm_ids_from_page(page: Page) -> List[int]:
+        """Получает артикулы всех карточек товаров со страницы за один вызов внутри страницы."""
 
-        catalog = await page.query_selector('div.product-card-overflow')
-        product_cards = await catalog.query_selector_all('a.product-card__link')
-        logger.debug(f'Found {len(product_cards)} cards')
+        with span('catalog', 'extract_cards'):
+            nm_ids = await page.eval_on_selector_all(PRODUCT_CARD_SELECTOR, EXTRACT_CARDS_NM_IDS_SCRIPT)
+        logger.debug(f'Found {len(nm_ids)} cards')
 
-        return product_cards
+        return nm_ids
 
     @staticmethod
-    async def __find_product_position(
-            product_cards: List[ElementHandle],
-            product_url: str
-    ) -> Union[int, None]:
-        """Ищет продукт среди карточек и возвращает его позицию."""
-
-        for index, card in enumerate(product_cards, 1):
-            href = await card.get_attribute('href')
-            logger.debug(f'Found href {href}')
-            if not href:
-                continue
-            if product_url == href:
-                return index
-        return None
+    async def __get_total_results_from_page(page: Page) -> Union[int, None]:
+        """ Число товаров по запросу из заголовка выдачи, None если сайт его не показал """
+        total_results = await page.evaluate(EXTRACT_TOTAL_RESULTS_SCRIPT)
+        logger.debug(f'Товаров по запросу: {total_results}')
+        return total_results
+
+    @staticmethod
+    def __find_products_positions(nm_ids: List[int], targets: Set[int]) -> Dict[int, int]:
+        """Ищет артикулы товаров среди карточек и возвращает их позиции."""
+
+        positions = {}
+        for index, nm_id in enumerate(nm_ids, 1):
+            if nm_id in targets and nm_id not in positions:
+                positions[nm_id] = index
+        return positions
 
     @staticmethod
     async def __check_for_no_result(page_url: str, page: Page) -> None:
@@ -189,30 +1025,32 @@ class WildberriesCatalogScrapper(WildberriesBaseScrapper):
             raise CatalogFindItemsError
 
     @staticmethod
-    async def __scroll_page_to_the_end(page: Page):
-        """
-        Функция проматывает страницу до конца, что бы загрузить все товары
+    async def __scroll_page_to_the_end(page: Page, target_nm_ids: Iterable[int] = ()) -> bool:
         """
+        Проматывает страницу до конца, что бы загрузить все товары.
 
-        viewport_height = await page.evaluate("window.innerHeight")
-        current_position = 0
-        last_height = await page.evaluate("document.body.scrollHeight")
+        Прокрутка идет внутри страницы так быстро, как подгружаются карточки, и заканчивается, когда:
+            * на странице появились карточки всех искомых товаров
+            * загружено CATALOG_PAGE_SIZE карточек
+            * страница долистана, и число карточек не меняется PAGE_SCROLLING_SPEED секунд
+            * вышло время PAGE_SCROLL_TIMEOUT
 
-        logger.debug('Листаю страницу вниз')
-        while current_position < last_height:
-            # Скролим на 80% страницы, что бы часть старого контента осталось
-            current_position += viewport_height * 0.8
-            await page.evaluate(f"window.scrollTo(0, {current_position})")
-
-            # Ждем подгрузки товаров
-            await asyncio.sleep(settings.PAGE_SCROLLING_SPEED)
-
-            # Проверяем, дошли ли мы до конца страницы
-            new_height = await page.evaluate("document.body.scrollHeight")
-            if new_height > last_height:
-                last_height = new_height
+        :return: True, если загрузились все карточки, а не только до искомых товаров или до таймаута
+        """
 
-        logger.debug('Страница пролистана')
+        logger.debug('Листаю страницу вниз')
+        result = await page.evaluate(
+            SCROLL_UNTIL_CARDS_LOADED_SCRIPT,
+            {
+                'cardSelector': PRODUCT_CARD_SELECTOR,
+                'targetNmIds': list(target_nm_ids),
+                'expectedCount': settings.CATALOG_PAGE_SIZE,
+                'quietMs': settings.PAGE_SCROLLING_SPEED * 1000,
+                'timeoutMs': settings.PAGE_SCROLL_TIMEOUT * 1000,
+            },
+        )
+        logger.debug(f'Страница пролистана: загружено {result["count"]} карточек, причина остановки {result["reason"]}')
+        return result['reason'] in ('full', 'stable')
 
 
 async def main():
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Hashable, Iterable, Union
+
+import aiohttp
+from loguru import logger
+
+from settings.config import settings
+from src.caching.cache import AsyncCache
+from src.monitoring.metrics import CATALOG_PAGES, span
+from src.scrappers.exceptions import CatalogFindItemsError, CatalogRequestBlocked
+from src.scrappers.models import CatalogPage
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.load_policy import load_with_retries
+from src.scrappers.wildberries.wildberries_catalog import CATALOG_SORT, WildberriesCatalogScrapper
+from src.tracking.history import PositionHistory
+
+# Ответы, которыми сайт отказывает в выдаче: запрет, слишком частые запросы, антибот
+BLOCKED_STATUSES = {403, 429, 498}
+
+# Постоянные параметры запроса выдачи, как их отправляет фронтенд сайта
+SEARCH_API_PARAMS = {
+    'appType': 1,
+    'curr': 'rub',
+    'lang': 'ru',
+    'resultset': 'catalog',
+    'spp': 30,
+    'suppressSpellcheck': 'false',
+}
+
+SEARCH_API_HEADERS = {
+    'Accept': 'application/json',
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/134.0.0.0 Safari/537.36'
+    ),
+}
+
+
+class WildberriesHttpCatalogScrapper(WildberriesCatalogScrapper):
+    """
+    Поиск товаров в выдаче Wildberries без браузера: страницы выдачи запрашиваются напрямую
+    у JSON API поиска, которое использует фронтенд сайта.
+
+    Кеш, обход страниц окном и формат результатов общие с браузерным скраппером.
+    Если API отказывает в выдаче, страницы CATALOG_HTTP_BLOCK_COOLDOWN секунд загружаются в браузере.
+    """
+
+    def __init__(
+            self,
+            backend: BrowserBackend = None,
+            serp_cache: AsyncCache = None,
+            position_history: PositionHistory = None,
+    ) -> None:
+        """
+        :param backend: Общий набор браузеров, используется только когда API отказывает в выдаче
+        :param serp_cache: Общий кеш страниц выдачи. Если не передан, создается по настройкам SERP_CACHE_*
+        :param position_history: История позиций. Если не передана, создается по POSITION_HISTORY_PATH
+        """
+        super().__init__(backend=backend, serp_cache=serp_cache, position_history=position_history)
+
+        self._session: Union[aiohttp.ClientSession, None] = None
+        self._blocked_until = 0.0
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await super().close()
+
+    async def _ensure_browser_initialized(self) -> None:
+        """ Браузеры запускаются только при переходе на загрузку страниц в браузере """
+
+    async def _fetch_catalog_page(
+            self,
+            query: str,
+            page_number: int,
+            owner: Hashable,
+            target_nm_ids: Iterable[int] = (),
+    ) -> CatalogPage:
+        """
+        Запрашивает страницу выдачи у API поиска. Выдача API приходит целиком, прокрутка не нужна.
+
+        :raises CatalogFindItemsError: Если по запросу на странице ничего не нашлось
+        """
+        if time.monotonic() < self._blocked_until:
+            return await self.__fetch_in_browser(
+                query=query, page_number=page_number, owner=owner, target_nm_ids=target_nm_ids
+            )
+
+        try:
+            with span('catalog_http', 'page', expected=(CatalogFindItemsError, CatalogRequestBlocked)):
+                payload = await load_with_retries(
+                    load=lambda: self.__request_search(query=query, page_number=page_number),
+                    component='catalog_http',
+                    description=f'выдачи "{query}", страница {page_number}',
+                )
+        except CatalogRequestBlocked as e:
+            logger.warning(
+                f'API поиска отказало в выдаче ({e}), следующие {settings.CATALOG_HTTP_BLOCK_COOLDOWN} с '
+                f'страницы загружаются в браузере'
+            )
+            CATALOG_PAGES.labels('http_blocked').inc()
+            self._blocked_until = time.monotonic() + settings.CATALOG_HTTP_BLOCK_COOLDOWN
+            return await self.__fetch_in_browser(
+                query=query, page_number=page_number, owner=owner, target_nm_ids=target_nm_ids
+            )
+
+        data = payload.get('data', payload)
+        nm_ids = [product['id'] for product in data.get('products') or [] if 'id' in product]
+        if not nm_ids:
+            logger.info(f'По запросу {query} на странице {page_number} ничего не нашлось')
+            CATALOG_PAGES.labels('not_found').inc()
+            raise CatalogFindItemsError
+        CATALOG_PAGES.labels('http').inc()
+
+        return CatalogPage(
+            query=query,
+            page_number=page_number,
+            page_url=self._build_search_url(query=query, page_number=page_number),
+            nm_ids=nm_ids,
+            total_results=data.get('total'),
+        )
+
+    async def __fetch_in_browser(
+            self,
+            query: str,
+            page_number: int,
+            owner: Hashable,
+            target_nm_ids: Iterable[int] = (),
+    ) -> CatalogPage:
+        await super()._ensure_browser_initialized()
+        return await super()._fetch_catalog_page(
+            query=query, page_number=page_number, owner=owner, target_nm_ids=target_nm_ids
+        )
+
+    async def __request_search(self, query: str, page_number: int) -> dict:
+        """
+        Один запрос страницы выдачи к API поиска
+
+        :raises CatalogRequestBlocked: Если API отказало в выдаче или вернуло не JSON (страницу проверки)
+        """
+        params = {
+            **SEARCH_API_PARAMS,
+            'dest': settings.WILDBERRIES_DEST,
+            'page': page_number,
+            'query': query,
+            'sort': CATALOG_SORT,
+        }
+        async with self.__get_session().get(settings.WILDBERRIES_SEARCH_API_URL, params=params) as response:
+            if response.status in BLOCKED_STATUSES:
+                raise CatalogRequestBlocked(f'HTTP {response.status}')
+            # Ошибки сервера повторяются, как и сетевые
+            response.raise_for_status()
+            try:
+                return await response.json(content_type=None)
+            except ValueError:
+                raise CatalogRequestBlocked(f'ответ не JSON: {response.content_type}') from None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Сессия создается при первом запросе внутри event loop. Соединения держатся открытыми
+        и переиспользуются, одновременных соединений не больше CATALOG_HTTP_MAX_CONNECTIONS
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.CATALOG_HTTP_MAX_CONNECTIONS,
+                    keepalive_timeout=60,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=settings.CATALOG_HTTP_TIMEOUT),
+                headers=SEARCH_API_HEADERS,
+            )
+        return self._session
+
+
+def create_catalog_scrapper(
+        backend: BrowserBackend = None,
+        serp_cache: AsyncCache = None,
+        position_history: PositionHistory = None,
+) -> WildberriesCatalogScrapper:
+    """ Скраппер каталога выбранного в CATALOG_ENGINE движка: browser или http """
+    if settings.CATALOG_ENGINE == 'http':
+        return WildberriesHttpCatalogScrapper(
+            backend=backend, serp_cache=serp_cache, position_history=position_history
+        )
+    if settings.CATALOG_ENGINE == 'browser':
+        return WildberriesCatalogScrapper(backend=backend, serp_cache=serp_cache, position_history=position_history)
+    raise ValueError(f'Неизвестный CATALOG_ENGINE={settings.CATALOG_ENGINE}, доступны: browser, http')
+
+
+async def main():
+    scraper = WildberriesHttpCatalogScrapper()
+
+    product_url = 'https://www.wildberries.ru/catalog/149751046/detail.aspx'
+    queries = ['зонт мужской автомат', 'зонт мужской']
+
+    try:
+        res = await scraper.find_product_positions(product_url=product_url, queries=queries)
+        print(f'Result: {res}')
+    finally:
+        await scraper.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
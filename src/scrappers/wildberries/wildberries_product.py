@@ -1,11 +1,22 @@
+from __future__ import annotations
+
 import asyncio
+from typing import Hashable, TYPE_CHECKING
 
 from loguru import logger
 
+from settings.config import settings
+from src.caching.cache import AsyncCache
+from src.monitoring.metrics import span
 from src.scrappers.exceptions import ProductNotFound
-from playwright.async_api import Page
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.resource_blocking import PRODUCT_RESOURCE_PROFILE
+from src.scrappers.wildberries.urls import parse_nm_id
 from src.scrappers.wildberries.wildberries_base import WildberriesBaseScrapper
 
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
 
 class WildberriesProductScrapper(WildberriesBaseScrapper):
     """
@@ -13,30 +24,81 @@ class WildberriesProductScrapper(WildberriesBaseScrapper):
         * Поиск описания
     """
 
-    async def get_product_description(self, url: str) -> str:
+    RESOURCE_PROFILE = PRODUCT_RESOURCE_PROFILE
+
+    def __init__(self, backend: BrowserBackend = None, description_cache: AsyncCache = None) -> None:
+        """
+        :param backend: Общий набор браузеров
+        :param description_cache: Кеш описаний по артикулу. Если не передан, создается по настройкам DESCRIPTION_CACHE_*
+        """
+        super().__init__(backend=backend)
+
+        if description_cache is None and settings.DESCRIPTION_CACHE_TTL > 0:
+            description_cache = AsyncCache(
+                ttl=settings.DESCRIPTION_CACHE_TTL,
+                max_entries=settings.DESCRIPTION_CACHE_MAX_ENTRIES,
+            )
+        self._description_cache = description_cache
+
+    async def get_product_description(self, url: str, owner: Hashable = None) -> str:
         """
-        Получение описания товара по ссылке
+        Получение описания товара по ссылке.
+        Описания кешируются по артикулу, одновременные запросы одного товара используют одну загрузку страницы.
 
         :param  url: ссылка на товар на Wildberries
+        :param owner: владелец запроса (например, id чата) для честного распределения вкладок
         :return: Строка содержащая описание товара
         """
-        page = await self._create_page()
+        owner = owner if owner is not None else object()
+        if self._description_cache is None:
+            return await self.__fetch_product_description(url=url, owner=owner)
+
+        return await self._description_cache.get_or_load(
+            key=f'description:{parse_nm_id(url)}',
+            loader=lambda: self.__fetch_product_description(url=url, owner=owner),
+        )
+
+    async def __fetch_product_description(self, url: str, owner: Hashable) -> str:
+        """
+        Загружает описание во вкладке из пула, вкладка возвращается в пул даже при ошибке или отмене.
+        Если браузер упал во время загрузки, она повторяется в перезапущенном браузере,
+        таймауты и сетевые ошибки повторяются до PAGE_LOAD_RETRIES раз
+        """
+        await self._ensure_browser_initialized()
+
+        with span('product', 'description', expected=(ProductNotFound,)):
+            return await self._load_on_page(
+                owner=owner,
+                action=lambda page: self.__load_product_description(url=url, page=page),
+                component='product',
+                description=url,
+            )
+
+    async def __load_product_description(self, url: str, page: Page) -> str:
+        """ Загружает страницу товара в переданной вкладке и достает из нее описание """
 
         button_description_selector = 'button.j-details-btn-desktop'
         section_description_selector = 'section.product-details__description p.option__text'
 
         try:
             logger.info(f'Начинаю поиск товара с url: {url}')
-            await page.goto(url, wait_until='domcontentloaded')
+            with span('product', 'goto'):
+                await page.goto(url, wait_until='domcontentloaded', timeout=settings.PAGE_GOTO_TIMEOUT * 1000)
 
             logger.info(f'Ожидаем появление кнопки "Характеристики и описание" для товара с url: {url}')
-            await page.wait_for_selector(button_description_selector)
+            with span('product', 'wait_for_details_button'):
+                await page.wait_for_selector(
+                    button_description_selector, timeout=settings.PAGE_SELECTOR_TIMEOUT * 1000
+                )
 
             await self.__check_if_product_exist(url=url, page=page)
 
             logger.info(f'Загружается кнопка получения дополнительной информации для товара с url: {url}!')
-            await page.click(button_description_selector)
-            await page.wait_for_selector(section_description_selector)
+            with span('product', 'details_click'):
+                await page.click(button_description_selector, timeout=settings.PAGE_SELECTOR_TIMEOUT * 1000)
+                await page.wait_for_selector(
+                    section_description_selector, timeout=settings.PAGE_SELECTOR_TIMEOUT * 1000
+                )
 
             logger.info(f'Описание товара загрузилось!')
             description_content = await (await page.query_selector(section_description_selector)).text_content()
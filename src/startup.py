@@ -0,0 +1,29 @@
+import time
+from typing import List, Tuple
+
+from loguru import logger
+
+
+class StartupReport:
+    """ Замеры времени этапов запуска, отсчитываемые от создания отчета """
+
+    def __init__(self, started_at: float = None) -> None:
+        """
+        :param started_at: Момент начала запуска по time.perf_counter, по умолчанию - момент создания отчета
+        """
+        self._started_at = started_at if started_at is not None else time.perf_counter()
+        self._stages: List[Tuple[str, float]] = []
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    def mark(self, stage: str) -> None:
+        """ Отмечает завершение этапа запуска """
+        self._stages.append((stage, self.elapsed))
+        logger.debug(f'Этап запуска "{stage}" завершен через {self.elapsed:.3f} с')
+
+    def log(self) -> None:
+        """ Выводит в лог время всех этапов """
+        lines = [f'  {stage}: {elapsed:.3f} с' for stage, elapsed in self._stages]
+        logger.info('Время запуска:\n' + '\n'.join(lines))
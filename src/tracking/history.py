@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Union
+
+from settings.config import settings, BASE_DIR
+from src.scrappers.models import ProductPosition, QuerySearchResult
+from src.tracking.models import PositionRecord, PositionTrend, TrackedPair
+
+RECORD_COLUMNS = (
+    'nm_id, query, checked_at, status, page_number, position_on_page, page_url, '
+    'pages_checked, pages_loaded, total_results'
+)
+
+
+class PositionHistory:
+    """
+    История позиций товаров по запросам в файле SQLite.
+
+    * positions - результат каждой проверки пары (артикул, запрос) с временем проверки
+    * tracked - пары, которые периодически перепроверяет PositionTracker
+
+    Запросы хранятся нормализованными, поэтому "Зонт  мужской" и "зонт мужской" - одна пара
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS positions ('
+                'nm_id INTEGER NOT NULL, query TEXT NOT NULL, checked_at REAL NOT NULL, status TEXT NOT NULL, '
+                'page_number INTEGER, position_on_page INTEGER, page_url TEXT NOT NULL DEFAULT \'\', '
+                'pages_checked INTEGER NOT NULL DEFAULT 0, pages_loaded INTEGER NOT NULL DEFAULT 0, '
+                'total_results INTEGER)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS positions_pair ON positions (nm_id, query, checked_at)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS tracked ('
+                'nm_id INTEGER NOT NULL, query TEXT NOT NULL, added_at REAL NOT NULL, PRIMARY KEY (nm_id, query))'
+            )
+
+    async def record(self, nm_id: int, query: str, result: QuerySearchResult, checked_at: float = None) -> None:
+        """ Сохраняет результат проверки пары, поиск урезанный бюджетом страниц сохраняется со статусом truncated """
+        position = result.position
+        await asyncio.to_thread(self.__execute, (
+            f'INSERT INTO positions ({RECORD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        ), (
+            nm_id,
+            self.normalize_query(query),
+            checked_at if checked_at is not None else time.time(),
+            'truncated' if result.truncated else result.status,
+            position.page_number if position else None,
+            position.position_on_page if position else None,
+            position.page_url if position else '',
+            result.pages_checked,
+            result.pages_loaded,
+            result.total_results,
+        ))
+
+    async def last_position(self, nm_id: int, query: str) -> Union[ProductPosition, None]:
+        """
+        Позиция товара по последней полной проверке: незагрузившиеся и урезанные бюджетом проверки
+        пропускаются. None - пару еще не проверяли или в последний раз товар не нашелся
+        """
+        rows = await asyncio.to_thread(self.__fetch, (
+            f'SELECT {RECORD_COLUMNS} FROM positions WHERE nm_id = ? AND query = ? '
+            f'AND status NOT IN (\'failed\', \'truncated\') ORDER BY checked_at DESC LIMIT 1'
+        ), (nm_id, self.normalize_query(query)))
+        return self.__to_record(rows[0]).position if rows else None
+
+    async def history(self, nm_id: int, query: str, since: float = None) -> List[PositionRecord]:
+        """ Проверки пары от старых к новым, начиная с since (unix time) """
+        rows = await asyncio.to_thread(self.__fetch, (
+            f'SELECT {RECORD_COLUMNS} FROM positions WHERE nm_id = ? AND query = ? AND checked_at >= ? '
+            f'ORDER BY checked_at'
+        ), (nm_id, self.normalize_query(query), since or 0))
+        return [self.__to_record(row) for row in rows]
+
+    async def trend(self, nm_id: int, query: str, since: float = None) -> PositionTrend:
+        """ Динамика позиции пары за период, начиная с since (unix time) """
+        records = await self.history(nm_id=nm_id, query=query, since=since)
+        trend = PositionTrend(nm_id=nm_id, query=self.normalize_query(query), records=records)
+        if records:
+            trend.avg_pages_loaded = sum(record.pages_loaded for record in records) / len(records)
+
+        positions = [
+            (record.position.page_number - 1) * settings.CATALOG_PAGE_SIZE + record.position.position_on_page
+            for record in records if record.position is not None
+        ]
+        if positions:
+            trend.first_position, trend.last_position = positions[0], positions[-1]
+            trend.best_position, trend.worst_position = min(positions), max(positions)
+            trend.position_change = positions[-1] - positions[0]
+        return trend
+
+    async def track(self, nm_id: int, query: str) -> None:
+        """ Добавляет пару в периодическую перепроверку """
+        await asyncio.to_thread(
+            self.__execute,
+            'INSERT OR IGNORE INTO tracked (nm_id, query, added_at) VALUES (?, ?, ?)',
+            (nm_id, self.normalize_query(query), time.time()),
+        )
+
+    async def untrack(self, nm_id: int, query: str) -> None:
+        """ Убирает пару из перепроверки, история ее проверок сохраняется """
+        await asyncio.to_thread(
+            self.__execute,
+            'DELETE FROM tracked WHERE nm_id = ? AND query = ?',
+            (nm_id, self.normalize_query(query)),
+        )
+
+    async def tracked_pairs(self) -> List[TrackedPair]:
+        """ Отслеживаемые пары: сначала ни разу не проверенные, затем дольше всего не проверявшиеся """
+        rows = await asyncio.to_thread(self.__fetch, (
+            'SELECT t.nm_id, t.query, t.added_at, MAX(p.checked_at) AS last_checked_at FROM tracked t '
+            'LEFT JOIN positions p ON p.nm_id = t.nm_id AND p.query = t.query '
+            'GROUP BY t.nm_id, t.query ORDER BY last_checked_at IS NOT NULL, last_checked_at, t.added_at'
+        ), ())
+        return [
+            TrackedPair(nm_id=nm_id, query=query, added_at=added_at, last_checked_at=last_checked_at)
+            for nm_id, query, added_at, last_checked_at in rows
+        ]
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def __execute(self, sql: str, parameters: tuple) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(sql, parameters)
+
+    def __fetch(self, sql: str, parameters: tuple) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def __to_record(row: tuple) -> PositionRecord:
+        (nm_id, query, checked_at, status, page_number, position_on_page, page_url,
+         pages_checked, pages_loaded, total_results) = row
+        position = None
+        if page_number is not None:
+            position = ProductPosition(page_number=page_number, position_on_page=position_on_page, page_url=page_url)
+        return PositionRecord(
+            nm_id=nm_id,
+            query=query,
+            checked_at=checked_at,
+            status=status,
+            position=position,
+            pages_checked=pages_checked,
+            pages_loaded=pages_loaded,
+            total_results=total_results,
+        )
+
+
+def create_position_history() -> Union[PositionHistory, None]:
+    """ История позиций по настройкам, None если POSITION_HISTORY_PATH не задан """
+    if not settings.POSITION_HISTORY_PATH:
+        return None
+    return PositionHistory(path=Path(BASE_DIR, settings.POSITION_HISTORY_PATH))
@@ -0,0 +1,43 @@
+from typing import List, Literal, Union
+
+from pydantic import BaseModel
+
+from src.scrappers.models import ProductPosition
+
+
+class PositionRecord(BaseModel):
+    nm_id: int
+    # Нормализованный запрос: нижний регистр, одиночные пробелы
+    query: str
+    # Время проверки, unix time
+    checked_at: float
+    # truncated - товар не найден в поиске, урезанном бюджетом страниц, о позиции это ничего не говорит
+    status: Literal['found', 'not_found', 'failed', 'truncated']
+    position: Union[ProductPosition, None] = None
+    pages_checked: int = 0
+    # Сколько страниц выдачи проверено при поиске, включая взятые из кеша
+    pages_loaded: int = 0
+    total_results: Union[int, None] = None
+
+
+class TrackedPair(BaseModel):
+    nm_id: int
+    query: str
+    added_at: float
+    # None - пара еще ни разу не проверялась
+    last_checked_at: Union[float, None] = None
+
+
+class PositionTrend(BaseModel):
+    nm_id: int
+    query: str
+    # Проверки за период от старых к новым
+    records: List[PositionRecord] = []
+    # Позиции в сквозной нумерации выдачи: (страница - 1) * CATALOG_PAGE_SIZE + позиция на странице
+    first_position: Union[int, None] = None
+    last_position: Union[int, None] = None
+    best_position: Union[int, None] = None
+    worst_position: Union[int, None] = None
+    # Изменение позиции за период, отрицательное - товар поднялся
+    position_change: Union[int, None] = None
+    avg_pages_loaded: float = 0
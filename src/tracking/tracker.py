@@ -0,0 +1,268 @@
+"""
+Периодическая перепроверка позиций отслеживаемых пар (артикул, запрос).
+
+    python tracker.py add 149751046 "зонт мужской" "зонт автомат"
+    python tracker.py list
+    python tracker.py run --once
+    python tracker.py trend 149751046 "зонт мужской" --days 30
+
+Поиск начинается со страницы, на которой товар был в прошлый раз, поэтому товар с устойчивой позицией
+перепроверяется за одну-две страницы вместо полного просмотра выдачи. История пишется в POSITION_HISTORY_PATH.
+"""
+import argparse
+import asyncio
+import signal
+import time
+from typing import Dict, List, Set
+
+from loguru import logger
+
+from settings.config import settings
+from src.monitoring.metrics import span
+from src.scrappers.exceptions import ProductUrlError
+from src.scrappers.wildberries.browser_backend import BrowserBackend
+from src.scrappers.wildberries.urls import build_product_url, parse_nm_id
+from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+from src.scrappers.wildberries.wildberries_catalog_http import create_catalog_scrapper
+from src.tracking.history import create_position_history, PositionHistory
+from src.tracking.models import PositionTrend, TrackedPair
+
+
+class PositionTracker:
+    """
+    Перепроверяет отслеживаемые пары, начиная с дольше всего не проверявшихся.
+
+    За цикл загружается не больше pages_budget страниц выдачи: перед проверкой пары под нее резервируется
+    полный просмотр (MAX_N_PAGES_TO_SEARCH_IN_CATALOG страниц), после проверки неиспользованная часть
+    возвращается в бюджет. Глубину поиска бюджет не ограничивает: если остатка не хватает на полный просмотр,
+    пара не проверяется урезанным поиском, а откладывается и проверяется первой в следующем цикле.
+    """
+
+    def __init__(
+            self,
+            catalog_scrapper: WildberriesCatalogScrapper,
+            history: PositionHistory,
+            pages_budget: int = None,
+            concurrency: int = None,
+    ) -> None:
+        """
+        :param pages_budget: Сколько страниц выдачи можно загрузить за цикл, по умолчанию TRACKING_PAGES_BUDGET
+        :param concurrency: Сколько пар проверять одновременно, по умолчанию TRACKING_CONCURRENCY
+        """
+        self._catalog_scrapper = catalog_scrapper
+        self._history = history
+        self._pages_budget = pages_budget or settings.TRACKING_PAGES_BUDGET
+        if self._pages_budget < settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG:
+            logger.warning(
+                f'Бюджет {self._pages_budget} страниц меньше одного полного просмотра выдачи, '
+                f'использую MAX_N_PAGES_TO_SEARCH_IN_CATALOG={settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG}'
+            )
+            self._pages_budget = settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+        self._concurrency = max(1, concurrency or settings.TRACKING_CONCURRENCY)
+
+        self._stopping = asyncio.Event()
+
+    async def run_cycle(self) -> Dict[str, int]:
+        """
+        Один проход по отслеживаемым парам
+
+        :return: Сколько пар проверено по статусам результата, сколько отложено до следующего цикла
+            и сколько страниц загружено
+        """
+        pairs = await self._history.tracked_pairs()
+        counts: Dict[str, int] = {'pages_loaded': 0}
+        remaining_budget = self._pages_budget
+        slots = asyncio.Semaphore(self._concurrency)
+        tasks: Set[asyncio.Task] = set()
+
+        async def process(pair: TrackedPair, reserved_pages: int) -> None:
+            nonlocal remaining_budget
+            pages_loaded = reserved_pages
+            try:
+                with span('tracking', 'pair'):
+                    positions = await self._catalog_scrapper.find_product_positions(
+                        product_url=build_product_url(pair.nm_id),
+                        queries=[pair.query],
+                        owner='tracking',
+                        warm_start=True,
+                    )
+                result = positions[pair.query]
+                pages_loaded, status = result.pages_loaded, result.status
+                position = result.position
+                logger.info(
+                    f'Товар {pair.nm_id} по запросу {pair.query}: '
+                    + (f'страница {position.page_number}, позиция {position.position_on_page}' if position else status)
+                    + f', загружено страниц {pages_loaded}'
+                )
+            except Exception as e:
+                logger.exception(f'Ошибка при проверке товара {pair.nm_id} по запросу {pair.query}: {e}')
+                status = 'error'
+            finally:
+                # Возвращаем в бюджет то, что не понадобилось
+                remaining_budget += max(0, reserved_pages - pages_loaded)
+                slots.release()
+
+            counts[status] = counts.get(status, 0) + 1
+            counts['pages_loaded'] += pages_loaded
+
+        try:
+            for index, pair in enumerate(pairs):
+                await slots.acquire()
+                reserved_pages = settings.MAX_N_PAGES_TO_SEARCH_IN_CATALOG
+                while remaining_budget < reserved_pages and tasks and not self._stopping.is_set():
+                    # Начатые проверки могут вернуть часть зарезервированных страниц
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                if self._stopping.is_set() or remaining_budget < reserved_pages:
+                    slots.release()
+                    counts['deferred'] = len(pairs) - index
+                    break
+
+                remaining_budget -= reserved_pages
+                task = asyncio.create_task(process(pair, reserved_pages))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            await asyncio.gather(*tasks)
+
+        return counts
+
+    async def run_forever(self) -> None:
+        """ Циклы раз в TRACKING_INTERVAL до SIGINT/SIGTERM, начатые проверки дорабатываются """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        try:
+            while not self._stopping.is_set():
+                started_at = time.monotonic()
+                counts = await self.run_cycle()
+                logger.info('Цикл отслеживания завершен: ' + self.describe_counts(counts))
+
+                delay = settings.TRACKING_INTERVAL - (time.monotonic() - started_at)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=max(0.0, delay))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+
+    def stop(self) -> None:
+        logger.info('Остановка отслеживания: дорабатываю начатые проверки')
+        self._stopping.set()
+
+    @staticmethod
+    def describe_counts(counts: Dict[str, int]) -> str:
+        return ', '.join(f'{status} {count}' for status, count in counts.items())
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Отслеживание позиций товаров Wildberries')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='Добавить запросы товара в отслеживание')
+    add.add_argument('product', help='Артикул или ссылка на товар')
+    add.add_argument('queries', nargs='+', help='Поисковые запросы')
+
+    remove = commands.add_parser('remove', help='Убрать запросы товара из отслеживания, история сохраняется')
+    remove.add_argument('product', help='Артикул или ссылка на товар')
+    remove.add_argument('queries', nargs='+', help='Поисковые запросы')
+
+    commands.add_parser('list', help='Показать отслеживаемые пары')
+
+    run = commands.add_parser('run', help='Перепроверять позиции раз в TRACKING_INTERVAL')
+    run.add_argument('--once', action='store_true', help='Выполнить один цикл и выйти')
+    run.add_argument('--budget', type=int, default=None,
+                     help='Сколько страниц выдачи загружать за цикл, по умолчанию TRACKING_PAGES_BUDGET')
+
+    trend = commands.add_parser('trend', help='Показать динамику позиции товара по запросу')
+    trend.add_argument('product', help='Артикул или ссылка на товар')
+    trend.add_argument('query', help='Поисковый запрос')
+    trend.add_argument('--days', type=float, default=30, help='За сколько последних дней, по умолчанию 30')
+
+    return parser.parse_args()
+
+
+def parse_product(product: str) -> int:
+    """ Артикул из аргумента командной строки: число или ссылка на товар """
+    if product.isdigit():
+        return int(product)
+    try:
+        return parse_nm_id(product)
+    except ProductUrlError as e:
+        raise SystemExit(str(e))
+
+
+def format_trend(trend: PositionTrend) -> List[str]:
+    lines = [f'Товар {trend.nm_id}, запрос "{trend.query}", проверок: {len(trend.records)}']
+    for record in trend.records:
+        checked_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(record.checked_at))
+        if record.position is not None:
+            lines.append(
+                f'{checked_at}  страница {record.position.page_number}, позиция {record.position.position_on_page}'
+            )
+        else:
+            lines.append(f'{checked_at}  {record.status} на {record.pages_checked} страницах')
+    if trend.last_position is not None:
+        lines.append(
+            f'Позиция в выдаче: {trend.first_position} -> {trend.last_position} ({trend.position_change:+d}), '
+            f'лучшая {trend.best_position}, худшая {trend.worst_position}'
+        )
+    if trend.records:
+        lines.append(f'В среднем загружено страниц за проверку: {trend.avg_pages_loaded:.1f}')
+    return lines
+
+
+async def run_tracker(args: argparse.Namespace) -> None:
+    history = create_position_history()
+    if history is None:
+        raise SystemExit('Не задан POSITION_HISTORY_PATH, историю позиций негде хранить')
+
+    try:
+        if args.command in ('add', 'remove'):
+            nm_id = parse_product(args.product)
+            for query in args.queries:
+                if args.command == 'add':
+                    await history.track(nm_id=nm_id, query=query)
+                else:
+                    await history.untrack(nm_id=nm_id, query=query)
+            logger.info(f'{"Добавлено" if args.command == "add" else "Убрано"} запросов товара {nm_id}: '
+                        f'{len(args.queries)}')
+
+        elif args.command == 'list':
+            for pair in await history.tracked_pairs():
+                last_checked_at = 'не проверялся' if pair.last_checked_at is None else time.strftime(
+                    '%Y-%m-%d %H:%M', time.localtime(pair.last_checked_at)
+                )
+                print(f'{pair.nm_id}\t{pair.query}\t{last_checked_at}')
+
+        elif args.command == 'trend':
+            trend = await history.trend(
+                nm_id=parse_product(args.product),
+                query=args.query,
+                since=time.time() - args.days * 86400,
+            )
+            print('\n'.join(format_trend(trend)))
+
+        elif args.command == 'run':
+            browser_backend = BrowserBackend()
+            catalog_scrapper = create_catalog_scrapper(backend=browser_backend, position_history=history)
+            tracker = PositionTracker(catalog_scrapper=catalog_scrapper, history=history, pages_budget=args.budget)
+            try:
+                if args.once:
+                    logger.info('Цикл отслеживания завершен: ' + tracker.describe_counts(await tracker.run_cycle()))
+                else:
+                    await tracker.run_forever()
+            finally:
+                await catalog_scrapper.close()
+                await browser_backend.close()
+    finally:
+        await history.close()
+
+
+def main() -> None:
+    asyncio.run(run_tracker(parse_args()))
+
+
+if __name__ == '__main__':
+    main()
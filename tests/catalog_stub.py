@@ -0,0 +1,80 @@
+import asyncio
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+from src.scrappers.exceptions import CatalogFindItemsError
+from src.scrappers.models import CatalogPage
+from src.scrappers.wildberries.wildberries_catalog import WildberriesCatalogScrapper
+
+
+class StubCatalogScrapper(WildberriesCatalogScrapper):
+    """
+    Скраппер выдачи без браузера: страницы берутся из listings, запрос -> артикулы по страницам.
+    Страница после последней отдается как пустая выдача, страницы из failing_pages падают.
+    Страницы из incomplete_pages первые несколько загрузок отдаются недогруженными: только первая половина карточек
+    """
+
+    def __init__(
+            self,
+            listings: Dict[str, List[List[int]]],
+            total_results: Dict[str, int] = None,
+            failing_pages: Iterable[Tuple[str, int]] = (),
+            delay: float = 0,
+            incomplete_pages: Dict[Tuple[str, int], int] = None,
+            **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.listings = listings
+        self.total_results = total_results or {}
+        self.failing_pages: Set[Tuple[str, int]] = set(failing_pages)
+        # (запрос, номер страницы) -> сколько еще загрузок страница будет недогруженной
+        self.incomplete_pages: Dict[Tuple[str, int], int] = dict(incomplete_pages or {})
+        self.delay = delay
+        # Загрузки страниц по порядку начала: (запрос, номер страницы)
+        self.fetched: List[Tuple[str, int]] = []
+
+    def fetched_pages(self, query: str) -> List[int]:
+        return [page_number for fetched_query, page_number in self.fetched if fetched_query == query]
+
+    async def _ensure_browser_initialized(self) -> None:
+        """ Браузер заглушке не нужен """
+
+    async def _fetch_catalog_page(
+            self,
+            query: str,
+            page_number: int,
+            owner: Hashable,
+            target_nm_ids: Iterable[int] = (),
+    ) -> CatalogPage:
+        self.fetched.append((query, page_number))
+        await asyncio.sleep(self.delay)
+        if (query, page_number) in self.failing_pages:
+            raise RuntimeError(f'страница {page_number} не загрузилась')
+
+        pages = self.listings.get(query, [])
+        if page_number > len(pages):
+            raise CatalogFindItemsError
+
+        nm_ids, complete = pages[page_number - 1], True
+        if self.incomplete_pages.get((query, page_number), 0) > 0:
+            self.incomplete_pages[(query, page_number)] -= 1
+            nm_ids, complete = nm_ids[:len(nm_ids) // 2], False
+        return CatalogPage(
+            query=query,
+            page_number=page_number,
+            page_url=f'stub://{query}/{page_number}',
+            nm_ids=nm_ids,
+            complete=complete,
+            total_results=self.total_results.get(query),
+        )
+
+
+def product_url(nm_id: int) -> str:
+    return f'https://www.wildberries.ru/catalog/{nm_id}/detail.aspx'
+
+
+def listing(pages: int, placements: Dict[int, Tuple[int, int]] = None, page_size: int = 10) -> List[List[int]]:
+    """ Выдача из pages страниц с товарами-заполнителями, placements: артикул -> (страница, позиция) """
+    result = [[100000 + page * page_size + index for index in range(page_size)] for page in range(pages)]
+    for nm_id, (page_number, position) in (placements or {}).items():
+        result[page_number - 1][position - 1] = nm_id
+    return result
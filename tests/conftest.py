@@ -0,0 +1,26 @@
+import pytest
+
+from settings.config import settings
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """ Временно меняет настройки, после теста значения возвращаются """
+
+    def override(**values) -> None:
+        for name, value in values.items():
+            monkeypatch.setattr(settings, name, value)
+
+    return override
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(override_settings):
+    """ Тесты не пишут кеш и историю на диск и не ходят в сеть, пока явно не попросят """
+    override_settings(
+        SERP_CACHE_TTL=0,
+        SERP_CACHE_SQLITE_PATH='',
+        POSITION_HISTORY_PATH='',
+        METRICS_PORT=0,
+        OTEL_ENABLED=False,
+    )
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from src.scrappers.wildberries.browser_backend import BrowserWorker
+
+
+class Tabs:
+    """ Счетчик открытых вкладок всех фейковых браузеров """
+
+    def __init__(self) -> None:
+        self.open = 0
+        self.max_open = 0
+
+    def opened(self) -> None:
+        self.open += 1
+        self.max_open = max(self.max_open, self.open)
+
+
+class FakePage:
+    def __init__(self, tabs: Tabs) -> None:
+        self._tabs = tabs
+        self._closed = False
+        tabs.opened()
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    async def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._tabs.open -= 1
+
+
+class FakeContext:
+    def __init__(self, tabs: Tabs) -> None:
+        self._tabs = tabs
+        self.pages = []
+
+    async def new_page(self) -> FakePage:
+        await asyncio.sleep(0)
+        page = FakePage(self._tabs)
+        self.pages.append(page)
+        return page
+
+    async def close(self) -> None:
+        for page in self.pages:
+            await page.close()
+
+
+class FakeBrowser:
+    def __init__(self, tabs: Tabs) -> None:
+        self._tabs = tabs
+
+    async def new_context(self, **kwargs) -> FakeContext:
+        return FakeContext(self._tabs)
+
+    def on(self, event, callback) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class FakePlaywright:
+    def __init__(self, tabs: Tabs) -> None:
+        self.chromium = self
+        self._tabs = tabs
+
+    async def launch(self, **kwargs) -> FakeBrowser:
+        return FakeBrowser(self._tabs)
+
+
+@pytest.fixture(autouse=True)
+def browser_settings(override_settings):
+    override_settings(
+        MAX_OPEN_PAGES=2,
+        CONTEXT_MAX_PAGES=3,
+        BROWSER_MEMORY_CHECK_INTERVAL=0,
+        BLOCK_HEAVY_RESOURCES=False,
+    )
+
+
+def test_open_tabs_stay_within_limit_across_context_recycles():
+    tabs = Tabs()
+
+    async def run():
+        worker = BrowserWorker(playwright=FakePlaywright(tabs), index=0)
+        await worker.start()
+
+        async def use_page(index: int) -> None:
+            async with worker.page(owner=index % 3):
+                await asyncio.sleep(0.001 * (index % 4))
+
+        await asyncio.gather(*(use_page(index) for index in range(30)))
+        stats = worker.memory_stats
+        await worker.close()
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert stats.context_recycles >= 5
+    assert tabs.max_open <= 2
+    assert tabs.open == 0
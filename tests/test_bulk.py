@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import signal
+
+import pytest
+
+from src.bulk import runner as bulk_runner
+from src.bulk.files import ResultWriter, create_result_writer, read_items
+from src.bulk.models import BulkCheckpoint, BulkQueryResult, BulkResult
+from tests.catalog_stub import StubCatalogScrapper, listing
+
+ITEMS = 12
+
+
+@pytest.fixture(autouse=True)
+def bulk_settings(override_settings):
+    override_settings(
+        WILDBERRIES_BASE_URL='https://www.wildberries.ru',
+        CATALOG_PAGES_WINDOW_SIZE=2,
+        MAX_N_PAGES_TO_SEARCH_IN_CATALOG=5,
+        CATALOG_PAGE_SIZE=10,
+    )
+
+
+@pytest.fixture
+def stub_catalog(monkeypatch):
+    """ Каталог без браузера: товар 1000 + i лежит на странице i % 3 + 1 выдачи по запросу зонт """
+    placements = {1000 + index: (index % 3 + 1, index % 10 + 1) for index in range(3)}
+    listings = {'зонт': listing(3, placements)}
+    monkeypatch.setattr(
+        bulk_runner, 'create_catalog_scrapper',
+        lambda backend: StubCatalogScrapper(listings, backend=backend, delay=0.01),
+    )
+
+
+def write_jsonl_input(path, count: int = ITEMS) -> None:
+    with path.open('w', encoding='utf-8') as file:
+        for index in range(count):
+            file.write(json.dumps({'nm_id': 1000 + index % 3, 'queries': ['зонт'], 'id': f'row{index}'}) + '\n')
+
+
+def bulk_args(input_path, output_path, restart: bool = False) -> argparse.Namespace:
+    return argparse.Namespace(input=input_path, output=output_path, concurrency=2, checkpoint=None, restart=restart)
+
+
+def test_read_csv_items(tmp_path):
+    path = tmp_path / 'products.csv'
+    path.write_text(
+        'URL,queries,id\n'
+        'https://www.wildberries.ru/catalog/149751046/detail.aspx?size=1,зонт; зонт мужской ,a\n'
+        'https://example.com/not-a-product,,b\n',
+        encoding='utf-8-sig',
+    )
+
+    first, second = read_items(path)
+
+    assert first.product_url == 'https://www.wildberries.ru/catalog/149751046/detail.aspx'
+    assert first.queries == ['зонт', 'зонт мужской']
+    assert first.id == 'a'
+    assert second.index == 1
+    assert second.error
+
+
+def test_read_jsonl_items(tmp_path):
+    path = tmp_path / 'products.jsonl'
+    path.write_text('{"nm_id": 5, "queries": ["плащ"]}\n\nnot json\n[1]\n{"url": "x/catalog/7/"}\n', encoding='utf-8')
+
+    items = list(read_items(path))
+
+    assert [item.index for item in items] == [0, 1, 2, 3]
+    assert items[0].product_url.endswith('/catalog/5/detail.aspx')
+    assert items[0].queries == ['плащ']
+    assert items[1].error and items[2].error
+    assert items[3].product_url.endswith('/catalog/7/detail.aspx')
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        list(read_items(tmp_path / 'products.txt'))
+
+
+def test_writers_truncate_to_offset(tmp_path):
+    result = BulkResult(index=0, product_url='u', nm_id=1, status='ok', queries=[
+        BulkQueryResult(query='зонт', status='found', page_number=2, position_on_page=3),
+        BulkQueryResult(query='плащ', status='not_found', pages_checked=5),
+    ])
+
+    jsonl_path = tmp_path / 'results.jsonl'
+    writer = create_result_writer(jsonl_path)
+    offset = writer.write(result)
+    writer.write(result.model_copy(update={'index': 1}))
+    writer.close()
+
+    writer = create_result_writer(jsonl_path, offset=offset)
+    writer.close()
+    assert [json.loads(line)['index'] for line in jsonl_path.read_text(encoding='utf-8').splitlines()] == [0]
+
+    csv_path = tmp_path / 'results.csv'
+    writer = create_result_writer(csv_path)
+    writer.write(result)
+    writer.close()
+    rows = list(csv.DictReader(csv_path.open(encoding='utf-8')))
+    assert [(row['query'], row['query_status'], row['page_number']) for row in rows] == [
+        ('зонт', 'found', '2'), ('плащ', 'not_found', ''),
+    ]
+
+
+def test_base_writer_cannot_be_created(tmp_path):
+    with pytest.raises(TypeError):
+        ResultWriter(tmp_path / 'results.txt')
+    assert not (tmp_path / 'results.txt').exists()
+
+
+def test_checkpoint_tracks_out_of_order_items(tmp_path):
+    checkpoint = BulkCheckpoint(input_path='in', output_path='out')
+    for index, size in ((1, 10), (2, 20), (0, 30)):
+        checkpoint.mark_done(index, output_size=size)
+    checkpoint.mark_done(4, output_size=40)
+
+    assert (checkpoint.next_index, checkpoint.done, checkpoint.output_size) == (3, {4}, 40)
+    assert checkpoint.is_done(2) and checkpoint.is_done(4) and not checkpoint.is_done(3)
+
+    path = tmp_path / 'checkpoint.json'
+    checkpoint.save(path)
+    assert BulkCheckpoint.load(path) == checkpoint
+
+
+@pytest.mark.parametrize('output_name', ['results.jsonl', 'results.csv'])
+def test_interrupted_run_resumes_from_checkpoint(tmp_path, monkeypatch, stub_catalog, output_name):
+    input_path, output_path = tmp_path / 'products.jsonl', tmp_path / output_name
+    write_jsonl_input(input_path)
+
+    # Первый прогон прерывается сигналом после трех записанных товаров
+    original_create_writer = bulk_runner.create_result_writer
+
+    def interrupting_writer(path, offset=0):
+        writer = original_create_writer(path=path, offset=offset)
+        original_write = writer.write
+        written = 0
+
+        def write(result):
+            nonlocal written
+            written += 1
+            if written == 3:
+                os.kill(os.getpid(), signal.SIGINT)
+            return original_write(result)
+
+        writer.write = write
+        return writer
+
+    monkeypatch.setattr(bulk_runner, 'create_result_writer', interrupting_writer)
+    first_counts = asyncio.run(bulk_runner.run_bulk(bulk_args(input_path, output_path)))
+    assert 3 <= first_counts['ok'] < ITEMS
+
+    # Запись, которая попала в файл, но не в чекпоинт, отрезается при продолжении
+    with output_path.open('a', encoding='utf-8') as file:
+        file.write('garbage from a crashed run\n')
+
+    monkeypatch.setattr(bulk_runner, 'create_result_writer', original_create_writer)
+    second_counts = asyncio.run(bulk_runner.run_bulk(bulk_args(input_path, output_path)))
+    assert second_counts['skipped'] == first_counts['ok']
+    assert second_counts['skipped'] + second_counts['ok'] == ITEMS
+
+    if output_name.endswith('.jsonl'):
+        results = [json.loads(line) for line in output_path.read_text(encoding='utf-8').splitlines()]
+        indices = [result['index'] for result in results]
+        found = {result['nm_id']: result['queries'][0]['page_number'] for result in results}
+    else:
+        rows = list(csv.DictReader(output_path.open(encoding='utf-8')))
+        indices = [int(row['index']) for row in rows]
+        found = {int(row['nm_id']): int(row['page_number']) for row in rows}
+    assert sorted(indices) == list(range(ITEMS))
+    assert found == {1000: 1, 1001: 2, 1002: 3}
+
+    checkpoint = BulkCheckpoint.load(output_path.with_name(output_path.name + '.checkpoint.json'))
+    assert (checkpoint.next_index, checkpoint.done) == (ITEMS, set())
+    assert checkpoint.output_size == output_path.stat().st_size
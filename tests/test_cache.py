@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from src.caching.backends import MemoryCacheBackend, SqliteCacheBackend
+from src.caching.cache import AsyncCache
+
+
+class CountingLoader:
+    """ loader для get_or_load: считает вызовы и ждет сигнала, что бы загрузки успели пересечься """
+
+    def __init__(self, value='value', error: Exception = None) -> None:
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def test_concurrent_misses_are_coalesced():
+    async def run():
+        cache = AsyncCache(ttl=60, max_entries=10)
+        loader = CountingLoader()
+        tasks = [asyncio.create_task(cache.get_or_load('key', loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == ['value'] * 3
+        assert loader.calls == 1
+        assert (cache.stats.misses, cache.stats.coalesced) == (1, 2)
+        assert await cache.get_or_load('key', loader) == 'value'
+        assert cache.stats.hits == 1
+
+    asyncio.run(run())
+
+
+def test_waiter_loads_itself_when_initiator_is_cancelled():
+    async def run():
+        cache = AsyncCache(ttl=60, max_entries=10)
+        loader = CountingLoader()
+        initiator = asyncio.create_task(cache.get_or_load('key', loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load('key', loader))
+        await asyncio.sleep(0)
+
+        initiator.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        assert await waiter == 'value'
+        assert loader.calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await initiator
+
+    asyncio.run(run())
+
+
+def test_loader_error_reaches_all_waiters_and_is_not_cached():
+    async def run():
+        cache = AsyncCache(ttl=60, max_entries=10)
+        loader = CountingLoader(error=ValueError('boom'))
+        tasks = [asyncio.create_task(cache.get_or_load('key', loader)) for _ in range(2)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert loader.calls == 1
+        assert await cache.get('key') is None
+
+        loader.error = None
+        assert await cache.get_or_load('key', loader) == 'value'
+        assert loader.calls == 2
+
+    asyncio.run(run())
+
+
+def test_memory_backend_evicts_least_recently_used():
+    async def run():
+        backend = MemoryCacheBackend(max_entries=2)
+        await backend.set('a', 1, ttl=60)
+        await backend.set('b', 2, ttl=60)
+        await backend.get('a')
+        await backend.set('c', 3, ttl=60)
+
+        assert [await backend.get(key) for key in ('a', 'b', 'c')] == [1, None, 3]
+
+    asyncio.run(run())
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    async def run():
+        path = tmp_path / 'cache.db'
+        first = AsyncCache(ttl=60, max_entries=10, persistent_backend=SqliteCacheBackend(path, max_entries=10))
+        await first.set('key', {'nm_ids': [1, 2, 3]})
+        await first.close()
+
+        second = AsyncCache(ttl=60, max_entries=10, persistent_backend=SqliteCacheBackend(path, max_entries=10))
+        loader = CountingLoader()
+        assert await second.get_or_load('key', loader) == {'nm_ids': [1, 2, 3]}
+        assert loader.calls == 0
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_promoted_entry_keeps_remaining_ttl(tmp_path):
+    async def run():
+        path = tmp_path / 'cache.db'
+        backend = SqliteCacheBackend(path, max_entries=10)
+        await backend.set('key', 'value', ttl=0.3)
+        await asyncio.sleep(0.15)
+
+        # Запись поднимается из SQLite в память с оставшимся сроком, а не с ttl кеша
+        cache = AsyncCache(ttl=60, max_entries=10, persistent_backend=backend)
+        assert await cache.get('key') == 'value'
+        value, ttl = await cache._memory.get_entry('key')
+        assert ttl <= 0.15
+
+        await asyncio.sleep(0.2)
+        assert await cache.get('key') is None
+        await cache.close()
+
+    asyncio.run(run())
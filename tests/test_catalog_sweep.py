@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from tests.catalog_stub import StubCatalogScrapper, listing, product_url
+
+NM_ID = 777
+
+
+@pytest.fixture(autouse=True)
+def sweep_settings(override_settings):
+    override_settings(CATALOG_PAGES_WINDOW_SIZE=3, MAX_N_PAGES_TO_SEARCH_IN_CATALOG=10, CATALOG_PAGE_SIZE=10)
+
+
+def search(scrapper: StubCatalogScrapper, query: str = 'зонт'):
+    async def run():
+        try:
+            return (await scrapper.find_product_positions(product_url(NM_ID), [query]))[query]
+        finally:
+            await scrapper.close()
+
+    return asyncio.run(run())
+
+
+def test_sweep_stops_after_hit():
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (2, 4)})})
+
+    result = search(scrapper)
+
+    assert result.status == 'found'
+    assert (result.position.page_number, result.position.position_on_page) == (2, 4)
+    assert result.pages_checked == 2
+    # Окно из трех страниц: страницы после находки уже не запрашиваются
+    assert max(scrapper.fetched_pages('зонт')) <= 3
+
+
+def test_earliest_page_wins():
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (3, 1)})})
+    scrapper.listings['зонт'][0][5] = NM_ID
+
+    result = search(scrapper)
+
+    assert (result.position.page_number, result.position.position_on_page) == (1, 6)
+
+
+def test_sweep_stops_at_no_results_page():
+    scrapper = StubCatalogScrapper({'зонт': listing(4)})
+
+    result = search(scrapper)
+
+    assert result.status == 'not_found'
+    assert result.pages_checked == 4
+    assert result.failed_pages == []
+    # Пятая страница пустая, дальше окно не сдвигается
+    assert max(scrapper.fetched_pages('зонт')) <= 5 + 2
+
+
+def test_sweep_is_bounded_by_total_results():
+    scrapper = StubCatalogScrapper({'зонт': listing(10)}, total_results={'зонт': 25})
+
+    result = search(scrapper)
+
+    assert result.status == 'not_found'
+    assert result.total_pages == 3
+    assert result.pages_checked == 3
+    assert sorted(set(scrapper.fetched_pages('зонт'))) == [1, 2, 3]
+
+
+def test_sweep_respects_page_budget():
+    scrapper = StubCatalogScrapper({'зонт': listing(10)})
+
+    async def run():
+        try:
+            return await scrapper.find_product_positions(product_url(NM_ID), ['зонт'], page_budgets={'зонт': 2})
+        finally:
+            await scrapper.close()
+
+    result = asyncio.run(run())['зонт']
+
+    assert result.pages_checked == 2
+    assert sorted(set(scrapper.fetched_pages('зонт'))) == [1, 2]
+
+
+def test_failed_page_makes_missing_product_failed():
+    scrapper = StubCatalogScrapper({'зонт': listing(4)}, failing_pages=[('зонт', 2)])
+
+    result = search(scrapper)
+
+    assert result.status == 'failed'
+    assert result.failed_pages == [2]
+    assert result.pages_checked == 4
+
+
+def test_failed_page_before_position_is_reported():
+    scrapper = StubCatalogScrapper({'зонт': listing(5, {NM_ID: (3, 2)})}, failing_pages=[('зонт', 2)])
+
+    result = search(scrapper)
+
+    assert result.status == 'found'
+    assert result.position.page_number == 3
+    assert result.failed_pages == [2]
+
+
+def test_failed_page_after_position_is_ignored():
+    scrapper = StubCatalogScrapper({'зонт': listing(5, {NM_ID: (1, 2)})}, failing_pages=[('зонт', 2)])
+
+    result = search(scrapper)
+
+    assert result.status == 'found'
+    assert result.failed_pages == []
+
+
+def test_incomplete_page_is_reloaded():
+    scrapper = StubCatalogScrapper({'зонт': listing(5, {NM_ID: (2, 8)})}, incomplete_pages={('зонт', 2): 1})
+
+    result = search(scrapper)
+
+    assert result.status == 'found'
+    assert (result.position.page_number, result.position.position_on_page) == (2, 8)
+    assert scrapper.fetched_pages('зонт').count(2) == 2
+
+
+def test_page_incomplete_after_retry_makes_missing_product_failed():
+    scrapper = StubCatalogScrapper({'зонт': listing(4, {NM_ID: (2, 8)})}, incomplete_pages={('зонт', 2): 2})
+
+    result = search(scrapper)
+
+    # Недогруженная страница не считается проверенной, товар не приписывается более поздней странице
+    assert result.status == 'failed'
+    assert result.failed_pages == [2]
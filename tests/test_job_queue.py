@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from src.jobs.queue import JobQueue, create_redis, is_in_process_redis
+
+pytest.importorskip('fakeredis')
+
+
+async def make_queue(**kwargs) -> JobQueue:
+    redis = create_redis('memory://')
+    await redis.flushall()
+    kwargs = {'name': 'test', 'visibility_timeout': 60, 'max_attempts': 3, 'retry_backoff': 0, **kwargs}
+    return JobQueue(redis=redis, **kwargs)
+
+
+def test_memory_url_is_in_process():
+    assert is_in_process_redis('memory://')
+    assert not is_in_process_redis('redis://localhost:6379/0')
+
+
+def test_enqueue_with_same_id_is_ignored():
+    async def run():
+        queue = await make_queue()
+
+        assert await queue.enqueue({'n': 1}, job_id='chat:1') == 'chat:1'
+        assert await queue.enqueue({'n': 2}, job_id='chat:1') is None
+        assert (await queue.stats())['pending'] == 1
+
+        job = await queue.reserve(timeout=0.1)
+        assert job.payload == {'n': 1}
+        assert job.attempts == 1
+
+    asyncio.run(run())
+
+
+def test_ack_removes_job():
+    async def run():
+        queue = await make_queue()
+        await queue.enqueue({'n': 1}, job_id='job')
+
+        job = await queue.reserve(timeout=0.1)
+        assert (await queue.stats())['processing'] == 1
+        await queue.ack(job)
+
+        assert await queue.stats() == {'pending': 0, 'processing': 0, 'delayed': 0, 'dead': 0}
+        assert await queue.reserve(timeout=0.1) is None
+        # После подтверждения задачу с тем же id можно поставить снова
+        assert await queue.enqueue({'n': 1}, job_id='job') == 'job'
+
+    asyncio.run(run())
+
+
+def test_expired_job_is_requeued():
+    async def run():
+        queue = await make_queue(visibility_timeout=0.05)
+        await queue.enqueue({'n': 1}, job_id='job')
+        await queue.reserve(timeout=0.1)
+
+        # Срок невидимости не истек, задача остается у воркера
+        assert await queue.requeue_expired() == 0
+        await asyncio.sleep(0.1)
+
+        # Просроченная задача сначала откладывается, затем возвращается в pending
+        assert await queue.requeue_expired() == 1
+        assert (await queue.stats())['delayed'] == 1
+        assert await queue.requeue_expired() == 1
+
+        job = await queue.reserve(timeout=0.1)
+        assert job.id == 'job'
+        assert job.attempts == 2
+        assert job.last_error == 'visibility timeout'
+
+    asyncio.run(run())
+
+
+def test_failed_job_is_retried_until_dead():
+    async def run():
+        queue = await make_queue(max_attempts=2)
+        await queue.enqueue({'n': 1}, job_id='job')
+
+        job = await queue.reserve(timeout=0.1)
+        assert await queue.nack(job, error='first') is True
+        assert await queue.requeue_expired() == 1
+
+        job = await queue.reserve(timeout=0.1)
+        assert job.attempts == 2
+        assert await queue.nack(job, error='second') is False
+
+        assert await queue.stats() == {'pending': 0, 'processing': 0, 'delayed': 0, 'dead': 1}
+        dead = await queue.dead_jobs()
+        assert [(dead_job.id, dead_job.last_error) for dead_job in dead] == [('job', 'second')]
+
+    asyncio.run(run())
+
+
+def test_bury_skips_retries():
+    async def run():
+        queue = await make_queue()
+        await queue.enqueue({'broken': True}, job_id='job')
+
+        job = await queue.reserve(timeout=0.1)
+        await queue.bury(job, error='invalid payload')
+
+        assert await queue.stats() == {'pending': 0, 'processing': 0, 'delayed': 0, 'dead': 1}
+        assert (await queue.dead_jobs())[0].last_error == 'invalid payload'
+
+    asyncio.run(run())
+
+
+def test_dead_jobs_are_trimmed():
+    async def run():
+        queue = await make_queue(dead_max_jobs=2)
+        for index in range(3):
+            await queue.enqueue({'n': index}, job_id=f'job{index}')
+            await queue.bury(await queue.reserve(timeout=0.1), error='invalid payload')
+
+        assert [job.id for job in await queue.dead_jobs()] == ['job2', 'job1']
+        # Тело вытесненной задачи удалено, ее id снова свободен
+        assert await queue.enqueue({'n': 0}, job_id='job0') == 'job0'
+
+    asyncio.run(run())
@@ -0,0 +1,38 @@
+import sys
+
+import pytest
+
+from src.queries_extraction import nltk_data
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch, override_settings):
+    override_settings(NLTK_DATA_DIR=str(tmp_path), NLTK_DOWNLOAD_MISSING=False)
+    monkeypatch.setenv('NLTK_DATA', str(tmp_path))
+    monkeypatch.setattr(nltk_data, 'nltk_data_paths', lambda: [tmp_path])
+    return tmp_path
+
+
+def test_resources_are_found_without_importing_nltk(data_dir, monkeypatch):
+    (data_dir / 'corpora' / 'stopwords').mkdir(parents=True)
+    (data_dir / 'tokenizers').mkdir()
+    (data_dir / 'tokenizers' / 'punkt_tab.zip').touch()
+    monkeypatch.delitem(sys.modules, 'nltk', raising=False)
+
+    nltk_data.ensure_nltk_data()
+
+    assert 'nltk' not in sys.modules
+
+
+def test_missing_resources_are_reported(data_dir):
+    (data_dir / 'corpora' / 'stopwords').mkdir(parents=True)
+
+    assert nltk_data.find_missing_nltk_resources() == ['punkt_tab']
+    with pytest.raises(RuntimeError, match='punkt_tab'):
+        nltk_data.ensure_nltk_data()
+
+
+def test_nltk_data_env_paths_come_first(tmp_path, monkeypatch):
+    monkeypatch.setenv('NLTK_DATA', str(tmp_path))
+
+    assert nltk_data.nltk_data_paths()[0] == tmp_path
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from src.scrappers.models import ProductPosition, QuerySearchResult
+from src.tracking.history import PositionHistory
+from src.tracking.tracker import PositionTracker
+from tests.catalog_stub import StubCatalogScrapper, listing, product_url
+
+NM_ID = 777
+
+
+@pytest.fixture(autouse=True)
+def tracking_settings(override_settings):
+    override_settings(
+        CATALOG_PAGES_WINDOW_SIZE=3,
+        MAX_N_PAGES_TO_SEARCH_IN_CATALOG=10,
+        CATALOG_PAGE_SIZE=10,
+        WARM_START_RADIUS=2,
+    )
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = PositionHistory(tmp_path / 'positions.db')
+    yield history
+    asyncio.run(history.close())
+
+
+def record_position(history: PositionHistory, page_number: int, position_on_page: int = 3, query: str = 'зонт'):
+    position = ProductPosition(page_number=page_number, position_on_page=position_on_page, page_url='stub://')
+    asyncio.run(history.record(
+        nm_id=NM_ID, query=query, checked_at=1,
+        result=QuerySearchResult(status='found', position=position, pages_checked=page_number),
+    ))
+
+
+def search(scrapper: StubCatalogScrapper, query: str = 'зонт', **kwargs) -> QuerySearchResult:
+    async def run():
+        try:
+            return (await scrapper.find_product_positions(product_url(NM_ID), [query], **kwargs))[query]
+        finally:
+            await scrapper.close()
+
+    return asyncio.run(run())
+
+
+def test_warm_start_checks_first_page_with_anchor(history):
+    record_position(history, page_number=6)
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (6, 3)})}, position_history=history)
+
+    result = search(scrapper, warm_start=True)
+
+    assert (result.position.page_number, result.position.position_on_page) == (6, 3)
+    assert sorted(scrapper.fetched_pages('зонт')) == [1, 6]
+    assert result.pages_loaded == 2
+
+
+def test_warm_start_reports_earlier_position_on_first_page(history):
+    record_position(history, page_number=6)
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (6, 3)})}, position_history=history)
+    # Товар поднялся на первую страницу, но остался и на прежней
+    scrapper.listings['зонт'][0][1] = NM_ID
+
+    result = search(scrapper, warm_start=True)
+
+    assert (result.position.page_number, result.position.position_on_page) == (1, 2)
+
+
+def test_warm_start_miss_falls_back_without_reloading_pages(history):
+    record_position(history, page_number=3)
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (9, 1)})}, position_history=history)
+
+    result = search(scrapper, warm_start=True)
+
+    assert result.position.page_number == 9
+    fetched = scrapper.fetched_pages('зонт')
+    assert len(fetched) == len(set(fetched))
+
+
+def test_truncated_sweep_keeps_last_position(history):
+    record_position(history, page_number=8)
+    scrapper = StubCatalogScrapper({'зонт': listing(10, {NM_ID: (8, 3)})}, position_history=history)
+
+    result = search(scrapper, page_budgets={'зонт': 2})
+
+    assert (result.status, result.truncated) == ('not_found', True)
+    records = asyncio.run(history.history(nm_id=NM_ID, query='зонт'))
+    assert [record.status for record in records] == ['found', 'truncated']
+    assert asyncio.run(history.last_position(nm_id=NM_ID, query='зонт')).page_number == 8
+
+
+def test_budget_covering_whole_listing_is_not_truncated(history):
+    record_position(history, page_number=2)
+    scrapper = StubCatalogScrapper({'зонт': listing(3)}, total_results={'зонт': 30}, position_history=history)
+
+    result = search(scrapper, page_budgets={'зонт': 3})
+
+    assert (result.status, result.truncated) == ('not_found', False)
+    assert asyncio.run(history.last_position(nm_id=NM_ID, query='зонт')) is None
+
+
+def test_tracker_defers_pairs_instead_of_truncating(history):
+    queries = ['зонт', 'плащ', 'сапоги']
+    for query in queries:
+        asyncio.run(history.track(nm_id=NM_ID, query=query))
+    record_position(history, page_number=8, query='сапоги')
+    scrapper = StubCatalogScrapper(
+        {query: listing(10, {NM_ID: (8, 3)} if query == 'сапоги' else None) for query in queries},
+        position_history=history,
+    )
+
+    async def run():
+        try:
+            tracker = PositionTracker(catalog_scrapper=scrapper, history=history, pages_budget=25, concurrency=1)
+            return await tracker.run_cycle()
+        finally:
+            await scrapper.close()
+
+    counts = asyncio.run(run())
+
+    # Две никогда не проверенные пары просматривают выдачу полностью, на третью остается 5 страниц из 10
+    assert counts == {'pages_loaded': 20, 'not_found': 2, 'deferred': 1}
+    for query in ('зонт', 'плащ'):
+        (record,) = asyncio.run(history.history(nm_id=NM_ID, query=query))
+        assert (record.status, record.pages_checked) == ('not_found', 10)
+    assert asyncio.run(history.last_position(nm_id=NM_ID, query='сапоги')).page_number == 8
+    assert scrapper.fetched_pages('сапоги') == []
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from src.scrappers.wildberries.query_screening import QueryScreener
+from tests.catalog_stub import StubCatalogScrapper, listing, product_url
+
+NM_ID = 777
+
+
+@pytest.fixture(autouse=True)
+def screening_settings(override_settings):
+    override_settings(
+        CATALOG_PAGES_WINDOW_SIZE=3,
+        MAX_N_PAGES_TO_SEARCH_IN_CATALOG=10,
+        CATALOG_PAGE_SIZE=10,
+        QUERY_SCREENING_TOP_K=2,
+        PRODUCT_PAGES_BUDGET=0,
+    )
+
+
+def screen_and_search(scrapper: StubCatalogScrapper, queries):
+    async def run():
+        try:
+            screened = await QueryScreener(catalog_scrapper=scrapper).screen(
+                product_url=product_url(NM_ID), queries=queries, owner='test'
+            )
+            selected = [screened_query for screened_query in screened if screened_query.page_budget]
+            positions = await scrapper.find_product_positions(
+                product_url(NM_ID),
+                [screened_query.query for screened_query in selected],
+                page_budgets={screened_query.query: screened_query.page_budget for screened_query in selected},
+                known_pages=[screened_query.first_page for screened_query in selected],
+            )
+            return screened, positions
+        finally:
+            await scrapper.close()
+
+    return asyncio.run(run())
+
+
+def test_selected_queries_are_ranked_and_empty_ones_skipped():
+    scrapper = StubCatalogScrapper(
+        {'длинная': listing(8), 'короткая': listing(2), 'на первой': listing(5, {NM_ID: (1, 3)})},
+        total_results={'длинная': 80, 'короткая': 20, 'на первой': 50},
+    )
+
+    screened, _ = screen_and_search(scrapper, ['длинная', 'пустая', 'короткая', 'на первой'])
+
+    assert [(screened_query.query, screened_query.page_budget, screened_query.skip_reason)
+            for screened_query in screened] == [
+        ('на первой', 1, ''),
+        ('короткая', 2, ''),
+        ('длинная', 0, 'low_rank'),
+        ('пустая', 0, 'no_results'),
+    ]
+
+
+def test_first_page_is_not_loaded_twice_without_cache():
+    scrapper = StubCatalogScrapper(
+        {'зонт': listing(5, {NM_ID: (3, 2)}), 'плащ': listing(4, {NM_ID: (1, 7)})},
+        total_results={'зонт': 50, 'плащ': 40},
+    )
+
+    _, positions = screen_and_search(scrapper, ['зонт', 'плащ'])
+
+    assert positions['зонт'].position.page_number == 3
+    assert positions['плащ'].position.page_number == 1
+    assert scrapper.fetched_pages('зонт').count(1) == 1
+    assert scrapper.fetched_pages('плащ') == [1]
@@ -0,0 +1,12 @@
+import sys
+
+from loguru import logger
+
+from src.tracking.tracker import main
+
+logger.remove()
+logger.add(sys.stderr, level="INFO")
+
+
+if __name__ == '__main__':
+    main()
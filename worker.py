@@ -0,0 +1,11 @@
+import asyncio
+
+from src.jobs.worker import LookupWorker
+from src.monitoring.metrics import start_metrics_server
+from src.queries_extraction.nltk_data import ensure_nltk_data
+
+
+if __name__ == '__main__':
+    ensure_nltk_data()
+    start_metrics_server()
+    asyncio.run(LookupWorker().run())